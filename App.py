@@ -1,6 +1,10 @@
+import multiprocessing
 import threading
+import time
 import create_query
-from database_connector import DatabaseConnector
+from database_connector import DatabaseConnector, CancelToken, QueryCancelled, QueryTimeout
+from run_preprocessor import RunPreprocessor
+from ui_dispatcher import UIDispatcher
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
@@ -10,6 +14,9 @@ import os
 # Get the base directory of the current file
 basedir = os.path.dirname(__file__)
 
+# Dropdown entry that queries every product in one scan and opens a window per product
+ALL_PRODUCTS = 'All Products'
+
 
 class Application(tk.Tk, DatabaseConnector):
     """
@@ -18,14 +25,25 @@ class Application(tk.Tk, DatabaseConnector):
     Attributes:
         resize (bool): Flag for window resizable property.
         dropdown_box_selection (str): The selected product value from the dropdown.
+        dispatcher (UIDispatcher): Carries the events of the query threads to the Tk thread.
+        fetch_started (float): time.time() when the rows of the current query started streaming.
+        sent_queries (dict): The cancel token of every scheduled query whose results this window opens, by future.
 
     Methods:
         create_widgets(): Set up and layout GUI components.
-        convertToProgramIdentifier(): Convert selected product name in the dropdown to a program name.
-        send_query(): Trigger a separate thread to handle the database query.
-        send_query_thread(): Perform the database query in a separate thread to prevent freezing windows.
+        warm_connection_pool(): Open the pooled database connections ahead of the first query.
+        send_query(): Read the query inputs and schedule the database query.
+        cancel_query(): Cancel the queued and running queries of the window on the server.
+        send_query_thread(): Perform the database query on a scheduler thread to prevent freezing windows.
+        send_all_products_query(): Query every product in one scan.
+        open_results(): Open the results window of a finished query.
+        show_phase(): Show the phase of the query, with a determinate progress bar when its total is known.
+        show_progress(): Show the rows read so far, the rows per second and the time left.
+        show_done(): Fill the progress bar once the query finished.
+        show_query_error(): Report a failed query.
         on_closing(): Handle the closing event of the main window.
-        open_tabs_window(arr): Open a new window to display query results.
+        open_tabs_window(): Open a new window to display query results.
+        open_product_windows(): Open a results window for every product with data.
 
     """
 
@@ -42,8 +60,21 @@ class Application(tk.Tk, DatabaseConnector):
         self.resize = False
         self.resizable(self.resize, self.resize)
         self.dropdown_box_selection = ''
+        self.fetch_started = None
+        self.sent_queries = {}
         self.create_widgets()
 
+        # The query threads post their progress here, only the Tk thread touches the widgets
+        self.dispatcher = UIDispatcher(self)
+        self.dispatcher.on('phase', self.show_phase)
+        self.dispatcher.on('progress', self.show_progress)
+        self.dispatcher.on('done', self.show_done)
+        self.dispatcher.on('error', self.show_query_error)
+        self.dispatcher.start()
+
+        # Open the first pooled connection in the background so the first query does not wait for the login
+        threading.Thread(target=self.warm_connection_pool, daemon=True).start()
+
     def create_widgets(self):
         """
         Create and layout GUI components.
@@ -51,8 +82,11 @@ class Application(tk.Tk, DatabaseConnector):
         Components:
             - Dropdown menu for selecting a product.
             - Calendars for selecting start and end dates.
+            - Checkbox to open the results with a server side summary and load the test runs on demand.
             - Button to send a query.
+            - Button to cancel the queries that are queued or running.
             - Progress bar for indicating query processing.
+            - Label with running statistics while the query results arrive.
 
         """
         frame = ttk.Frame(self)
@@ -62,7 +96,7 @@ class Application(tk.Tk, DatabaseConnector):
         label = ttk.Label(frame, text="Select the Product: ")
         label.grid(row=0, column=1, padx=5, pady=50)
 
-        values = ['K5', 'K123s', 'ShotTimer', 'HUD', 'Drop', 'SpeedCoach', 'Coxbox']
+        values = create_query.registry.names() + [ALL_PRODUCTS]
         self.dropdown_box_selection = ttk.Combobox(frame, values=values)
         self.dropdown_box_selection.grid(row=0, column=2, padx=5, pady=50)
 
@@ -80,94 +114,322 @@ class Application(tk.Tk, DatabaseConnector):
         self.end_calendar = tkcalendar.Calendar(frame, selectmode='day')
         self.end_calendar.grid(row=1, column=3, padx=5, pady=5)
 
+        # Summary first: only the counts are queried, the test runs are loaded when the Final Table is opened
+        self.summary_first = tk.BooleanVar(value=False)
+        summary_check = ttk.Checkbutton(frame, text="Summary first", variable=self.summary_first)
+        summary_check.grid(row=9, column=3, padx=5, pady=40)
+
         # Button to send query
         send_query_button = ttk.Button(frame, text="Send Query", command=self.send_query)
         send_query_button.grid(row=9, column=2, columnspan=1, padx=50, pady=40)
 
+        # Button to stop the running query on the server instead of waiting for it
+        cancel_query_button = ttk.Button(frame, text="Cancel", command=self.cancel_query)
+        cancel_query_button.grid(row=9, column=1, columnspan=1, padx=5, pady=40)
+
         # Loading bar
-        self.loading_bar = ttk.Progressbar(frame, orient='horizontal', length=200, mode='indeterminate')
+        self.loading_bar = ttk.Progressbar(frame, orient='horizontal', length=200, mode='determinate')
         self.loading_bar.grid(row=10, column=2, columnspan=1, padx=50, pady=10)
 
-    def convertToProgramIdentifier(self):
+        # Running statistics while the query results arrive
+        self.progress_label = ttk.Label(frame, text="")
+        self.progress_label.grid(row=11, column=1, columnspan=3, padx=5, pady=5)
+
+    def warm_connection_pool(self):
         """
-        Convert the selected product name in the dropdown to a program name.
+        Open the pooled database connections ahead of the first query and refresh the product sequence file paths.
 
-        Uses predefined mappings to convert the selected value.
+        Failures are only printed, the query itself reports connection problems to the user.
 
         """
-        i = 0
-        dropdown_items = ['K5', 'K123s', 'ShotTimer', 'HUD', 'Drop', 'SpeedCoach', 'Coxbox']
-        key = ['k5', ['k123', 'k3550', 'k2700', "#Multiple_Params"], 'kst', 'hud', 'drop', '457042', 'coxbox']
-        string = self.dropdown_box_selection.get()
-        for row in dropdown_items:
-            if string == row:
-                self.dropdown_box_selection.set(key[i])
-                break
-            i += 1
-        print(self.dropdown_box_selection.get())
+        try:
+            create_query.pool.fill()
+        except Exception as e:
+            print(f"Could not pre-open a database connection: {e}")
+            return
+        create_query.refreshProducts(background=False)
 
     def send_query(self):
         """
-        Trigger a separate thread to handle the database query.
+        Read the query inputs and schedule the database query.
+
+        The widgets are only read here on the Tk thread, the query reports back through the dispatcher.
+        Sending the same query again while it is queued or running joins it instead of querying the server twice,
+        and a different query replaces the one still waiting in the queue.
+
+        """
+        start_date = datetime.strptime(str(self.start_calendar.get_date()), "%m/%d/%y").strftime("%Y-%m-%d 00:00:00")
+        end_date = datetime.strptime(str(self.end_calendar.get_date()), "%m/%d/%y").strftime("%Y-%m-%d 23:59:59")
+        product = self.dropdown_box_selection.get()
+        summary_first = self.summary_first.get()
+        cancel_token = CancelToken()
+        future = create_query.scheduler.submit(
+            ('query', product, start_date, end_date, summary_first),
+            lambda: self.send_query_thread(start_date, end_date, product, summary_first, cancel_token),
+            owner=self, user=create_query.USER)
+
+        # A query that was sent already opens its window once, and keeps the token of its first request
+        if future not in self.sent_queries:
+            self.sent_queries[future] = cancel_token
+            future.add_done_callback(lambda done: self.dispatcher.call(self.open_results, done))
+
+    def cancel_query(self):
+        """
+        Cancel the queries of the window.
+
+        Queued queries are dropped from the scheduler, running queries are stopped on the server so an abandoned
+        scan does not keep using its capacity. Their connections go back to the pool.
 
         """
-        threading.Thread(target=self.send_query_thread).start()
+        for future, cancel_token in list(self.sent_queries.items()):
+            if not future.cancel():
+                cancel_token.cancel()
 
-    def send_query_thread(self):
+    def send_query_thread(self, start_date, end_date, product, summary_first, cancel_token=None):
         """
-        Perform the database query in a separate thread.
+        Perform the database query on a scheduler thread.
+
+        - Count the test runs of the range so the progress bar has a total, on the server only with
+          create_query.COUNT_ON_SERVER set.
+        - Stream the query results batch by batch using the create_query module.
+        - Post the progress and running statistics to the dispatcher.
 
-        - Convert selected product name using convertToProgramIdentifier.
-        - Extract start and end dates.
-        - Create a query using create_query module.
-        - Remove repeated Step_IDs and display in a new window.
+        Parameters:
+            start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+            end_date (str): End of the range, 'YYYY-MM-DD HH:MM:SS'.
+            product (str): The product selected in the dropdown.
+            summary_first (bool): Only query the summary, the window loads the test runs when they are needed.
+            cancel_token (CancelToken, optional): Stops the statements of the query when the query is cancelled.
+
+        Returns:
+            tuple: The kind of the result, the (start_date, end_date, product) it was queried for and the result:
+            'products' with the results of every product, 'summary' with the summary counts or 'runs' with a
+            RunPreprocessor. The windows query their Refresh and details for this range and product, not for the
+            inputs selected by the time they open.
 
         """
-        self.loading_bar.start()
-        self.convertToProgramIdentifier()
-        start_date = datetime.strptime(str(self.start_calendar.get_date()), "%m/%d/%y").strftime("%Y-%m-%d 00:00:00")
-        end_date = datetime.strptime(str(self.end_calendar.get_date()), "%m/%d/%y").strftime("%Y-%m-%d 23:59:59")
-        data = create_query.createQuery(start_date, end_date, self.dropdown_box_selection.get())
-
-        # Remove repeated step IDs from the queries output
-        unique_ids = {}
-        query_results = []
-        for row in data:
-            if row[0] not in unique_ids:
-                unique_ids[row[0]] = True
-                query_results.append(row)
+        query = (start_date, end_date, product)
+        if product == ALL_PRODUCTS:
+            return 'products', query, self.send_all_products_query(start_date, end_date, cancel_token)
+        if summary_first:
+            # Only the counts cross the network, the window loads the test runs when they are needed
+            self.dispatcher.post('phase', "Counting the units on the server...", None)
+            summary = create_query.createSummaryQuery(start_date, end_date, product, cancel_token)
+            self.dispatcher.post('done', "")
+            return 'summary', query, summary
+
+        # The count only gives the progress bar a total, the rows are read without it when it fails or the range is
+        # not cached and counting on the server is off
+        self.dispatcher.post('phase', "Counting the test runs...", None)
+        try:
+            total = create_query.countQuery(start_date, end_date, product, cancel_token)
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            print(f"The test runs could not be counted, reading them without a total: {e}")
+            total = None
+        if total is None:
+            self.dispatcher.post('phase', "Reading the test runs...", None)
+        else:
+            self.dispatcher.post('phase', f"Reading {total} test runs...", total)
+
+        # Stream the rows in batches straight into the columnar table, no row is kept after it was read
+        # The serial index and the error counts are built in the same pass, so the window does not read them again
+        query_results = RunPreprocessor()
+        for batch in create_query.streamQuery(start_date, end_date, product, cancel_token=cancel_token):
+            query_results.feed(batch)
+
+            # Post running statistics while the rest of the query is still being read
+            errors = query_results.errors
+            self.dispatcher.post('progress', len(query_results.table), total,
+                                 f"Units: {errors.units} | Passed: {errors.passed} | Failed: {errors.failed} | "
+                                 f"Highest Error: {errors.highest()}")
+        self.dispatcher.post('done', f"Test runs: {len(query_results.table)}")
+        return 'runs', query, query_results
+
+    def send_all_products_query(self, start_date, end_date, cancel_token=None):
+        """
+        Query every product of the dropdown in one scan of the date range.
+
+        Parameters:
+            start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+            end_date (str): End of the range, 'YYYY-MM-DD HH:MM:SS'.
+            cancel_token (CancelToken, optional): Stops the statements of the query when the query is cancelled.
+
+        Returns:
+            dict: The query results of every product.
+
+        """
+        self.dispatcher.post('phase', "Reading the test runs of every product...", None)
+        results = create_query.createMultiProductQuery(start_date, end_date, create_query.registry.names(),
+                                                       cancel_token=cancel_token)
+        self.dispatcher.post('done', " | ".join(f"{product}: {len(rows)}" for product, rows in results.items()))
+        return results
+
+    def open_results(self, future):
+        """
+        Open the results window of a finished query, on the Tk thread.
+
+        Parameters:
+            future (Future): The future of the query, a superseded query is cancelled and opens nothing.
+
+        """
+        self.sent_queries.pop(future, None)
+        if future.cancelled():
+            return
+        if isinstance(future.exception(), QueryCancelled):
+            self.loading_bar.stop()
+            self.loading_bar.config(mode='determinate', value=0)
+            self.progress_label.config(text="The query was cancelled")
+            return
+        if isinstance(future.exception(), QueryTimeout):
+            # Ranges that time out are split and retried, this one failed even at the shortest range
+            self.show_query_error(f"{future.exception()} The server is overloaded, please try again later.")
+            return
+        if future.exception() is not None:
+            self.show_query_error(future.exception())
+            return
+        kind, (start_date, end_date, product), result = future.result()
+        if kind == 'products':
+            self.open_product_windows(result, start_date, end_date)
+        elif kind == 'summary':
+            self.open_tabs_window(None, start_date, end_date, product, result)
+        else:
+            self.open_tabs_window(result, start_date, end_date, product)
+
+    def show_phase(self, text, total):
+        """
+        Show the phase of the query.
+
+        Parameters:
+            text (str): What the query is doing.
+            total (int): The number of rows the phase reads, None when it is not known and the bar only shows activity.
+
+        """
+        self.progress_label.config(text=text)
+        self.loading_bar.stop()
+        if total is None:
+            self.loading_bar.config(mode='indeterminate')
+            self.loading_bar.start()
+            return
+        self.loading_bar.config(mode='determinate', maximum=max(total, 1), value=0)
+        self.fetch_started = time.time()
+
+    def show_progress(self, rows, total, statistics):
+        """
+        Show the rows read so far against the total, with the rows per second and the estimated time left.
+
+        Only the latest progress event of a drain is shown, see UIDispatcher.
+
+        Parameters:
+            rows (int): The test runs read so far.
+            total (int): The test runs counted before the rows were streamed, None when they could not be counted.
+            statistics (str): The running statistics of the rows read so far.
+
+        """
+        if total is None:
+            # The bar only shows activity, see show_phase
+            self.progress_label.config(text=f"Test runs: {rows}\n{statistics}")
+            return
+        elapsed = max(time.time() - self.fetch_started, 1e-6)
+        rate = rows / elapsed
+        # Runs recorded after the count may make the query return a few more rows than counted
+        remaining = max(total - rows, 0)
+        eta = f"{remaining / rate:.0f} s" if rate else "-"
+        self.loading_bar.config(value=min(rows, total))
+        self.progress_label.config(text=f"Test runs: {rows} of {total} | {rate:.0f} rows/s | ETA: {eta}\n{statistics}")
+
+    def show_done(self, text):
+        """
+        Fill the progress bar once the query finished and show what it returned.
+        """
+        self.loading_bar.stop()
+        self.loading_bar.config(mode='determinate', maximum=1, value=1)
+        self.progress_label.config(text=text)
+
+    def show_query_error(self, error):
+        """
+        Reset the progress bar and report a failed query.
+        """
         self.loading_bar.stop()
-        self.open_tabs_window(query_results)
+        self.loading_bar.config(mode='determinate', value=0)
+        self.progress_label.config(text="")
+        messagebox.showerror("Error", f"Error: The query failed: {error}")
 
     def on_closing(self):
         """
         Handle the closing event of the main window.
 
-        Closes the main window.
+        Stops the running queries and closes the main window and the pooled database connections.
 
         """
+        self.cancel_query()
+        create_query.pool.close_all()
         self.destroy()
 
-    def open_tabs_window(self, query_results):
+    def open_tabs_window(self, query_results, start_date, end_date, product, summary=None):
         """
         Open a new window to display query results.
 
         Parameters:
-            arr (list): List of query results.
+            query_results (RunPreprocessor): The test runs of the query, None when only the summary was queried.
+            start_date (str): Start of the queried range, 'YYYY-MM-DD HH:MM:SS'.
+            end_date (str): End of the queried range, 'YYYY-MM-DD HH:MM:SS'.
+            product (str): The product the query was sent for.
+            summary (list, optional): The (passed, error type, units) counts of a summary query.
 
         """
         from tabs_window import TabsWindow
         self.withdraw()
 
-        if query_results == []:
-            messagebox.showerror("Error", "Error: No product in specified date range or SQL Overload")
+        if not summary and (query_results is None or len(query_results.table) == 0):
+            messagebox.showerror("Error", "Error: No test runs of the product in the specified date range")
 
-        new_window = TabsWindow(self, query_results, self.start_calendar.get_date(), self.end_calendar.get_date())
+        new_window = TabsWindow(self, query_results, start_date, end_date, product, summary)
         new_window.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.wait_window(new_window)
 
+    def open_product_windows(self, results, start_date, end_date):
+        """
+        Open a results window for every product that has test runs in the date range.
+
+        The application is closed once the last of the windows is closed.
+
+        Parameters:
+            results (dict): The query results of every product.
+            start_date (str): Start of the queried range, 'YYYY-MM-DD HH:MM:SS'.
+            end_date (str): End of the queried range, 'YYYY-MM-DD HH:MM:SS'.
+
+        """
+        from tabs_window import TabsWindow
+        self.withdraw()
+
+        windows = []
+        for product, query_results in results.items():
+            if query_results:
+                new_window = TabsWindow(self, query_results, start_date, end_date, product)
+                new_window.title(f"CTS Statistics Analyzer - {product}")
+                windows.append(new_window)
+
+        if not windows:
+            messagebox.showerror("Error", "Error: No test runs of the product in the specified date range")
+            self.deiconify()
+            return
+
+        def close_window(window):
+            window.destroy()
+            windows.remove(window)
+            if not windows:
+                self.on_closing()
+
+        for new_window in windows:
+            new_window.protocol("WM_DELETE_WINDOW", lambda window=new_window: close_window(window))
+
 
 if __name__ == "__main__":
+    # The worker processes reading very large query outputs start here in the frozen executable, see parallel_analysis
+    multiprocessing.freeze_support()
+
     # Instantiate the Application object and start the Tkinter main loop.
     try:
         app = Application()
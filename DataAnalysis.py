@@ -1,16 +1,22 @@
-from collections import Counter
+from error_aggregator import ErrorAggregator
+from result_table import Selection, format_timestamps
+from serial_index import SerialIndex
+from yield_analytics import YieldAnalytics
 
 # The purpose of this class is to hold data processing methods which are used in handling data to display
 # in the tabs_window class
 class DataAnalysis:
-    def __init__(self, query_output):
+    def __init__(self, query_output, serial_index=None):
         """
         Initializes the DataAnalysis class with the query output.
 
         Parameters:
-        - query_output: List of rows obtained from a database query.
+        - query_output: ResultTable holding the test runs obtained from a database query.
+        - serial_index: SerialIndex of the table when it was already built while the rows were read.
         """
         self.query_output = query_output
+        # Built once for the dataset so a lookup does not scan every row
+        self.serial_index = serial_index if serial_index is not None else SerialIndex(query_output)
 
     def get_serial_info(self, serial_number):
         """
@@ -18,37 +24,70 @@ class DataAnalysis:
 
         As well as formats the serial number's information for display
 
+        Only the exact serial number matches. A serial number typed the way the Final Table shows it, padded with
+        zeros to three digits, is found as well.
+
         Parameters:
         - serial_number: Serial number to filter the rows.
 
         Returns:
-        - List of matching rows containing elements at indices 0, 2, 3, and 4.
+        - List of matching rows in date order containing the ID, test date, status and error type.
         """
+        serial_number = serial_number.strip()
+        positions = self.serial_index.positions(serial_number)
+        if not positions and len(serial_number) == 3:
+            # "007" in the Final Table may stand for "7" or "07"
+            for start in range(1, 3):
+                if serial_number[start - 1] != '0':
+                    break
+                positions = self.serial_index.positions(serial_number[start:])
+                if positions:
+                    break
+
+        # The test dates of every run are formatted at once
+        runs = Selection(self.query_output, positions)
         matching_rows = []
-        for row in self.query_output:
-            if row[1] in serial_number:
-                matching_rows.append([row[0], row[2], row[3], row[4]])
+        for position, date_tested in zip(positions, format_timestamps(runs.timestamps())):
+            row = self.query_output.row(position)
+            matching_rows.append([row.id, date_tested, row.status, row.error_type])
         return matching_rows
 
+    def find_serials(self, prefix, limit=20):
+        """
+        Finds the serial numbers starting with a prefix, for type-ahead in the serial number entry.
+
+        Parameters:
+        - prefix: The start of the serial numbers.
+        - limit: The most serial numbers to return.
+
+        Returns:
+        - List of matching serial numbers in sorted order.
+        """
+        return self.serial_index.prefix(prefix.strip(), limit)
+
     def get_error_count(self, input_arr):
         """
         Counts the occurrences of error types in the given input array and returns the results sorted by count.
 
         Example: [Sleep Current, 5] which is the error type and the number of occurrences in the dict
 
+        Failed runs without an error type are counted as "Terminated". Windows that keep counting while rows
+        arrive use an ErrorAggregator directly.
+
         Parameters:
-        - input_arr: List of dictionaries representing data rows.
+        - input_arr: Selection or list of RowView objects representing data rows.
 
         Returns:
         - List of tuples containing error types and their counts, sorted in descending order of count.
         """
-        errors = []
-        for row in input_arr:
-            if row['status'] == 'Fail':
-                if row['error_type'] == "":
-                    row['error_type'] = "Terminated"
-                errors.append(row['error_type'])
-        count_dict = Counter(errors)
-        result = [(key, value) for key, value in count_dict.items()]
-        sorted_error_count = sorted(result, key=lambda x: float(x[1]), reverse=True)
-        return sorted_error_count
+        return ErrorAggregator(input_arr).ranking()
+
+    def get_yield_report(self):
+        """
+        Computes the yield and retest figures of the query output: first pass yield, final yield, the time to pass
+        after a failed first run, the retest distribution and the yield of every day.
+
+        Returns:
+        - List of (metric, value) tuples formatted for display.
+        """
+        return YieldAnalytics(self.query_output).report()
@@ -0,0 +1,161 @@
+import time
+import tracemalloc
+from collections import Counter
+
+import query_builder
+import standin_db
+from error_aggregator import ErrorAggregator
+from run_preprocessor import RunPreprocessor
+
+# This script compares the single pass RunPreprocessor against the separate passes the app made over the query
+# output before, with lists and dictionaries, on rows queried from the local SQLite stand-in
+# It prints how often each approach reads the rows, the memory it allocates and keeps, and the time it takes, and
+# checks that both produce the same most recent runs and error counts
+# The rows are read from the stand-in inside every measurement, so the kept memory includes the query output rows an
+# approach holds on to and not only the structures it builds from them
+
+
+class CountingRows:
+    """
+    A list of rows that counts how often it is read from start to end.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.passes = 0
+
+    def __iter__(self):
+        self.passes += 1
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def dedup_stream(rows):
+    """
+    Drops the repeated IDs of the streamed batches, like create_query.cleanBatch does before every approach.
+    """
+    seen_ids = set()
+    streamed = []
+    for row in rows:
+        if row[0] not in seen_ids:
+            seen_ids.add(row[0])
+            streamed.append(row)
+    return streamed
+
+
+def legacy_preprocess(rows):
+    """
+    The passes the app made before: ID dedup while streaming and again in the window, the most recent run of every
+    serial number, a dictionary per run for expansion, the error counts and the statistics label comprehensions.
+
+    Returns:
+        dict: Everything the window kept: the streamed rows (input_arr), the deduplicated rows (data_arr), the most
+        recent runs (dict_data), the runs for expansion (ids_data), the error counts and the passed and failed units,
+        and the passes over the runs after streaming and over the most recent runs.
+    """
+    streamed = CountingRows(dedup_stream(rows))
+
+    seen_ids = set()
+    data_arr = []
+    for row in streamed:
+        if row[0] not in seen_ids:
+            data_arr.append(row)
+            seen_ids.add(row[0])
+    data_arr = CountingRows(data_arr)
+
+    most_recent = {}
+    for item in streamed:
+        status = 'Pass' if item[3].lower() == 'passed' else 'Fail'
+        if item[1] not in most_recent or item[2] > most_recent[item[1]]['date_tested']:
+            most_recent[item[1]] = {'serial_number': item[1].zfill(3), 'status': status, 'date_tested': item[2],
+                                    'error_type': item[4]}
+    dict_data = CountingRows(list(most_recent.values()))
+
+    ids_data = []
+    for item in data_arr:
+        ids_data.append({'serial_number': item[1], 'id': f'{item[0]}', 'date_tested': item[2],
+                         'status': 'Pass' if item[3].lower() == 'passed' else 'Fail', 'error_type': item[4],
+                         'html_file': 'none'})
+
+    errors = Counter(row['error_type'] or "Terminated" for row in dict_data if row['status'] == 'Fail')
+    passed_units = len([row for row in dict_data if row['status'] == 'Pass'])
+    failed_units = len([row for row in dict_data if row['status'] == 'Fail'])
+    return {'input_arr': streamed, 'data_arr': data_arr, 'dict_data': dict_data, 'ids_data': ids_data,
+            'errors': errors, 'passed_units': passed_units, 'failed_units': failed_units,
+            'run_passes': streamed.passes + data_arr.passes, 'serial_passes': dict_data.passes}
+
+
+def stage_preprocess(rows):
+    """
+    The single pass, reading the streamed rows into a RunPreprocessor. The serial index is built like the window
+    builds it, so the sort is measured too.
+    """
+    stage = RunPreprocessor(dedup_stream(rows))
+    stage.index.sync()
+    return stage
+
+
+def measure(function, load_rows):
+    """
+    Reads the rows with load_rows and runs a function on them, and returns its result, the passes over the rows,
+    the time it took, the peak memory it allocated and the memory it still holds afterwards. The time is the best of
+    three separate runs, tracing the memory slows every allocation down.
+    """
+    elapsed = None
+    for _ in range(3):
+        rows = CountingRows(load_rows())
+        time_start = time.time()
+        function(rows)
+        run_time = time.time() - time_start
+        elapsed = run_time if elapsed is None else min(elapsed, run_time)
+        del rows
+
+    tracemalloc.start()
+    rows = CountingRows(load_rows())
+    result = function(rows)
+    passes = rows.passes
+    # The rows are only kept when the result still refers to them
+    del rows
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, passes, elapsed, peak, kept
+
+
+def main():
+    conn = standin_db.connect()
+    uut_count = standin_db.populate(conn, units=20000)
+    print(f"Stand-in database: {uut_count} UUT results")
+
+    patterns = ['k5', 'k123', 'k3550', 'kst', 'hud', 'drop', '457042', 'coxbox']
+    query, params = query_builder.build_uut_query("2023-11-01 00:00:00", "2023-11-30 23:59:59", patterns,
+                                                  query_builder.SQLITE)
+
+    def load_rows():
+        rows = conn.execute(query, params).fetchall()
+        # Every row arrives twice, like the overlapping batches the dedup passes were written for
+        return rows + rows[::2]
+
+    legacy, legacy_passes, legacy_time, legacy_peak, legacy_kept = measure(legacy_preprocess, load_rows)
+    stage, stage_passes, stage_time, stage_peak, stage_kept = measure(stage_preprocess, load_rows)
+
+    assert len(legacy['dict_data']) == len(stage.table.latest), \
+        "The approaches found a different number of serial numbers"
+    assert legacy['passed_units'] == stage.errors.passed and legacy['failed_units'] == stage.errors.failed, \
+        "The totals differ"
+    assert ErrorAggregator(stage.table.most_recent()).counts == stage.errors.counts, \
+        "The single pass counted different errors than counting the most recent runs"
+    assert sorted(legacy['errors'].items()) == sorted((error_type, count) for error_type, count
+                                                      in stage.errors.ranking() if count), "The error counts differ"
+
+    print(f"\n{len(load_rows())} query output rows, {len(stage.table)} test runs, "
+          f"{len(stage.table.latest)} serial numbers")
+    print(f"  separate passes: {legacy_passes + legacy['run_passes']} over the rows, {legacy['serial_passes']} over "
+          f"the serials, {legacy_peak / 1e6:.1f} MB peak, {legacy_kept / 1e6:.1f} MB kept, {legacy_time:.3f} s")
+    print(f"  single pass:     {stage_passes} over the rows, 0 over the serials, 1 sort of the columns, "
+          f"{stage_peak / 1e6:.1f} MB peak, {stage_kept / 1e6:.1f} MB kept, {stage_time:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+import os
+import threading
+
+from result_cache import CACHE_DIR
+
+
+class ChunkSizes:
+    """
+    Learns, for every product, the longest date range the server answers in one query without timing out.
+
+    A query that timed out or overloaded the server is split into shorter ranges until they succeed. The longest
+    range that succeeded below the shortest one that failed is kept in a local file and used as the partition size
+    of the next queries of the product, so they do not start with the same doomed scans. While every range of a
+    product succeeds, its size grows by a quarter per query up to the default partition size.
+
+    Attributes:
+        path (str): The JSON file the sizes are kept in.
+        min_days (float): The shortest size that is ever used.
+
+    Methods:
+        get: Returns the partition size to start the queries of a product with.
+        record: Learns from the ranges a query tried.
+    """
+
+    def __init__(self, path=None, min_days=1 / 24):
+        """
+        Initializes the sizes and loads the ones learned in earlier sessions.
+
+        Args:
+            path (str, optional): The JSON file for the sizes, chunk_sizes.json in CACHE_DIR by default.
+            min_days (float, optional): The shortest size that is ever used, in days.
+        """
+        self.path = path if path is not None else os.path.join(CACHE_DIR, "chunk_sizes.json")
+        self.min_days = min_days
+        self._lock = threading.Lock()
+        self._sizes = {}
+        try:
+            with open(self.path) as file:
+                self._sizes = {product: float(days) for product, days in json.load(file).items()}
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def get(self, product, default):
+        """
+        Returns the partition size to start the queries of a product with.
+
+        Args:
+            product (str): The product of the query.
+            default (float): The partition size in days when nothing was learned for the product.
+
+        Returns:
+            float: The learned size in days, at most default.
+        """
+        with self._lock:
+            days = self._sizes.get(product)
+        return default if days is None else min(days, default)
+
+    def record(self, product, outcomes, default):
+        """
+        Learns from the ranges a query tried and saves the new size of the product.
+
+        Args:
+            product (str): The product of the query.
+            outcomes (list): (days, worked) tuples, the length of every range the query sent and whether it
+                returned its rows.
+            default (float): The partition size in days the size grows back to.
+        """
+        worked = [days for days, success in outcomes if success]
+        failed = [days for days, success in outcomes if not success]
+        if not worked:
+            return
+        with self._lock:
+            if failed:
+                shorter = [days for days in worked if days < min(failed)]
+                days = max(shorter) if shorter else min(worked)
+            elif product in self._sizes and max(worked) >= self._sizes[product]:
+                # One busy afternoon should not keep the queries of a product short forever
+                days = min(self._sizes[product] * 1.25, default)
+            else:
+                # Ranges shorter than the learned size say nothing about it
+                return
+            # Whole seconds, the partitions of the size are sent with dates without fractions of a second
+            days = round(max(days, self.min_days) * 86400) / 86400
+            if self._sizes.get(product) == days:
+                return
+            self._sizes[product] = days
+            sizes = dict(self._sizes)
+        print(f"Partition size of {product}: {days:.2f} days")
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as file:
+                json.dump(sizes, file)
+        except OSError as e:
+            print(f"The partition sizes could not be saved: {e}")
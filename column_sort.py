@@ -0,0 +1,123 @@
+import numpy as np
+
+
+def display_key(value):
+    """
+    Returns a sort key for a value shown in a Treeview, numbers sort by value and before any text.
+
+    Args:
+        value (str): The text of a cell.
+
+    Returns:
+        tuple: (0, number) for numbers, (1, text) for anything else.
+    """
+    try:
+        return 0, float(value)
+    except (TypeError, ValueError):
+        return 1, value
+
+
+class ColumnSorter:
+    """
+    Sorts rows by typed column keys and caches the order of every sort.
+
+    Every column has a key function returning a typed value of a row, e.g. an ID, a timestamp or a pass/fail
+    status, instead of the text shown for it. The keys of a column are read once and turned into integer ranks, so
+    sorting is a single NumPy argsort or lexsort. The order of each column and direction, and of each multi column
+    sort, is cached until the rows change.
+
+    A sort is a list of (column, descending) pairs, the first pair is the primary key and the later ones break its
+    ties. Rows with equal keys keep the order they were added in.
+
+    Attributes:
+        keys (dict): The key function of every sortable column.
+        rows (list): The rows in the order they were added.
+
+    Methods:
+        set_rows: Replaces every row.
+        add: Adds a row at the end.
+        invalidate: Forgets the cached orders after rows were changed in place.
+        sorted: Returns the rows in the order of a sort.
+    """
+
+    def __init__(self, keys, rows=None):
+        """
+        Initializes the sorter.
+
+        Args:
+            keys (dict): Column name to a function returning the key of a row, keys of one column must be comparable.
+            rows (list, optional): The rows to sort.
+        """
+        self.keys = keys
+        self.rows = []
+        self._ranks = {}
+        self._orders = {}
+        self.set_rows(rows or [])
+
+    def set_rows(self, rows):
+        """
+        Replaces every row and forgets the cached orders.
+        """
+        self.rows = list(rows)
+        self.invalidate()
+
+    def add(self, row):
+        """
+        Adds a row at the end and forgets the cached orders.
+        """
+        self.rows.append(row)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forgets the cached ranks and orders, to be called after a row was changed in place.
+        """
+        self._ranks = {}
+        self._orders = {}
+
+    def sorted(self, sort):
+        """
+        Returns the rows in the order of a sort.
+
+        Args:
+            sort (list): (column, descending) pairs, the first one is the primary key.
+
+        Returns:
+            list: The rows in sorted order.
+        """
+        order = self._order(tuple(sort))
+        rows = self.rows
+        return [rows[index] for index in order.tolist()]
+
+    def _order(self, sort):
+        """
+        Returns the cached permutation of the rows for a sort, computing it on the first request.
+        """
+        order = self._orders.get(sort)
+        if order is None:
+            # Ranks of a descending column are negated, argsort and lexsort are stable either way
+            keys = [-self._rank(column) if descending else self._rank(column) for column, descending in sort]
+            if len(keys) == 1:
+                order = np.argsort(keys[0], kind='stable')
+            else:
+                # lexsort sorts by its last key first
+                order = np.lexsort(keys[::-1])
+            self._orders[sort] = order
+        return order
+
+    def _rank(self, column):
+        """
+        Returns the rank of the key of every row in a column, equal keys share a rank.
+        """
+        ranks = self._ranks.get(column)
+        if ranks is None:
+            key = self.keys[column]
+            values = [key(row) for row in self.rows]
+            if values and all(isinstance(value, int) for value in values):
+                # Integers, booleans and timestamps are their own ranks
+                ranks = np.array(values, dtype=np.int64)
+            else:
+                codes = {value: rank for rank, value in enumerate(sorted(set(values)))}
+                ranks = np.fromiter((codes[value] for value in values), dtype=np.int64, count=len(values))
+            self._ranks[column] = ranks
+        return ranks
@@ -0,0 +1,85 @@
+import time
+
+import query_builder
+import standin_db
+
+# This script compares the one row per UUT query against the query the app used before on the local SQLite stand-in
+# It prints the rows and bytes each query returns, the rows the legacy joins build on the server before DISTINCT
+# removes them, and checks that both queries describe the same UUT results with the same columns
+
+
+def result_bytes(rows):
+    """
+    Estimates how many bytes a result puts on the wire: the text length of strings and 8 bytes for other values.
+    """
+    total = 0
+    for row in rows:
+        for value in row:
+            total += len(value.encode()) if isinstance(value, str) else 8
+    return total
+
+
+def compare_columns(new_rows, legacy_rows):
+    """
+    Checks that every row of the new query has the ID, serial number, date and status of the legacy rows of its UUT
+    result, and one of their step names.
+
+    The legacy query joins the failing steps by serial number, so a UUT result may come back once for the failing
+    step of every failed run of its serial number; its own failing step is one of them.
+
+    Returns:
+        int: The number of UUT results the legacy query returned with the failing steps of other runs too.
+    """
+    legacy = {}
+    for row in legacy_rows:
+        legacy.setdefault(row[0], set()).add(tuple(row[:5]))
+    other_steps = 0
+    for row in new_rows:
+        legacy_columns = legacy[row[0]]
+        assert {columns[:4] for columns in legacy_columns} == {tuple(row[:4])}, \
+            f"The queries returned different columns for UUT result {row[0]}"
+        assert row[4] in {columns[4] for columns in legacy_columns}, \
+            f"The queries returned different step names for UUT result {row[0]}"
+        other_steps += len(legacy_columns) > 1
+    return other_steps
+
+
+def run(conn, query, params):
+    """
+    Runs a query and returns its rows and the time it took.
+    """
+    time_start = time.time()
+    rows = conn.execute(query, params).fetchall()
+    return rows, time.time() - time_start
+
+
+def main():
+    conn = standin_db.connect()
+    uut_count = standin_db.populate(conn)
+    print(f"Stand-in database: {uut_count} UUT results")
+
+    start_date, end_date = "2023-11-01 00:00:00", "2023-11-30 23:59:59"
+    for program_file in ['k5', 'k123 k3550 k2700 #Multiple_Params', '457042']:
+        patterns = query_builder.program_patterns(program_file)
+        legacy_query, legacy_params = query_builder.build_legacy_query(start_date, end_date, patterns,
+                                                                       query_builder.SQLITE)
+        legacy_rows, legacy_time = run(conn, legacy_query, legacy_params)
+        joined_rows, _ = run(conn, legacy_query.replace("SELECT DISTINCT", "SELECT", 1), legacy_params)
+        new_rows, new_time = run(conn, *query_builder.build_uut_query(start_date, end_date, patterns,
+                                                                      query_builder.SQLITE))
+
+        new_ids = [row[0] for row in new_rows]
+        assert len(new_ids) == len(set(new_ids)), "The new query returned a UUT result more than once"
+        assert set(new_ids) == set(row[0] for row in legacy_rows), "The queries returned different UUT results"
+        other_steps = compare_columns(new_rows, legacy_rows)
+
+        print(f"\n{program_file}")
+        print(f"  legacy query: {len(legacy_rows):>7} rows {result_bytes(legacy_rows):>9} bytes {legacy_time:.3f} s")
+        print(f"  legacy joins: {len(joined_rows):>7} rows before DISTINCT")
+        print(f"  new query:    {len(new_rows):>7} rows {result_bytes(new_rows):>9} bytes {new_time:.3f} s")
+        print(f"  rows per UUT result: {len(legacy_rows) / max(len(new_rows), 1):.1f} -> 1.0")
+        print(f"  UUT results with the failing steps of other runs in the legacy query: {other_steps}")
+
+
+if __name__ == "__main__":
+    main()
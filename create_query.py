@@ -1,4 +1,15 @@
-from database_connector import DatabaseConnector
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
+from chunk_sizes import ChunkSizes
+from database_connector import DatabaseConnector, ConnectionPool, QueryCancelled, QueryTimeout
+from product_registry import ProductRegistry
+from query_scheduler import QueryScheduler
+from result_cache import ResultCache, DAY_FORMAT
+import query_builder
+import os
+import threading
 import time
 
 # This file interacts with database_connector by getting information on the output of the app and creating
@@ -13,71 +24,531 @@ conn_str = (
     'Trusted_Connection=yes;'
 )
 
+# SQL dialect of the server above, see query_builder
+DIALECT = query_builder.MSSQL
 
-# This method defines and sends a query to Database Connector
-def createQuery(start_date, end_date, program_file):
-    # Create a list of parameters for the SQL query
-    params = [start_date, end_date]
+# Number of partitions of a date range queried at the same time, each one on its own connection
+MAX_WORKERS = 4
 
-    # Create an instance of the DatabaseConnector class and connect to the database
-    db_connector = DatabaseConnector(conn_str)
-    db_connector.connect()
+# Number of queries of the windows running at the same time, each one may query MAX_WORKERS partitions at once
+SCHEDULER_WORKERS = 3
 
-    # SQL query to retrieve information from the database
-    # Important notes being Left Join allows for the CASE statement to provide blank STEP_Names
-    query = "SELECT DISTINCT dbo.UUT_RESULT.ID, dbo.UUT_RESULT.UUT_SERIAL_NUMBER, dbo.UUT_RESULT.START_DATE_TIME, " \
-            "dbo.UUT_RESULT.UUT_STATUS, CASE WHEN dbo.UUT_RESULT.UUT_STATUS = 'failed' THEN " \
-            "[View_Failed Top Level UUTs and Results].STEP_NAME ELSE '' END AS STEP_NAME, " \
-            "dbo.STEP_RESULT.CAUSED_SEQFAIL, dbo.STEP_RESULT.STEP_TYPE FROM dbo.UUT_RESULT " \
-            "LEFT JOIN dbo.STEP_RESULT ON dbo.UUT_RESULT.ID = dbo.STEP_RESULT.UUT_RESULT " \
-            "LEFT JOIN dbo.STEP_SEQCALL ON dbo.STEP_RESULT.ID = dbo.STEP_SEQCALL.STEP_RESULT " \
-            "LEFT JOIN [TestStandCustom].[dbo].[View_Failed Top Level UUTs and Results] " \
-            "ON dbo.[View_Failed Top Level UUTs and Results].UUT_SERIAL_NUMBER = dbo.UUT_RESULT.UUT_SERIAL_NUMBER " \
-            "WHERE dbo.UUT_RESULT.START_DATE_TIME BETWEEN ? AND ?"
-
-    # This next if statement adds the words to search for in the program files
-    # It uses SQL wild cards to do this
-    # Check if "#Multiple_Params" is present in the program_file
-    if "#Multiple_Params" in program_file:
-        parry = []
-        array = program_file.split()[:-1]
-        query += " AND (SEQUENCE_FILE_PATH LIKE ?"
-
-        # Add placeholders for each parameter in the array
-        for _ in range(len(array) - 1):
-            query += " OR SEQUENCE_FILE_PATH LIKE ?"
-
-        # Build parameter values and add them to the params list
-        for item in array:
-            parry.append("%" + item + "%")
-        params += parry
-    else:
-        query += " AND (SEQUENCE_FILE_PATH LIKE ?"
-        program_file = "%" + program_file + "%"
-        params.append(program_file)
+# Shared pool so back to back queries reuse warm connections instead of logging in to the server every time
+# It holds a connection for every partition of every scheduled query, plus the keyset pages and the product path
+# lookup which run outside the scheduler, so a query never waits for a connection another query holds
+pool = ConnectionPool(conn_str, min_size=1, max_size=SCHEDULER_WORKERS * MAX_WORKERS + 2, idle_timeout=600)
+
+# Windows user the queries are sent for, the scheduler limits how many queries of one user run at a time
+USER = os.environ.get("USERNAME") or os.environ.get("USER", "")
+
+# The queries of the windows run on this scheduler instead of a thread each, identical queries share one execution
+# Two long scans of the user run at a time, the third worker is left for the Refresh and detail loads of the windows
+scheduler = QueryScheduler(max_workers=SCHEDULER_WORKERS, per_user=2)
+
+# Seconds a query for test runs may run on the server before it is stopped, 0 for no limit
+QUERY_TIMEOUT = 600
+
+# Seconds a summary query may run, it returns a handful of rows and should be answered quickly
+SUMMARY_TIMEOUT = 120
+
+# Seconds the count of a query may run, it only gives the progress bar its total and is given up quickly
+COUNT_TIMEOUT = 30
+
+# Count the days the cache does not have on the server before they are queried, so the progress bar has a total
+# The count scans the same rows as the query, so it is off by default and only cached days are counted
+COUNT_ON_SERVER = False
+
+# Number of rows read from the server at a time when streaming a query
+BATCH_SIZE = 5000
+
+# Number of days per partition when a date range is split into several queries
+PARTITION_DAYS = 7
+
+# Shortest range in days a range that timed out is split into, shorter ranges are retried as they are
+MIN_CHUNK_DAYS = 1 / 24
+
+# Number of times a range of MIN_CHUNK_DAYS is retried before the query fails
+MAX_RETRIES = 3
+
+# Seconds waited before retrying a range that failed, doubled for every failure in a row up to MAX_BACKOFF_SECONDS
+BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 16
+
+# SQL Server errors of an overloaded server, the same query may succeed on a shorter range or a little later:
+# 1205 deadlock victim, 701 out of memory, 8645 timeout waiting for memory, 8628 timeout waiting to compile the plan
+OVERLOAD_ERRORS = ('(1205)', '(701)', '(8645)', '(8628)')
+
+# Seconds a refresh looks back before the newest run a window loaded, at least the longest test takes
+# A run is dated by its START_DATE_TIME but only recorded when it ends, so a long run that started before the newest
+# loaded run is committed after it; the runs queried again are dropped by their ID
+REFRESH_LOOKBACK = 4 * 3600
+
+# Format of the start and end dates passed to the queries
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Local cache of query results by product and day so overlapping queries only fetch the days they are missing
+try:
+    cache = ResultCache()
+except Exception as e:
+    print(f"The result cache could not be opened, every query goes to the server: {e}")
+    cache = None
+
+# The products of the dropdown and the sequence file paths they were recorded with
+registry = ProductRegistry()
+
+# The partition size every product is queried with after its queries timed out, see ChunkSizes
+chunk_sizes = ChunkSizes(min_days=MIN_CHUNK_DAYS)
+
+
+# This method splits a date range into consecutive partitions of partition_days
+# Every partition but the last one excludes its end date because it is the start date of the next partition
+def partitionRange(start_date, end_date, partition_days, end_inclusive=True):
+    start = datetime.strptime(start_date, DATE_FORMAT)
+    end = datetime.strptime(end_date, DATE_FORMAT)
+    partitions = []
+    while True:
+        next_start = start + timedelta(days=partition_days)
+        if next_start > end or (next_start == end and not end_inclusive):
+            partitions.append((start.strftime(DATE_FORMAT), end_date, end_inclusive))
+            return partitions
+        partitions.append((start.strftime(DATE_FORMAT), next_start.strftime(DATE_FORMAT), False))
+        start = next_start
+
+
+# This method returns the length of a date range in days
+def rangeDays(start_date, end_date):
+    length = datetime.strptime(end_date, DATE_FORMAT) - datetime.strptime(start_date, DATE_FORMAT)
+    return length.total_seconds() / 86400
+
+
+# This method splits a date range in two halves, the first one excludes the middle date the second one starts with
+def bisectRange(start_date, end_date, end_inclusive=True):
+    start = datetime.strptime(start_date, DATE_FORMAT)
+    end = datetime.strptime(end_date, DATE_FORMAT)
+    middle = (start + timedelta(seconds=int((end - start).total_seconds() // 2))).strftime(DATE_FORMAT)
+    return [(start_date, middle, False), (middle, end_date, end_inclusive)]
 
-    query += ") "
 
+# This method returns True for the errors a shorter range or a retry a little later may not run into again
+def isOverload(error):
+    return isinstance(error, QueryTimeout) or any(code in str(error) for code in OVERLOAD_ERRORS)
+
+
+# This method cleans one batch of rows, stripping strings and dropping IDs already seen in earlier batches
+def cleanBatch(batch, seen_ids):
+    cleaned = []
+    for rows in batch:
+        if rows[0] in seen_ids:
+            continue
+        seen_ids.add(rows[0])
+
+        # Strip leading and trailing whitespaces from string values in the result
+        for i in range(len(rows)):
+            if type(rows[i]) == str:
+                rows[i] = rows[i].strip()
+        cleaned.append(rows)
+    return cleaned
+
+
+# This method sends a query on its own pooled connection and yields the raw batches
+# The server stops the query after timeout seconds, and cancel_token.cancel() stops it from any other thread
+def streamStatement(query, params, batch_size=BATCH_SIZE, timeout=QUERY_TIMEOUT, cancel_token=None):
     # Print the final query for debugging purposes
-    print(query, tuple(params))
+    print(query, params)
+
+    # Create an instance of the DatabaseConnector class and borrow a connection from the pool
+    db_connector = DatabaseConnector(conn_str, pool=pool, timeout=timeout, cancel_token=cancel_token)
+    db_connector.connect()
 
     # Measure the execution time of the query
     time_start = time.time()
-    data = db_connector.execute_query(query, tuple(params))
-    time_end = time.time()
+    first_batch = True
+    try:
+        for batch in db_connector.stream_query(query, params, batch_size):
+            if first_batch:
+                print(f"The first rows took: {round(time.time() - time_start)} seconds")
+                first_batch = False
+            yield batch
+    except (QueryCancelled, QueryTimeout):
+        # The server stopped the statement, the connection is rolled back and reused
+        print(f"The query was stopped after: {round(time.time() - time_start)} seconds")
+        db_connector.close()
+        raise
+    except BaseException:
+        # A connection that failed or was abandoned mid query is not handed to the next caller
+        db_connector.close(discard=True)
+        raise
 
     # Calculate and print the elapsed time
-    elapsed_time = round(time_end - time_start)
+    elapsed_time = round(time.time() - time_start)
     print(f"The query took: {elapsed_time} seconds")
 
-    # Strip leading and trailing whitespaces from string values in the result
-    for rows in data:
-        for i in range(len(rows)):
-            if type(rows[i]) == str:
-                rows[i] = rows[i].strip()
-
-    # Close the database connection
+    # Return the connection to the pool
     db_connector.close()
 
+
+# This method sends the query for one partition on its own pooled connection and yields the raw batches
+def streamRange(start_date, end_date, patterns, batch_size=BATCH_SIZE, end_inclusive=True, with_path=False,
+                cancel_token=None):
+    # One row per UUT result with only the columns the windows use, see query_builder
+    query, params = query_builder.build_uut_query(start_date, end_date, patterns, DIALECT, end_inclusive, with_path)
+    yield from streamStatement(query, params, batch_size, cancel_token=cancel_token)
+
+
+# This method sends the query for one partition and splits it in two when the server times out or is overloaded
+# Each half is sent after a backoff and split again if it fails too, down to MIN_CHUNK_DAYS which is retried up to
+# MAX_RETRIES times. Rows of a failed attempt may be yielded again by its halves, callers drop them with cleanBatch
+# outcomes, when given, receives a (days, worked) tuple for every range that was sent, see ChunkSizes
+def streamAdaptive(start_date, end_date, patterns, batch_size=BATCH_SIZE, end_inclusive=True, with_path=False,
+                   cancel_token=None, outcomes=None, failures=0, retries=0):
+    days = rangeDays(start_date, end_date)
+    try:
+        yield from streamRange(start_date, end_date, patterns, batch_size, end_inclusive, with_path, cancel_token)
+    except Exception as e:
+        if not isOverload(e):
+            raise
+        if outcomes is not None:
+            outcomes.append((days, False))
+        if days <= MIN_CHUNK_DAYS and retries >= MAX_RETRIES:
+            raise
+
+        # Give the server time to recover before the next attempt
+        backoff = min(BACKOFF_SECONDS * 2 ** failures, MAX_BACKOFF_SECONDS)
+        print(f"The query of {days:.2f} days failed: {e}, retrying in {backoff} seconds")
+        if cancel_token is not None:
+            cancel_token.wait(backoff)
+        else:
+            time.sleep(backoff)
+
+        if days <= MIN_CHUNK_DAYS:
+            yield from streamAdaptive(start_date, end_date, patterns, batch_size, end_inclusive, with_path,
+                                      cancel_token, outcomes, failures + 1, retries + 1)
+            return
+        for start, end, inclusive in bisectRange(start_date, end_date, end_inclusive):
+            yield from streamAdaptive(start, end, patterns, batch_size, inclusive, with_path, cancel_token, outcomes,
+                                      failures + 1)
+        return
+    if outcomes is not None:
+        outcomes.append((days, True))
+
+
+# This method reads every row of one partition, it runs on the worker threads of a partitioned query
+def fetchRange(start_date, end_date, patterns, batch_size=BATCH_SIZE, end_inclusive=True, with_path=False,
+               cancel_token=None, outcomes=None):
+    rows = []
+    for batch in streamAdaptive(start_date, end_date, patterns, batch_size, end_inclusive, with_path, cancel_token,
+                                outcomes):
+        rows.extend(batch)
+    return rows
+
+
+# This method sends the query for a date range and yields the raw batches in START_DATE_TIME order
+# With partition_days set, a range longer than one partition is split and up to max_workers partitions are queried at
+# the same time and no more are held in memory; partitions are yielded in date order so the output is the same as for
+# a single query
+# A partition the server can not answer in time is split further, see streamAdaptive, so batches may repeat rows
+def streamServer(start_date, end_date, patterns, batch_size=BATCH_SIZE, partition_days=PARTITION_DAYS,
+                 max_workers=MAX_WORKERS, end_inclusive=True, with_path=False, cancel_token=None, outcomes=None):
+    partitions = partitionRange(start_date, end_date, partition_days, end_inclusive) if partition_days else []
+
+    # Short ranges are sent as one query that streams while the server is still sending rows
+    if len(partitions) <= 1:
+        yield from streamAdaptive(start_date, end_date, patterns, batch_size, end_inclusive, with_path, cancel_token,
+                                  outcomes)
+        return
+    if max_workers <= 1:
+        for start, end, inclusive in partitions:
+            yield from streamAdaptive(start, end, patterns, batch_size, inclusive, with_path, cancel_token, outcomes)
+        return
+
+    time_start = time.time()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = iter(partitions)
+    futures = deque()
+
+    # At most max_workers partitions are fetched or held at a time, the next one is sent as the oldest is yielded
+    def submitNext():
+        for start, end, inclusive in pending:
+            futures.append(executor.submit(fetchRange, start, end, patterns, batch_size, inclusive, with_path,
+                                           cancel_token, outcomes))
+            return
+
+    for _ in range(max_workers):
+        submitNext()
+    try:
+        while futures:
+            rows = futures.popleft().result()
+            submitNext()
+            for i in range(0, len(rows), batch_size):
+                yield rows[i:i + batch_size]
+            del rows
+    finally:
+        # Partitions that have not started yet are dropped when the caller stops early or a partition failed
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+    print(f"The {len(partitions)} partitions took: {round(time.time() - time_start)} seconds")
+
+
+# This method fetches whole days from the server, yields their cleaned rows and stores every day in the cache
+# The rows arrive in START_DATE_TIME order, so a day is complete and stored as soon as a row of a later day arrives
+# and only the rows of one day are held at a time; a failed or abandoned query keeps the days it completed
+def fetchDays(first_day, last_day, product, patterns, seen_ids, batch_size, partition_days, max_workers,
+              cancel_token=None, outcomes=None):
+    day_after = dayAfter(last_day)
+    day = first_day
+    rows = []
+    for batch in streamServer(first_day + " 00:00:00", day_after + " 00:00:00", patterns, batch_size, partition_days,
+                              max_workers, end_inclusive=False, cancel_token=cancel_token, outcomes=outcomes):
+        cleaned = cleanBatch(batch, seen_ids)
+        for row in cleaned:
+            row_day = str(row[2])[:10]
+            # Days without runs before the day of the row are stored empty
+            while day < row_day:
+                cache.put_day(product, day, rows)
+                day = dayAfter(day)
+                rows = []
+            rows.append(row)
+        yield cleaned
+
+    while day < day_after:
+        cache.put_day(product, day, rows)
+        day = dayAfter(day)
+        rows = []
+
+
+# This method returns every day of a date range, 'YYYY-MM-DD'
+def rangeDayList(start_date, end_date):
+    first = datetime.strptime(start_date[:10], DAY_FORMAT)
+    last = datetime.strptime(end_date[:10], DAY_FORMAT)
+    return [(first + timedelta(days=i)).strftime(DAY_FORMAT) for i in range((last - first).days + 1)]
+
+
+# This method returns the day after a day, 'YYYY-MM-DD'
+def dayAfter(day):
+    return (datetime.strptime(day, DAY_FORMAT) + timedelta(days=1)).strftime(DAY_FORMAT)
+
+
+# This method answers a query from the cached days and only fetches the days that are missing or expired
+def streamCached(start_date, end_date, product, patterns, seen_ids, batch_size, partition_days, max_workers,
+                 cancel_token=None, outcomes=None):
+    days = rangeDayList(start_date, end_date)
+    missing = set(cache.missing_days(product, days))
+
+    # Whole days are cached, so rows outside the requested times of the first and last day are left out
+    def inRange(row):
+        return start_date <= str(row[2]) <= end_date
+
+    # Consecutive missing days are fetched together, cached days are read one at a time to keep memory low
+    for is_missing, group in groupby(days, key=lambda day: day in missing):
+        group = list(group)
+        if is_missing:
+            for batch in fetchDays(group[0], group[-1], product, patterns, seen_ids, batch_size, partition_days,
+                                   max_workers, cancel_token, outcomes):
+                batch = [row for row in batch if inRange(row)]
+                if batch:
+                    yield batch
+            continue
+        for day in group:
+            rows = cache.get_day(product, day)
+            if rows is None:
+                # The open segment of today expired since the missing days were looked up
+                rows = [row for batch in fetchDays(day, day, product, patterns, seen_ids, batch_size, None, 1,
+                                                   cancel_token, outcomes) for row in batch]
+            else:
+                rows = cleanBatch(rows, seen_ids)
+            for i in range(0, len(rows), batch_size):
+                batch = [row for row in rows[i:i + batch_size] if inRange(row)]
+                if batch:
+                    yield batch
+
+
+# This method sends the query and yields the cleaned rows batch by batch, in START_DATE_TIME order
+# Days already in the local cache are not sent to the server again unless use_cache is False
+# product is a product name of the registry, any other value is searched for as a program identifier
+# cancel_token.cancel() stops every statement of the query, see database_connector.CancelToken
+# The range is partitioned with the size learned from the earlier timeouts of the product, see ChunkSizes
+def streamQuery(start_date, end_date, product, batch_size=BATCH_SIZE, partition_days=PARTITION_DAYS,
+                max_workers=MAX_WORKERS, use_cache=True, cancel_token=None):
+    patterns = programFilter(product)
+    seen_ids = set()
+    outcomes = []
+    learned_days = chunk_sizes.get(product, partition_days) if partition_days else partition_days
+
+    if use_cache and cache is not None:
+        yield from streamCached(start_date, end_date, product, patterns, seen_ids, batch_size, learned_days,
+                                max_workers, cancel_token, outcomes)
+    else:
+        for batch in streamServer(start_date, end_date, patterns, batch_size, learned_days, max_workers,
+                                  cancel_token=cancel_token, outcomes=outcomes):
+            cleaned = cleanBatch(batch, seen_ids)
+            if cleaned:
+                yield cleaned
+
+    if partition_days:
+        chunk_sizes.record(product, outcomes, partition_days)
+
+
+# This method defines and sends a query to Database Connector and returns every unique row
+def createQuery(start_date, end_date, product, batch_size=BATCH_SIZE, partition_days=PARTITION_DAYS,
+                max_workers=MAX_WORKERS, use_cache=True, cancel_token=None):
+    data = []
+    for batch in streamQuery(start_date, end_date, product, batch_size, partition_days, max_workers, use_cache,
+                             cancel_token):
+        data.extend(batch)
+
     # Return the retrieved data
     return data
+
+
+# This method counts the UUT results of a date range on the server
+def countRange(start_date, end_date, patterns, end_inclusive=True, cancel_token=None):
+    query, params = query_builder.build_count_query(start_date, end_date, patterns, end_inclusive)
+    count = 0
+    for batch in streamStatement(query, params, timeout=COUNT_TIMEOUT, cancel_token=cancel_token):
+        count = int(batch[0][0])
+    return count
+
+
+# This method counts the UUT results of a date range, the number of rows streamQuery will yield
+# It is sent before the rows so the progress of a streamed query can be shown against a total
+# Days the local cache answers are counted there, only the missing days are counted on the server
+# None is returned when the cached rows can not be counted, or days are missing and counting on the server is off
+def countQuery(start_date, end_date, product, cancel_token=None, use_cache=True, count_on_server=None):
+    if count_on_server is None:
+        count_on_server = COUNT_ON_SERVER
+    patterns = programFilter(product)
+    if not use_cache or cache is None:
+        return countRange(start_date, end_date, patterns, cancel_token=cancel_token) if count_on_server else None
+
+    days = rangeDayList(start_date, end_date)
+    missing = set(cache.missing_days(product, days, record=False))
+    if missing and not count_on_server:
+        return None
+    count = cache.count_rows(product, [day for day in days if day not in missing])
+    if count is None:
+        return None
+    for is_missing, group in groupby(days, key=lambda day: day in missing):
+        if is_missing:
+            group = list(group)
+            count += countRange(group[0] + " 00:00:00", dayAfter(group[-1]) + " 00:00:00", patterns, False,
+                                cancel_token)
+    return count
+
+
+# This method counts the most recent run of every serial number on the server, by status and failing step
+# Only the counts are sent back, so the summary of a long range is available long before its rows would be
+# The result is a list of (passed, error type, units) tuples, the error type is '' for passed and terminated runs
+def createSummaryQuery(start_date, end_date, product, cancel_token=None):
+    query, params = query_builder.build_summary_query(start_date, end_date, programFilter(product), DIALECT)
+    summary = []
+    for batch in streamStatement(query, params, timeout=SUMMARY_TIMEOUT, cancel_token=cancel_token):
+        summary += [(bool(row[0]), (row[1] or '').strip(), int(row[2])) for row in batch]
+    return summary
+
+
+# This method returns one keyset page of the most recent run of every serial number, ordered by serial number
+# after_serial is the last serial number of the previous page, None for the first page
+def fetchLatestPage(start_date, end_date, product, after_serial=None, page_size=500):
+    query, params = query_builder.build_latest_page_query(start_date, end_date, programFilter(product), after_serial,
+                                                          page_size, DIALECT)
+    data = []
+    seen_ids = set()
+    for batch in streamStatement(query, params, page_size):
+        data.extend(cleanBatch(batch, seen_ids))
+    return data
+
+
+# This method returns the cleaned rows of the runs started at or after since_date, for the Refresh of a window
+# It always goes to the server because the newest rows are the ones the cache may not have yet
+def createRefreshQuery(since_date, product, batch_size=BATCH_SIZE):
+    # New sequence files show up in the newest runs first, so they are matched by program name and not by the paths
+    query, params = query_builder.build_since_query(since_date, programFilter(product, use_paths=False), DIALECT)
+    data = []
+    seen_ids = set()
+    for batch in streamStatement(query, params, batch_size):
+        data.extend(cleanBatch(batch, seen_ids))
+    return data
+
+
+# This method returns the product whose program names appear in a SEQUENCE_FILE_PATH, matched like SQL Server's
+# case insensitive LIKE '%name%'; a path matching several products belongs to each of them
+def classifyPath(sequence_file_path, product_patterns):
+    path = sequence_file_path.lower()
+    return [product for product, patterns in product_patterns.items()
+            if any(pattern in path for pattern in patterns)]
+
+
+# This method queries several products in one scan of the date range and returns the rows of every product
+# products lists the product names, as used by createQuery
+# The result maps every product name to the rows createQuery would have returned for it
+def createMultiProductQuery(start_date, end_date, products, batch_size=BATCH_SIZE, partition_days=PARTITION_DAYS,
+                            max_workers=MAX_WORKERS, cancel_token=None):
+    filters = {product: programFilter(product) for product in products}
+    product_patterns = {product: [pattern.lower() for pattern in program.patterns]
+                        for product, program in filters.items()}
+
+    # One query with the program names, or the sequence file paths, of every product, each one only once
+    patterns = []
+    for product in product_patterns.values():
+        patterns += [pattern for pattern in product if pattern not in patterns]
+    paths = None
+    if all(program.paths for program in filters.values()):
+        paths = sorted(set(path for program in filters.values() for path in program.paths))
+    patterns = query_builder.ProgramFilter(patterns, paths)
+
+    # The scan is partitioned for the product whose queries needed the shortest ranges
+    if partition_days and products:
+        partition_days = min(chunk_sizes.get(product, partition_days) for product in products)
+
+    results = {product: [] for product in products}
+    classified = {}
+    seen_ids = set()
+    for batch in streamServer(start_date, end_date, patterns, batch_size, partition_days, max_workers,
+                              with_path=True, cancel_token=cancel_token):
+        for row in cleanBatch(batch, seen_ids):
+            # Most rows share a handful of sequence files, so each path is only classified once
+            path = row[5]
+            if path not in classified:
+                classified[path] = classifyPath(path, product_patterns)
+            for product in classified[path]:
+                results[product].append(row)
+    return results
+
+
+# This method returns the distinct sequence file paths containing any of the program names since a date
+def fetchSequencePaths(patterns, since=None):
+    query, params = query_builder.build_path_query(patterns, since)
+    paths = []
+    for batch in streamStatement(query, params):
+        paths += [row[0] for row in batch]
+    return paths
+
+
+# This method looks up the sequence file paths of the products again when they are getting old
+# The lookup runs on a thread of its own unless background is False, queries do not wait for it; the registry runs
+# one lookup at a time and a failed lookup only means the queries match the program names with LIKE
+def refreshProducts(background=True):
+    if not registry.needs_refresh():
+        return
+    if background:
+        threading.Thread(target=refreshProducts, args=(False,), daemon=True).start()
+        return
+    try:
+        registry.refresh(fetchSequencePaths)
+    except Exception as e:
+        print(f"The product sequence file paths could not be refreshed: {e}")
+
+
+# This method returns the SEQUENCE_FILE_PATH filter of a product, by its resolved paths when they are current
+# Paths that are missing, too old or kept after a failed refresh fall back to the program names with LIKE
+# A value that is not a product of the registry is searched for as a program identifier
+def programFilter(product, use_paths=True):
+    patterns = registry.patterns(product)
+    if patterns is None:
+        return query_builder.ProgramFilter(query_builder.program_patterns(product))
+    if not use_paths:
+        return query_builder.ProgramFilter(patterns)
+    refreshProducts()
+    return query_builder.ProgramFilter(patterns, registry.paths(product))
+
@@ -1,37 +1,341 @@
+import threading
+import time
+
 import pyodbc
 
+# SQLSTATE of the error pyodbc raises when a query ran longer than the timeout of its connection
+TIMEOUT_SQLSTATE = 'HYT00'
+
+
+class QueryCancelled(Exception):
+    """
+    Raised by a query that was cancelled while it was queued on the connection or running on the server.
+    """
+
+
+class QueryTimeout(Exception):
+    """
+    Raised by a query that ran longer than the timeout of its connection.
+    """
+
+
+class CancelToken:
+    """
+    Cancels the queries of one request, from any thread.
+
+    Every DatabaseConnector created with the token registers while it is connected. cancel() asks the server to
+    stop the statement of each of them with cursor.cancel(), and connectors registering afterwards fail right away,
+    so a request split into several statements or partitions stops as a whole.
+
+    Attributes:
+        cancelled (bool): True once cancel was called.
+
+    Methods:
+        cancel: Cancels the running queries and the ones not started yet.
+        register: Adds a connector to cancel.
+        unregister: Removes a connector that finished.
+        wait: Sleeps until a timeout passed or the token was cancelled.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._connectors = set()
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+
+    def cancel(self):
+        """
+        Cancels the statements running on the registered connectors and every later query of the token.
+        """
+        with self._lock:
+            self.cancelled = True
+            connectors = list(self._connectors)
+        self._event.set()
+        for connector in connectors:
+            connector.cancel()
+
+    def register(self, connector):
+        """
+        Adds a connector whose statement is cancelled with the token.
+
+        Raises:
+            QueryCancelled: If the token was cancelled already.
+        """
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled("The query was cancelled.")
+            self._connectors.add(connector)
+
+    def unregister(self, connector):
+        """
+        Removes a connector that was closed.
+        """
+        with self._lock:
+            self._connectors.discard(connector)
+
+    def wait(self, seconds):
+        """
+        Sleeps for seconds, or less if the token is cancelled meanwhile.
+
+        Raises:
+            QueryCancelled: If the token was cancelled.
+        """
+        if self._event.wait(seconds):
+            raise QueryCancelled("The query was cancelled.")
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of long-lived database connections.
+
+    Connections are kept warm between queries so a new query does not pay the full ODBC handshake and
+    Windows authentication cost. Idle connections are health-checked before they are handed out again and
+    connections above the minimum size are closed once they have been idle for too long.
+
+    Attributes:
+        conn_str (str): The connection string for the database.
+        min_size (int): The number of connections kept open even when idle.
+        max_size (int): The maximum number of connections open at the same time.
+        idle_timeout (float): Seconds an idle connection above min_size is kept before it is closed.
+        acquire_timeout (float): Seconds acquire waits for a free connection before giving up.
+        connect_func: The function used to open a new connection, pyodbc.connect by default.
+
+    Methods:
+        acquire: Borrows a healthy connection from the pool.
+        release: Returns a borrowed connection to the pool.
+        fill: Opens connections until min_size connections are available.
+        close_all: Closes every idle connection and stops pooling.
+    """
+
+    def __init__(self, conn_str, min_size=1, max_size=4, idle_timeout=300, acquire_timeout=60, connect_func=None):
+        """
+        Initializes a ConnectionPool. No connection is opened until one is needed or fill is called.
+
+        Args:
+            conn_str (str): The connection string for the database.
+            min_size (int, optional): The number of connections kept open even when idle.
+            max_size (int, optional): The maximum number of connections open at the same time.
+            idle_timeout (float, optional): Seconds an idle connection above min_size is kept.
+            acquire_timeout (float, optional): Seconds acquire waits for a free connection.
+            connect_func (optional): Function taking the connection string and returning a connection.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1.")
+        self.conn_str = conn_str
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.connect_func = connect_func if connect_func is not None else pyodbc.connect
+        self._idle = []  # (connection, time it was returned) with the most recently used last
+        self._size = 0  # idle connections plus borrowed connections plus connections being opened
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Borrows a healthy connection from the pool, opening a new one if none are idle and the pool is not full.
+
+        Returns:
+            A database connection which must be handed back with release.
+
+        Raises:
+            Exception: If the pool is closed or no connection became free within acquire_timeout.
+        """
+        deadline = time.time() + self.acquire_timeout
+        while True:
+            conn = None
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise Exception("Connection pool is closed.")
+                    self._evict_idle()
+                    if self._idle:
+                        conn = self._idle.pop()[0]
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise Exception("No database connection became free. Please try again later.")
+                    self._condition.wait(remaining)
+
+            # Health checks and connection setup are done outside the lock so other threads are not blocked
+            if conn is None:
+                try:
+                    return self.connect_func(self.conn_str)
+                except Exception:
+                    self._forget()
+                    raise
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, discard=False):
+        """
+        Returns a borrowed connection to the pool.
+
+        Args:
+            conn: The connection obtained from acquire.
+            discard (bool, optional): Close the connection instead of keeping it, e.g. after a failed query.
+        """
+        if not discard:
+            try:
+                # Leave no open transaction behind for the next borrower
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._condition:
+            if not discard and not self._closed:
+                self._idle.append((conn, time.time()))
+                self._evict_idle()
+                self._condition.notify()
+                return
+        self._discard(conn)
+
+    def fill(self):
+        """
+        Opens connections until at least min_size connections are idle, so the first query starts warm.
+        """
+        while True:
+            with self._condition:
+                if self._closed or len(self._idle) >= self.min_size or self._size >= self.max_size:
+                    return
+                self._size += 1
+            try:
+                conn = self.connect_func(self.conn_str)
+            except Exception:
+                self._forget()
+                raise
+            self.release(conn)
+
+    def close_all(self):
+        """
+        Closes every idle connection and stops pooling. Borrowed connections are closed when they are released.
+        """
+        with self._condition:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+            self._size -= len(idle)
+            self._condition.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _evict_idle(self):
+        """
+        Closes the connections that have been idle longer than idle_timeout while keeping min_size open.
+        Must be called with the lock held.
+        """
+        now = time.time()
+        # The oldest connections are at the front of the list
+        while len(self._idle) > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            conn = self._idle.pop(0)[0]
+            self._size -= 1
+            self._close_quietly(conn)
+
+    def _is_healthy(self, conn):
+        """
+        Checks that a pooled connection can still run a query.
+        """
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        """
+        Closes a connection and frees its slot in the pool.
+        """
+        self._close_quietly(conn)
+        self._forget()
+
+    def _forget(self):
+        """
+        Frees a slot in the pool and wakes up a thread waiting for a connection.
+        """
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
 
 class DatabaseConnector:
     """
     A class for connecting to a database and executing queries.
 
+    A running query can be stopped from another thread with cancel, and a query running longer than timeout seconds
+    is stopped by the driver. Either way QueryCancelled or QueryTimeout is raised in the thread running the query
+    and the connection stays usable, close hands it back to the pool.
+
     Attributes:
         conn_str (str): The connection string for the database.
+        pool (ConnectionPool): The pool connections are borrowed from, or None to open a private connection.
+        timeout (int): Seconds a statement may run before the driver stops it, 0 for no limit.
+        cancel_token (CancelToken): The token that cancels the query, or None.
+        cancelled (bool): True once the query was cancelled.
         conn: The database connection object.
         cursor: The cursor object for executing queries.
 
     Methods:
         connect: Establishes a connection to the database.
         execute_query: Executes a SQL query and returns the results.
+        stream_query: Executes a SQL query and yields the results in batches.
+        cancel: Stops the running query, from any thread.
         close: Closes the connection to the database.
     """
 
-    def __init__(self, conn_str):
+    def __init__(self, conn_str, pool=None, timeout=0, cancel_token=None):
         """
         Initializes a DatabaseConnector instance with the provided connection string.
 
         Args:
             conn_str (str): The connection string for the database.
+            pool (ConnectionPool, optional): A pool to borrow the connection from instead of opening a new one.
+            timeout (int, optional): Seconds a statement may run before the driver stops it, 0 for no limit.
+            cancel_token (CancelToken, optional): A token whose cancel also cancels this query.
         """
         self.conn_str = conn_str
+        self.pool = pool
+        self.timeout = timeout
+        self.cancel_token = cancel_token
+        self.cancelled = False
         self.conn = None
         self.cursor = None
 
     def connect(self):
         """
         Establishes a connection to the database using the provided connection string.
+
+        When a pool was given the connection is borrowed from it instead.
+
+        Raises:
+            QueryCancelled: If the cancel token was cancelled already.
         """
-        self.conn = pyodbc.connect(self.conn_str)
+        if self.cancel_token is not None:
+            self.cancel_token.register(self)
+        try:
+            if self.pool is not None:
+                self.conn = self.pool.acquire()
+            else:
+                self.conn = pyodbc.connect(self.conn_str)
+        except BaseException:
+            if self.cancel_token is not None:
+                self.cancel_token.unregister(self)
+            raise
+        # The timeout is set on every borrow because a pooled connection keeps the one of its previous query
+        self.conn.timeout = self.timeout
         self.cursor = self.conn.cursor()
 
     def execute_query(self, query, params=None):
@@ -46,23 +350,115 @@ class DatabaseConnector:
             list: A list of rows returned from the executed query.
 
         Raises:
+            QueryCancelled: If the query was cancelled.
+            QueryTimeout: If the query ran longer than the timeout.
             Exception: If the connection has not been established, it raises an exception.
         """
-        if self.cursor:
-            if params:
-                self.cursor.execute(query, params)
-            else:
-                self.cursor.execute(query)
+        if not self.cursor:
+            raise Exception("Connection not established. Please connect first.")
+        self._execute(query, params)
+        try:
             rows = self.cursor.fetchall()
-            return rows
-        else:
+        except Exception as e:
+            self._raise_stopped(e)
+            raise
+        self._raise_stopped()
+        return rows
+
+    def stream_query(self, query, params=None, batch_size=5000):
+        """
+        Executes the provided SQL query and yields the results in batches as they arrive from the server.
+
+        Only one batch is held in memory at a time, so callers can start working on the first rows while
+        the rest of the result is still being read.
+
+        Args:
+            query (str): The SQL query to be executed.
+            params (tuple, optional): The parameters to be used in the query.
+            batch_size (int, optional): The number of rows fetched per batch.
+
+        Yields:
+            list: The next batch of at most batch_size rows.
+
+        Raises:
+            QueryCancelled: If the query was cancelled.
+            QueryTimeout: If the query ran longer than the timeout.
+            Exception: If the connection has not been established, it raises an exception.
+        """
+        if not self.cursor:
             raise Exception("Connection not established. Please connect first.")
+        self._execute(query, params)
+        while True:
+            try:
+                rows = self.cursor.fetchmany(batch_size)
+            except Exception as e:
+                self._raise_stopped(e)
+                raise
+            # A cancel between two batches stops the query even if the driver did not notice it
+            self._raise_stopped()
+            if not rows:
+                break
+            yield rows
+
+    def cancel(self):
+        """
+        Asks the server to stop the running query, safe to call from any thread.
 
-    def close(self):
+        The thread running the query gets QueryCancelled, a query not started yet fails before it is sent.
+        """
+        self.cancelled = True
+        cursor = self.cursor
+        if cursor is not None:
+            try:
+                cursor.cancel()
+            except Exception as e:
+                print(f"The query could not be cancelled on the server: {e}")
+
+    def close(self, discard=False):
         """
         Closes the connection to the database.
+
+        When the connection was borrowed from a pool it is handed back instead of being closed.
+
+        Args:
+            discard (bool, optional): Close a pooled connection instead of returning it, e.g. after an error.
         """
+        if self.cancel_token is not None:
+            self.cancel_token.unregister(self)
         if self.conn:
-            self.conn.close()
+            if self.cursor:
+                try:
+                    self.cursor.close()
+                except Exception:
+                    discard = True
+            if self.pool is not None:
+                self.pool.release(self.conn, discard=discard)
+            else:
+                self.conn.close()
+            self.conn = None
+            self.cursor = None
         else:
             raise Exception("Connection not established.")
+
+    def _execute(self, query, params):
+        """
+        Sends a statement, translating a cancel or a timeout of the driver into QueryCancelled or QueryTimeout.
+        """
+        self._raise_stopped()
+        try:
+            if params:
+                self.cursor.execute(query, params)
+            else:
+                self.cursor.execute(query)
+        except Exception as e:
+            self._raise_stopped(e)
+            raise
+
+    def _raise_stopped(self, error=None):
+        """
+        Raises QueryCancelled if the query was cancelled, or QueryTimeout if error is the timeout of the driver.
+        """
+        if self.cancelled:
+            raise QueryCancelled("The query was cancelled.") from error
+        if error is not None and TIMEOUT_SQLSTATE in str(error):
+            raise QueryTimeout(f"The query ran longer than {self.timeout} seconds.") from error
@@ -0,0 +1,161 @@
+# Label counted for a failed run that has no failing step, e.g. a terminated sequence
+NO_STEP_ERROR = "Terminated"
+
+
+class ErrorAggregator:
+    """
+    Incrementally counted pass/fail totals and error types of a set of test runs.
+
+    Runs are added and removed one at a time or in batches, every update takes constant time. Error types are kept
+    in buckets by their count, so the highest error is known without looking at the other error types and the
+    ranking is read from the buckets instead of counting the runs again. The runs are never changed.
+
+    Attributes:
+        counts (dict): The number of failed runs of every error type.
+        units (int): The number of runs counted.
+        passed (int): The number of counted runs that passed.
+
+    Methods:
+        add: Counts runs.
+        remove: Stops counting runs that were added before.
+        add_counts: Counts runs known only by their number, e.g. from a server side summary.
+        replace_latest: Moves the counts from the previous most recent runs of a ResultTable to the new ones.
+        highest: Returns the error type with the most failed runs.
+        ranking: Returns the error types and their counts, the most frequent first.
+    """
+
+    def __init__(self, rows=()):
+        """
+        Initializes the aggregator and counts the given runs.
+
+        Args:
+            rows (optional): Runs with passed and error_type attributes, e.g. a Selection of a ResultTable.
+        """
+        self.counts = {}
+        self.units = 0
+        self.passed = 0
+        self._buckets = {}
+        self._highest = 0
+        self.add(rows)
+
+    @property
+    def failed(self):
+        """
+        The number of counted runs that did not pass.
+        """
+        return self.units - self.passed
+
+    def add(self, rows):
+        """
+        Counts runs.
+
+        Args:
+            rows: Runs with passed and error_type attributes.
+        """
+        for row in rows:
+            self.add_counts(row.passed, row.error_type, 1)
+
+    def remove(self, rows):
+        """
+        Stops counting runs that were added before.
+
+        Args:
+            rows: Runs with passed and error_type attributes.
+
+        Raises:
+            Exception: If more runs of an error type are removed than were added.
+        """
+        for row in rows:
+            self.units -= 1
+            if row.passed:
+                self.passed -= 1
+            else:
+                self._move(row.error_type or NO_STEP_ERROR, -1)
+
+    def add_counts(self, passed, error_type, units):
+        """
+        Counts runs known only by their number.
+
+        Args:
+            passed (bool): True when the runs passed.
+            error_type (str): The failing step of the runs, '' for passed and terminated runs.
+            units (int): The number of runs.
+        """
+        self.units += units
+        if passed:
+            self.passed += units
+        elif units:
+            self._move(error_type or NO_STEP_ERROR, units)
+
+    def replace_latest(self, table, changed):
+        """
+        Moves the counts from the previous most recent runs of a ResultTable to the runs that replaced them.
+
+        Args:
+            table (ResultTable): The table the runs were added to.
+            changed (dict): The result of ResultTable.extend, the previous most recent position of every changed
+                serial code or None for new serial numbers.
+        """
+        # The columns are read directly, a batch changes the most recent run of up to every row's serial number
+        status_bits = table.status_bits
+        error_codes = table.error_codes
+        error_types = table.error_types
+        for position in changed.values():
+            if position is None:
+                continue
+            self.units -= 1
+            if status_bits[position >> 3] >> (position & 7) & 1:
+                self.passed -= 1
+            else:
+                self._move(error_types[error_codes[position]] or NO_STEP_ERROR, -1)
+        latest = table.latest
+        for serial_code in changed:
+            position = latest[serial_code]
+            self.units += 1
+            if status_bits[position >> 3] >> (position & 7) & 1:
+                self.passed += 1
+            else:
+                self._move(error_types[error_codes[position]] or NO_STEP_ERROR, 1)
+
+    def highest(self):
+        """
+        Returns the error type with the most failed runs, the one that got there first on a tie, or "None".
+        """
+        if not self._highest:
+            return "None"
+        return next(iter(self._buckets[self._highest]))
+
+    def ranking(self):
+        """
+        Returns the error types and their counts in descending order of count.
+
+        Returns:
+            list: (error type, count) tuples.
+        """
+        return [(error_type, count) for count in sorted(self._buckets, reverse=True)
+                for error_type in self._buckets[count]]
+
+    def _move(self, error_type, delta):
+        """
+        Changes the count of an error type and moves it to the bucket of its new count. Only a delta of -1 may
+        lower the count, so the highest count is still known after the bucket it was in empties.
+        """
+        count = self.counts.get(error_type, 0)
+        new_count = count + delta
+        if new_count < 0:
+            raise Exception(f"More runs of {error_type} were removed than added")
+        if count:
+            bucket = self._buckets[count]
+            del bucket[error_type]
+            if not bucket:
+                del self._buckets[count]
+        if new_count:
+            self._buckets.setdefault(new_count, {})[error_type] = None
+            self.counts[error_type] = new_count
+        else:
+            del self.counts[error_type]
+
+        if new_count > self._highest:
+            self._highest = new_count
+        elif count == self._highest and count not in self._buckets:
+            self._highest = new_count
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+
+
+class KeysetPager:
+    """
+    Pages through rows ordered by a unique key, keeping only a bounded number of pages in memory.
+
+    Every page is fetched with the key of the last row of the page before it, its bookmark, so any page that was
+    dropped from memory can be fetched again without reading the pages before it.
+
+    Attributes:
+        fetch_page: Function taking the bookmark (None for the first page) and the page size and returning the rows
+            sorting after the bookmark, at most page size of them.
+        page_size (int): The number of rows per page.
+        max_pages (int): The number of pages kept in memory, the least recently used ones are dropped.
+        key: Function returning the key of a row, the serial number by default.
+        bookmarks (list): The bookmark of every page reached so far, page i starts after bookmarks[i].
+        last_page (int): Index of the last page once a short page was fetched, None before.
+
+    Methods:
+        page: Returns the rows of a page, fetching them if they are not in memory.
+        has_page: Returns True when a page may exist.
+        cached_pages: Returns the indexes of the pages in memory.
+    """
+
+    def __init__(self, fetch_page, page_size=500, max_pages=5, key=lambda row: row[1]):
+        """
+        Initializes the pager, no page is fetched until it is asked for.
+
+        Args:
+            fetch_page: Function taking a bookmark and the page size and returning the rows after the bookmark.
+            page_size (int, optional): The number of rows per page.
+            max_pages (int, optional): The number of pages kept in memory.
+            key (optional): Function returning the key of a row.
+        """
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.key = key
+        self.bookmarks = [None]
+        self.last_page = None
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def page(self, index):
+        """
+        Returns the rows of a page, fetching them if they are not in memory.
+
+        Args:
+            index (int): The page, 0 for the first one. The page before it must have been fetched at least once.
+
+        Returns:
+            list: The rows of the page, an empty list past the last page.
+        """
+        with self._lock:
+            if index in self._pages:
+                self._pages.move_to_end(index)
+                return self._pages[index]
+            if not self.has_page(index):
+                return []
+            bookmark = self.bookmarks[index]
+
+        # The lock is not held while the page is read, so pages in memory stay available meanwhile
+        rows = self.fetch_page(bookmark, self.page_size)
+
+        with self._lock:
+            if len(rows) < self.page_size:
+                self.last_page = index
+            elif index + 1 == len(self.bookmarks):
+                self.bookmarks.append(self.key(rows[-1]))
+            self._pages[index] = rows
+            self._pages.move_to_end(index)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return rows
+
+    def has_page(self, index):
+        """
+        Returns True when the page may exist: its bookmark is known and it is not past the last page.
+        """
+        return 0 <= index < len(self.bookmarks) and (self.last_page is None or index <= self.last_page)
+
+    def cached_pages(self):
+        """
+        Returns the indexes of the pages in memory, in index order.
+        """
+        with self._lock:
+            return sorted(self._pages)
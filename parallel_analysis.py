@@ -0,0 +1,132 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from result_table import ResultTable
+from run_preprocessor import RunPreprocessor
+
+# Below this many rows the rows are read in the calling process, starting the workers and sending them the rows
+# would take longer than reading them
+PARALLEL_MIN_ROWS = 200000
+
+
+def read_partition(rows):
+    """
+    Reads the rows of one partition into a ResultTable. Runs in a worker process, the table is sent back pickled.
+
+    Args:
+        rows (list): ID, UUT_SERIAL_NUMBER, START_DATE_TIME, UUT_STATUS and STEP_NAME tuples, every run of their
+            serial numbers in the order they were queried.
+
+    Returns:
+        ResultTable: The runs of the partition, with the most recent run of each of its serial numbers.
+    """
+    table = ResultTable()
+    table.extend(rows)
+    return table
+
+
+def _first_seen_codes(codes, count):
+    """
+    Returns the codes of an array renumbered in the order they first occur in it, and the old code of every new
+    code. count is the number of old codes.
+    """
+    seen, first = np.unique(codes, return_index=True)
+    old_codes = seen[np.argsort(first, kind='stable')]
+    new_codes = np.zeros(count, dtype=np.int64)
+    new_codes[old_codes] = np.arange(len(old_codes))
+    return new_codes[codes], old_codes
+
+
+def merge_tables(tables, origins):
+    """
+    Merges the tables of the partitions into the table a single process would have built from all rows.
+
+    The runs are put back into the order of the rows, serial numbers and error types are numbered in the order
+    they were first seen, and the most recent run of every serial number is taken from the partition that owns it.
+
+    Args:
+        tables (list): The ResultTable of every partition.
+        origins (list): The index of every row of each partition in all rows, ascending.
+
+    Returns:
+        ResultTable: The merged table.
+    """
+    sizes = [len(table) for table in tables]
+    order = np.argsort(np.concatenate(origins), kind='stable')
+    # Where the run at every merged position was in the concatenated partitions, and the way back
+    merged_position = np.empty(len(order), dtype=np.int64)
+    merged_position[order] = np.arange(len(order))
+
+    ids = np.concatenate([np.frombuffer(table.ids, dtype=np.int64, count=size)
+                          for table, size in zip(tables, sizes)])[order]
+    timestamps = np.concatenate([np.frombuffer(table.timestamps, dtype=np.int64, count=size)
+                                 for table, size in zip(tables, sizes)])[order]
+    passed = np.concatenate([np.unpackbits(np.frombuffer(bytes(table.status_bits), dtype=np.uint8),
+                                           bitorder='little')[:size]
+                             for table, size in zip(tables, sizes)])[order]
+
+    # The serial codes of every partition are moved behind the ones of the partitions before it
+    serial_offsets = np.cumsum([0] + [len(table.serials) for table in tables])
+    serials = [serial_number for table in tables for serial_number in table.serials]
+    serial_codes = np.concatenate([np.frombuffer(table.serial_codes, dtype=np.dtype(table.serial_codes.typecode),
+                                                 count=size) + offset
+                                   for table, size, offset in zip(tables, sizes, serial_offsets)])[order]
+    serial_codes, old_serials = _first_seen_codes(serial_codes, len(serials))
+
+    # Error types are shared by the partitions, '' keeps code 0
+    error_types = ['']
+    error_lookup = {'': 0}
+    partition_errors = []
+    for table in tables:
+        codes = []
+        for error_type in table.error_types:
+            if error_type not in error_lookup:
+                error_lookup[error_type] = len(error_types)
+                error_types.append(error_type)
+            codes.append(error_lookup[error_type])
+        partition_errors.append(np.array(codes, dtype=np.int64))
+    error_codes = np.concatenate([codes[np.frombuffer(table.error_codes, dtype=np.dtype(table.error_codes.typecode),
+                                                      count=size)]
+                                  for table, size, codes in zip(tables, sizes, partition_errors)])[order]
+    error_codes, old_errors = _first_seen_codes(np.concatenate(([0], error_codes)), len(error_types))
+    error_codes = error_codes[1:]
+
+    latest = np.concatenate([np.frombuffer(table.latest, dtype=np.dtype(table.latest.typecode),
+                                           count=len(table.serials)) + offset
+                             for table, offset in zip(tables, np.cumsum([0] + sizes[:-1]))])
+    return ResultTable.from_columns(ids, timestamps, passed, serial_codes, [serials[code] for code in old_serials],
+                                    error_codes, [error_types[code] for code in old_errors],
+                                    merged_position[latest][old_serials])
+
+
+def preprocess(rows, processes=None):
+    """
+    Reads query output rows into a RunPreprocessor, on a process pool for very large outputs.
+
+    The rows are hash partitioned by serial number, so each worker owns every run of its serial numbers and finds
+    their most recent runs on its own. The tables of the workers are merged in the order of the rows and the error
+    counts are taken from the merged table, so the result is identical to reading the rows in one process.
+
+    Args:
+        rows (list): Query output rows, deduplicated by ID.
+        processes (int, optional): The number of worker processes, the number of CPUs by default. Outputs of fewer
+            than PARALLEL_MIN_ROWS rows and a single process read the rows in the calling process.
+
+    Returns:
+        RunPreprocessor: The stage holding the runs, their serial index and error counts.
+    """
+    rows = rows if isinstance(rows, list) else list(rows)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(rows) < PARALLEL_MIN_ROWS:
+        return RunPreprocessor(rows)
+
+    # The same serial number always lands in the same partition
+    partition = np.fromiter((hash(row[1]) % processes for row in rows), dtype=np.int64, count=len(rows))
+    origins = [np.flatnonzero(partition == i) for i in range(processes)]
+    partitions = [[tuple(rows[i][:5]) for i in origin.tolist()] for origin in origins]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        tables = list(executor.map(read_partition, partitions))
+    return RunPreprocessor.from_table(merge_tables(tables, origins))
@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from result_cache import CACHE_DIR
+
+# The products of the dropdown and the program names their sequence file paths contain
+# Adding a product only needs a new line here
+PRODUCTS = [
+    ('K5', ['k5']),
+    ('K123s', ['k123', 'k3550', 'k2700']),
+    ('ShotTimer', ['kst']),
+    ('HUD', ['hud']),
+    ('Drop', ['drop']),
+    ('SpeedCoach', ['457042']),
+    ('Coxbox', ['coxbox']),
+]
+
+
+class ProductRegistry:
+    """
+    Resolves every product to the distinct sequence file paths its test runs were recorded with.
+
+    Queries can then filter SEQUENCE_FILE_PATH with IN, which can use an index, instead of a leading wildcard LIKE
+    for each program name. The paths are looked up once with a full scan and kept in a local file. Later refreshes
+    only scan the test runs recorded since the previous refresh to pick up new sequence files.
+
+    Only one refresh runs at a time. Paths older than max_age, or kept after the last refresh failed, may miss new
+    sequence files, so paths returns None for them and the queries match the program names with LIKE until a
+    refresh succeeds. A refresh is due at half of max_age, so the paths normally stay current while it runs.
+
+    Attributes:
+        products (list): (product name, program names) tuples in dropdown order.
+        path (str): The JSON file the resolved paths are kept in.
+        max_age (float): Seconds the resolved paths are used for after they were resolved.
+        retry_after (float): Seconds before a refresh that failed is tried again.
+
+    Methods:
+        names: Returns the product names in dropdown order.
+        patterns: Returns the program names of a product.
+        paths: Returns the resolved sequence file paths of a product.
+        needs_refresh: Returns True when a refresh is due and none is running.
+        refresh: Looks up the sequence file paths of every product.
+    """
+
+    def __init__(self, products=PRODUCTS, path=None, max_age=900, retry_after=60):
+        """
+        Initializes the registry and loads the paths resolved in an earlier session.
+
+        Args:
+            products (list, optional): (product name, program names) tuples in dropdown order.
+            path (str, optional): The JSON file for the resolved paths, products.json in CACHE_DIR by default.
+            max_age (float, optional): Seconds the resolved paths are used for after they were resolved.
+            retry_after (float, optional): Seconds before a refresh that failed is tried again.
+        """
+        self.products = products
+        self.path = path if path is not None else os.path.join(CACHE_DIR, "products.json")
+        self.max_age = max_age
+        self.retry_after = retry_after
+        self._refreshing = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._resolved = {'patterns': [], 'paths': [], 'resolved_at': 0, 'scanned_until': None}
+        self._product_paths = {}
+        try:
+            with open(self.path) as file:
+                resolved = json.load(file)
+            # Paths looked up for other program names can not be reused
+            if sorted(resolved['patterns']) == sorted(self._all_patterns()):
+                self._resolved = resolved
+                self._classify()
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def names(self):
+        """
+        Returns the product names in dropdown order.
+        """
+        return [name for name, _ in self.products]
+
+    def patterns(self, product):
+        """
+        Returns the program names of a product.
+
+        Args:
+            product (str): A product name.
+
+        Returns:
+            list: The program names, or None for an unknown product.
+        """
+        for name, patterns in self.products:
+            if name == product:
+                return list(patterns)
+        return None
+
+    def paths(self, product):
+        """
+        Returns the sequence file paths of a product.
+
+        Args:
+            product (str): A product name.
+
+        Returns:
+            list: The resolved paths, or None when the product is unknown, the paths were never resolved, are older
+            than max_age or the last refresh failed.
+        """
+        with self._lock:
+            if self._failed_at is not None or time.time() - self._resolved['resolved_at'] > self.max_age:
+                return None
+            return self._product_paths.get(product)
+
+    def needs_refresh(self):
+        """
+        Returns True when no refresh is running and the paths are older than half of max_age, or the last refresh
+        failed at least retry_after seconds ago.
+        """
+        now = time.time()
+        with self._lock:
+            if self._refreshing:
+                return False
+            if self._failed_at is not None:
+                return now - self._failed_at >= self.retry_after
+            return now - self._resolved['resolved_at'] > self.max_age / 2
+
+    def refresh(self, fetch_paths):
+        """
+        Looks up the sequence file paths of every product and saves them.
+
+        Args:
+            fetch_paths: Function taking the program names and a 'YYYY-MM-DD HH:MM:SS' date, or None for every test
+                run, and returning the distinct SEQUENCE_FILE_PATH values of the matching runs since that date.
+
+        Returns:
+            bool: True when the paths were refreshed, False when another refresh was already running.
+
+        Raises:
+            Exception: The error of fetch_paths, the paths are not used until a later refresh succeeds.
+        """
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            since = self._resolved['scanned_until']
+            known = list(self._resolved['paths'])
+        # Runs are scanned again from a day before the last refresh, a clock difference to the server loses nothing
+        scan_started = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            found = fetch_paths(self._all_patterns(), since)
+        except BaseException:
+            with self._lock:
+                self._refreshing = False
+                self._failed_at = time.time()
+            raise
+
+        paths = sorted(set(known) | set(path.strip() for path in found if path))
+        with self._lock:
+            self._resolved = {'patterns': self._all_patterns(), 'paths': paths, 'resolved_at': time.time(),
+                              'scanned_until': scan_started}
+            self._classify()
+            self._refreshing = False
+            self._failed_at = None
+            resolved = dict(self._resolved)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as file:
+                json.dump(resolved, file)
+        except OSError as e:
+            print(f"The resolved product paths could not be saved: {e}")
+        return True
+
+    def _all_patterns(self):
+        """
+        Returns the program names of every product, each one once.
+        """
+        patterns = []
+        for _, product_patterns in self.products:
+            patterns += [pattern for pattern in product_patterns if pattern not in patterns]
+        return patterns
+
+    def _classify(self):
+        """
+        Sorts the resolved paths into their products the way SQL Server's case insensitive LIKE '%name%' matches
+        them. Must be called with the lock held.
+        """
+        self._product_paths = {}
+        for name, patterns in self.products:
+            lowered = [pattern.lower() for pattern in patterns]
+            self._product_paths[name] = [path for path in self._resolved['paths']
+                                         if any(pattern in path.lower() for pattern in lowered)]
@@ -0,0 +1,314 @@
+# This file builds the SQL sent to the TestStand database
+#
+# The UUT query returns exactly one row per UUT_RESULT ID with the columns the windows read, in this order:
+# ID, UUT_SERIAL_NUMBER, START_DATE_TIME, UUT_STATUS, STEP_NAME
+# The failing step is looked up per ID, so a UUT is never multiplied by its steps or by the other runs of the
+# same serial number and no DISTINCT or client side deduplication is needed.
+
+# SQL dialects the queries can be built for, SQLite is used for the local stand-in database
+MSSQL = 'mssql'
+SQLITE = 'sqlite'
+
+# Marker the dropdown conversion appends when a product is searched with several program names
+MULTIPLE_PARAMS = "#Multiple_Params"
+
+# Above this many sequence file paths the program names are matched with LIKE instead of an IN list
+MAX_IN_PATHS = 1000
+
+
+class ProgramFilter:
+    """
+    The SEQUENCE_FILE_PATH filter of a query for one or more products.
+
+    When the exact sequence file paths of the products are known they are matched with IN, which can use an index.
+    Otherwise every program name is matched with LIKE '%name%'.
+
+    Attributes:
+        patterns (list): The program names searched for in SEQUENCE_FILE_PATH.
+        paths (list): The resolved sequence file paths of the products, or None when they are not known.
+    """
+
+    def __init__(self, patterns, paths=None):
+        """
+        Initializes the filter.
+
+        Args:
+            patterns (list): The program names searched for in SEQUENCE_FILE_PATH.
+            paths (list, optional): The resolved sequence file paths, used instead of the program names.
+        """
+        self.patterns = patterns
+        self.paths = paths
+
+    def sql(self, params, column="u.SEQUENCE_FILE_PATH"):
+        """
+        Builds the filter and adds its parameters to params.
+        """
+        if self.paths and len(self.paths) <= MAX_IN_PATHS:
+            params += self.paths
+            return column + " IN (" + ", ".join(["?"] * len(self.paths)) + ")"
+        params += ["%" + pattern + "%" for pattern in self.patterns]
+        return "(" + " OR ".join([column + " LIKE ?"] * len(self.patterns)) + ")"
+
+
+def program_patterns(program_file):
+    """
+    Splits the program file identifier from the dropdown into the words searched for in SEQUENCE_FILE_PATH.
+
+    Args:
+        program_file (str): A single program name or several names followed by "#Multiple_Params".
+
+    Returns:
+        list: The program names to search for.
+    """
+    if MULTIPLE_PARAMS in program_file:
+        return program_file.split()[:-1]
+    return [program_file]
+
+
+def _top_one(select, dialect):
+    """
+    Limits a scalar sub query to its first row in the given dialect.
+    """
+    if dialect == MSSQL:
+        return "SELECT TOP 1 " + select
+    return "SELECT " + select + " LIMIT 1"
+
+
+def _program_filter(patterns, params, column="u.SEQUENCE_FILE_PATH"):
+    """
+    Builds the SEQUENCE_FILE_PATH filter for a list of program names or a ProgramFilter and adds its parameters.
+    """
+    if not isinstance(patterns, ProgramFilter):
+        patterns = ProgramFilter(patterns)
+    return patterns.sql(params, column)
+
+
+def _date_filter(end_inclusive):
+    """
+    Builds the START_DATE_TIME filter, the end of the range is left out when it starts the next partition.
+    """
+    if end_inclusive:
+        return "u.START_DATE_TIME BETWEEN ? AND ?"
+    return "u.START_DATE_TIME >= ? AND u.START_DATE_TIME < ?"
+
+
+def _step_name(dialect):
+    """
+    Builds the STEP_NAME column of a UUT aliased u: the top level step that caused a failed UUT to fail, '' otherwise.
+    """
+    failing_step = _top_one(
+        "s.STEP_NAME FROM dbo.STEP_RESULT s WHERE s.UUT_RESULT = u.ID AND s.CAUSED_SEQFAIL = 1 "
+        "AND (s.STEP_PARENT IS NULL OR s.STEP_PARENT = 0) ORDER BY s.ORDER_NUMBER", dialect)
+    return "CASE WHEN u.UUT_STATUS = 'failed' THEN COALESCE((" + failing_step + "), '') ELSE '' END AS STEP_NAME"
+
+
+def _latest_runs(patterns, params, after_serial=None):
+    """
+    Builds the RANKED common table expression numbering the runs of every serial number in the date range, the most
+    recent one first, and adds its parameters after the start and end date already in params.
+    With after_serial only serial numbers sorting after it are ranked.
+    """
+    serial = "LTRIM(RTRIM(u.UUT_SERIAL_NUMBER))"
+    query = "WITH RANKED AS (SELECT u.ID, " + serial + " AS UUT_SERIAL_NUMBER, u.START_DATE_TIME, u.UUT_STATUS, " \
+            "ROW_NUMBER() OVER (PARTITION BY " + serial + " ORDER BY u.START_DATE_TIME DESC, u.ID) AS RUN_RANK " \
+            "FROM dbo.UUT_RESULT u WHERE " + _date_filter(True) + " AND " + _program_filter(patterns, params)
+    if after_serial is not None:
+        query += " AND " + serial + " > ?"
+        params.append(after_serial)
+    return query + ")"
+
+
+def _uut_select(dialect, with_path=False):
+    """
+    Builds the SELECT and FROM part shared by the UUT queries, one row per UUT result.
+    With with_path the SEQUENCE_FILE_PATH is added as a sixth column.
+    """
+    return "SELECT u.ID, u.UUT_SERIAL_NUMBER, u.START_DATE_TIME, u.UUT_STATUS, " + _step_name(dialect) + \
+           (", u.SEQUENCE_FILE_PATH" if with_path else "") + " FROM dbo.UUT_RESULT u "
+
+
+def build_uut_query(start_date, end_date, patterns, dialect=MSSQL, end_inclusive=True, with_path=False):
+    """
+    Builds the query returning one row per UUT result in the date range for the given program names.
+
+    For failed UUTs the STEP_NAME column holds the top level step that caused the sequence to fail, the first one
+    in execution order when there are several. Every other UUT gets an empty STEP_NAME.
+    Rows are ordered by START_DATE_TIME and ID, so the results of consecutive ranges can simply be appended.
+
+    Args:
+        start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+        end_date (str): End of the range, 'YYYY-MM-DD HH:MM:SS'.
+        patterns (list or ProgramFilter): The program names searched for in SEQUENCE_FILE_PATH, or a ProgramFilter
+            with the resolved sequence file paths.
+        dialect (str, optional): MSSQL for the production server or SQLITE for the local stand-in.
+        end_inclusive (bool, optional): Include UUTs started exactly at end_date, False for all but the last
+            partition of a split range.
+        with_path (bool, optional): Add SEQUENCE_FILE_PATH as a sixth column, to tell the products of a query
+            for several products apart.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters.
+    """
+    params = [start_date, end_date]
+    query = _uut_select(dialect, with_path) + \
+        "WHERE " + _date_filter(end_inclusive) + " AND " + _program_filter(patterns, params) + " " \
+        "ORDER BY u.START_DATE_TIME, u.ID"
+    return query, tuple(params)
+
+
+def build_count_query(start_date, end_date, patterns, end_inclusive=True):
+    """
+    Builds the query counting the UUT results in the date range, the rows build_uut_query would return.
+
+    The count only reads the START_DATE_TIME and SEQUENCE_FILE_PATH columns, so it is cheap compared to the rows
+    and gives the progress bar of a streamed query its total.
+
+    Args:
+        start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+        end_date (str): End of the range (inclusive), 'YYYY-MM-DD HH:MM:SS'.
+        patterns (list or ProgramFilter): The program names searched for in SEQUENCE_FILE_PATH, or a ProgramFilter
+            with the resolved sequence file paths.
+        end_inclusive (bool, optional): Include UUTs started exactly at end_date, like build_uut_query.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters. The query returns one row with the count.
+    """
+    params = [start_date, end_date]
+    query = "SELECT COUNT(*) FROM dbo.UUT_RESULT u WHERE " + _date_filter(end_inclusive) + " AND " + \
+            _program_filter(patterns, params)
+    return query, tuple(params)
+
+
+def build_summary_query(start_date, end_date, patterns, dialect=MSSQL):
+    """
+    Builds the query counting the most recent UUT result of every serial number in the date range on the server.
+
+    The most recent run of a serial number is the one with the latest START_DATE_TIME, the lowest ID among runs
+    started in the same instant, like the Final Table picks it from the rows of build_uut_query. Only one row per
+    combination of status and failing step is returned instead of a row per UUT result.
+
+    Args:
+        start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+        end_date (str): End of the range (inclusive), 'YYYY-MM-DD HH:MM:SS'.
+        patterns (list or ProgramFilter): The program names searched for in SEQUENCE_FILE_PATH, or a ProgramFilter
+            with the resolved sequence file paths.
+        dialect (str, optional): MSSQL for the production server or SQLITE for the local stand-in.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters. The query returns PASSED (1 or 0), STEP_NAME as in
+        build_uut_query and UNITS, the number of serial numbers whose most recent run has that status and step.
+    """
+    params = [start_date, end_date]
+    query = _latest_runs(patterns, params) + ", " \
+        "LATEST AS (SELECT CASE WHEN u.UUT_STATUS = 'passed' THEN 1 ELSE 0 END AS PASSED, " + \
+        _step_name(dialect) + " FROM RANKED u WHERE u.RUN_RANK = 1) " \
+        "SELECT PASSED, STEP_NAME, COUNT(*) AS UNITS FROM LATEST GROUP BY PASSED, STEP_NAME"
+    return query, tuple(params)
+
+
+def build_latest_page_query(start_date, end_date, patterns, after_serial=None, page_size=500, dialect=MSSQL):
+    """
+    Builds the query returning one page of the most recent UUT result of every serial number, ordered by serial
+    number, in the same shape as build_uut_query.
+
+    Pages are read with a keyset: the next page starts after the last serial number of the previous one, so every
+    page costs the same no matter how far the user scrolled. The most recent run is picked like
+    build_summary_query picks it, and the failing step is only looked up for the rows of the page.
+
+    Args:
+        start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+        end_date (str): End of the range (inclusive), 'YYYY-MM-DD HH:MM:SS'.
+        patterns (list or ProgramFilter): The program names searched for in SEQUENCE_FILE_PATH, or a ProgramFilter
+            with the resolved sequence file paths.
+        after_serial (str, optional): The last serial number of the previous page, None for the first page.
+        page_size (int, optional): The number of serial numbers per page.
+        dialect (str, optional): MSSQL for the production server or SQLITE for the local stand-in.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters.
+    """
+    params = [start_date, end_date]
+    query = _latest_runs(patterns, params, after_serial)
+    columns = "u.ID, u.UUT_SERIAL_NUMBER, u.START_DATE_TIME, u.UUT_STATUS, " + _step_name(dialect) + \
+              " FROM RANKED u WHERE u.RUN_RANK = 1 ORDER BY u.UUT_SERIAL_NUMBER"
+    if dialect == MSSQL:
+        query += " SELECT TOP (" + str(int(page_size)) + ") " + columns
+    else:
+        query += " SELECT " + columns + " LIMIT " + str(int(page_size))
+    return query, tuple(params)
+
+
+def build_since_query(since_date, patterns, dialect=MSSQL):
+    """
+    Builds the query returning the UUT results started at or after a date, in the same shape as build_uut_query.
+
+    Runs are recorded when they end, so a refresh sends a date some time before the newest row already loaded and
+    drops the rows it already has by their ID.
+
+    Args:
+        since_date (str): Earliest START_DATE_TIME returned, 'YYYY-MM-DD HH:MM:SS' optionally with fractions.
+        patterns (list or ProgramFilter): The program names searched for in SEQUENCE_FILE_PATH, or a ProgramFilter
+            with the resolved sequence file paths.
+        dialect (str, optional): MSSQL for the production server or SQLITE for the local stand-in.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters.
+    """
+    params = [since_date]
+    query = _uut_select(dialect) + \
+        "WHERE u.START_DATE_TIME >= ? AND " + \
+        _program_filter(patterns, params) + " ORDER BY u.START_DATE_TIME, u.ID"
+    return query, tuple(params)
+
+
+def build_legacy_query(start_date, end_date, patterns, dialect=MSSQL):
+    """
+    Builds the query the app used before build_uut_query, kept to measure the difference between the two.
+
+    It joins every step of every UUT and the failures of every run with the same serial number, so it returns
+    many rows per UUT result and two columns nothing reads.
+
+    Args:
+        start_date (str): Start of the range, 'YYYY-MM-DD HH:MM:SS'.
+        end_date (str): End of the range (inclusive), 'YYYY-MM-DD HH:MM:SS'.
+        patterns (list or ProgramFilter): The program names searched for in SEQUENCE_FILE_PATH, or a ProgramFilter
+            with the resolved sequence file paths.
+        dialect (str, optional): MSSQL for the production server or SQLITE for the local stand-in.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters.
+    """
+    params = [start_date, end_date]
+    view = "[TestStandCustom].[dbo].[View_Failed Top Level UUTs and Results]" if dialect == MSSQL \
+        else "dbo.[View_Failed Top Level UUTs and Results]"
+    query = "SELECT DISTINCT dbo.UUT_RESULT.ID, dbo.UUT_RESULT.UUT_SERIAL_NUMBER, dbo.UUT_RESULT.START_DATE_TIME, " \
+            "dbo.UUT_RESULT.UUT_STATUS, CASE WHEN dbo.UUT_RESULT.UUT_STATUS = 'failed' THEN " \
+            "[View_Failed Top Level UUTs and Results].STEP_NAME ELSE '' END AS STEP_NAME, " \
+            "dbo.STEP_RESULT.CAUSED_SEQFAIL, dbo.STEP_RESULT.STEP_TYPE FROM dbo.UUT_RESULT " \
+            "LEFT JOIN dbo.STEP_RESULT ON dbo.UUT_RESULT.ID = dbo.STEP_RESULT.UUT_RESULT " \
+            "LEFT JOIN dbo.STEP_SEQCALL ON dbo.STEP_RESULT.ID = dbo.STEP_SEQCALL.STEP_RESULT " \
+            "LEFT JOIN " + view + " " \
+            "ON dbo.[View_Failed Top Level UUTs and Results].UUT_SERIAL_NUMBER = dbo.UUT_RESULT.UUT_SERIAL_NUMBER " \
+            "WHERE dbo.UUT_RESULT.START_DATE_TIME BETWEEN ? AND ? AND " \
+            + _program_filter(patterns, params, "SEQUENCE_FILE_PATH")
+    return query, tuple(params)
+
+
+def build_path_query(patterns, since=None):
+    """
+    Builds the query returning the distinct sequence file paths containing any of the program names.
+
+    Args:
+        patterns (list): The program names searched for in SEQUENCE_FILE_PATH.
+        since (str, optional): Only look at UUTs started since this date, 'YYYY-MM-DD HH:MM:SS'.
+
+    Returns:
+        tuple: The query string and the tuple of its parameters.
+    """
+    params = []
+    query = "SELECT DISTINCT u.SEQUENCE_FILE_PATH FROM dbo.UUT_RESULT u WHERE "
+    if since is not None:
+        query += "u.START_DATE_TIME >= ? AND "
+        params.append(since)
+    query += ProgramFilter(patterns).sql(params)
+    return query, tuple(params)
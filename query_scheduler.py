@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class QueryTicket:
+    """
+    One scheduled query, shared by every request for the same key while it is queued or running.
+
+    Attributes:
+        key: Identifies the query, e.g. the product and date range.
+        function: Called without arguments on a worker thread, its return value is the result of the query.
+        future (Future): Receives the result or the exception of the query.
+        owners (set): The requesters waiting for the query, e.g. windows.
+        user (str): The user the query runs for.
+        interactive (bool): A window waits on the query, it does not count against the per user limit.
+        queued_at (float): time.time() when the query was queued.
+    """
+
+    def __init__(self, key, function, owner, user, interactive=False):
+        self.key = key
+        self.function = function
+        self.future = Future()
+        self.owners = set() if owner is None else {owner}
+        self.user = user
+        self.interactive = interactive
+        self.queued_at = time.time()
+
+
+class QueryScheduler:
+    """
+    Runs queries on a bounded pool of worker threads instead of a new thread per request.
+
+    Identical requests share one execution: a request whose key is already queued or running gets the future of
+    that query instead of sending it to the server again. A newer request from the same owner supersedes the
+    owner's older requests that are still queued, they are dropped unless another owner waits for them. Each user
+    runs at most per_user queries at a time, further queries of the user wait while other users' queries run.
+    Interactive queries, such as the Refresh or the detail load of an open window, are not counted against the per
+    user limit, so with per_user below max_workers they still get a worker while the user's long scans run.
+
+    Attributes:
+        max_workers (int): The number of queries running at the same time.
+        per_user (int): The number of queries of one user running at the same time.
+
+    Methods:
+        submit: Schedules a query and returns its future.
+        metrics: Returns the queue depth and the counters of the scheduler.
+    """
+
+    def __init__(self, max_workers=3, per_user=2):
+        """
+        Initializes the scheduler, the worker threads are started when the first queries arrive.
+
+        Args:
+            max_workers (int, optional): The number of queries running at the same time.
+            per_user (int, optional): The number of queries of one user running at the same time.
+        """
+        self.max_workers = max_workers
+        self.per_user = per_user
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._tickets = {}
+        self._running = {}
+        self._running_count = 0
+        self._workers = 0
+        self._idle = 0
+        self._counters = {'submitted': 0, 'coalesced': 0, 'superseded': 0, 'completed': 0, 'failed': 0,
+                          'peak_queue_depth': 0}
+        self._total_wait = 0.0
+
+    def submit(self, key, function, owner=None, user='', interactive=False):
+        """
+        Schedules a query, or joins the identical query already queued or running.
+
+        Args:
+            key: Identifies the query, requests with equal keys share one execution. Must be hashable.
+            function: Called without arguments on a worker thread, returns the result of the query.
+            owner (optional): The requester, e.g. a window. Its older queued requests are superseded by this one.
+            user (str, optional): The user the query runs for, for the per user limit.
+            interactive (bool, optional): A window waits on the query, it is not held back by the per user limit.
+
+        Returns:
+            Future: The future of the query. The future of a superseded request is cancelled unless another
+            owner still waits for it.
+        """
+        with self._condition:
+            self._counters['submitted'] += 1
+            ticket = self._tickets.get(key)
+            if owner is not None:
+                self._supersede(owner, ticket)
+            if ticket is not None:
+                self._counters['coalesced'] += 1
+                if owner is not None:
+                    ticket.owners.add(owner)
+                if interactive and not ticket.interactive and ticket in self._queue:
+                    ticket.interactive = True
+                    self._condition.notify()
+                return ticket.future
+
+            ticket = QueryTicket(key, function, owner, user, interactive)
+            self._tickets[key] = ticket
+            self._queue.append(ticket)
+            self._counters['peak_queue_depth'] = max(self._counters['peak_queue_depth'], len(self._queue))
+            # An idle worker only stops counting as idle once it woke up, so a burst of requests needs a worker
+            # for every queued query beyond the idle ones
+            if len(self._queue) > self._idle and self._workers < self.max_workers:
+                self._workers += 1
+                threading.Thread(target=self._work, daemon=True).start()
+            self._condition.notify()
+            return ticket.future
+
+    def metrics(self):
+        """
+        Returns the state and the counters of the scheduler.
+
+        Returns:
+            dict: queued and running queries, submitted, coalesced, superseded, completed and failed requests, the
+            peak_queue_depth and the average_wait of a query in the queue in seconds.
+        """
+        with self._condition:
+            metrics = dict(self._counters)
+            metrics['queued'] = len(self._queue)
+            metrics['running'] = self._running_count
+            finished = self._counters['completed'] + self._counters['failed']
+            metrics['average_wait'] = round(self._total_wait / finished, 3) if finished else 0.0
+        return metrics
+
+    def _supersede(self, owner, keep):
+        """
+        Drops the queued requests of an owner except keep. Must be called with the condition held.
+        """
+        for ticket in list(self._queue):
+            if ticket is keep or owner not in ticket.owners:
+                continue
+            ticket.owners.discard(owner)
+            if not ticket.owners:
+                self._queue.remove(ticket)
+                del self._tickets[ticket.key]
+                ticket.future.cancel()
+                self._counters['superseded'] += 1
+
+    def _next_ticket(self):
+        """
+        Returns the oldest queued query that is interactive or whose user is under the per user limit, or None. Must
+        be called with the condition held.
+        """
+        for ticket in self._queue:
+            if ticket.interactive or self._running.get(ticket.user, 0) < self.per_user:
+                self._queue.remove(ticket)
+                return ticket
+        return None
+
+    def _work(self):
+        """
+        Runs queued queries one at a time, the loop of every worker thread.
+        """
+        while True:
+            with self._condition:
+                ticket = self._next_ticket()
+                while ticket is None:
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                    ticket = self._next_ticket()
+                counted = not ticket.interactive
+                if counted:
+                    self._running[ticket.user] = self._running.get(ticket.user, 0) + 1
+                self._running_count += 1
+                self._total_wait += time.time() - ticket.queued_at
+
+            failed = False
+            if ticket.future.set_running_or_notify_cancel():
+                try:
+                    ticket.future.set_result(ticket.function())
+                except BaseException as e:
+                    failed = True
+                    ticket.future.set_exception(e)
+
+            with self._condition:
+                if counted:
+                    self._running[ticket.user] -= 1
+                self._running_count -= 1
+                if self._tickets.get(ticket.key) is ticket:
+                    del self._tickets[ticket.key]
+                self._counters['failed' if failed else 'completed'] += 1
+                # A query of the same user may have been waiting for this one
+                self._condition.notify_all()
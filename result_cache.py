@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Folder for the files the app keeps between sessions
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cts_statistics")
+
+# Format of the day keys, the first 10 characters of START_DATE_TIME
+DAY_FORMAT = "%Y-%m-%d"
+
+
+class ResultCache:
+    """
+    A local SQLite cache of query results, stored as one segment per product and day.
+
+    A segment of a day that had already ended when it was fetched is closed and never expires, because no new test
+    runs are added to it. The segment of today (or a day that ended very recently) is open and expires after
+    open_ttl seconds. When the file grows over max_bytes the least recently used segments are removed.
+
+    Attributes:
+        path (str): The SQLite file holding the cache.
+        max_bytes (int): The size the stored segments are kept under.
+        open_ttl (float): Seconds a segment of a day that has not ended yet stays valid.
+        close_grace (float): Seconds after the end of a day before its segment is treated as closed, so test runs
+            that finish after midnight are still picked up.
+
+    Methods:
+        get_day: Returns the cached rows of a product for one day.
+        put_day: Stores the rows of a product for one day.
+        missing_days: Returns the days of a product that are not cached.
+        count_rows: Returns the number of cached rows of a product on some days.
+        stats: Returns the hit and miss counts, the bytes saved and the size of the cache.
+        clear: Removes every cached segment.
+    """
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024, open_ttl=300, close_grace=3600):
+        """
+        Opens the cache file, creating it if needed.
+
+        Args:
+            path (str, optional): The SQLite file holding the cache, results.sqlite in CACHE_DIR by default.
+            max_bytes (int, optional): The size the stored segments are kept under.
+            open_ttl (float, optional): Seconds a segment of a day that has not ended yet stays valid.
+            close_grace (float, optional): Seconds after the end of a day before its segment is closed.
+        """
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "results.sqlite")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.open_ttl = open_ttl
+        self.close_grace = close_grace
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS segments (product TEXT, day TEXT, rows TEXT, bytes INTEGER, "
+                           "fetched_at REAL, last_used REAL, closed INTEGER, PRIMARY KEY (product, day))")
+        self._conn.commit()
+
+    def get_day(self, product, day):
+        """
+        Returns the cached rows of a product for one day and records a hit or a miss.
+
+        Args:
+            product (str): The product identifier the rows were queried for.
+            day (str): The day, 'YYYY-MM-DD'.
+
+        Returns:
+            list: The rows of the day, or None when the day is not cached or its open segment expired.
+        """
+        now = time.time()
+        with self._lock:
+            found = self._conn.execute("SELECT rows, bytes, fetched_at, closed FROM segments "
+                                       "WHERE product = ? AND day = ?", (product, day)).fetchone()
+            if found is None or (not found[3] and now - found[2] > self.open_ttl):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE segments SET last_used = ? WHERE product = ? AND day = ?", (now, product, day))
+            self._conn.commit()
+            self.hits += 1
+            self.bytes_saved += found[1]
+        return json.loads(found[0])
+
+    def put_day(self, product, day, rows):
+        """
+        Stores the rows of a product for one day, replacing what was cached for it.
+
+        Args:
+            product (str): The product identifier the rows were queried for.
+            day (str): The day, 'YYYY-MM-DD'.
+            rows (list): Every row of the day, an empty list when the day had no test runs.
+        """
+        now = time.time()
+        day_end = datetime.strptime(day, DAY_FORMAT) + timedelta(days=1)
+        closed = datetime.now() - day_end > timedelta(seconds=self.close_grace)
+        data = json.dumps([list(row) for row in rows], default=str)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (product, day, data, len(data), now, now, int(closed)))
+            self._evict()
+            self._conn.commit()
+
+    def missing_days(self, product, days, record=True):
+        """
+        Returns the days of a product that would not be answered from the cache and counts them as misses.
+
+        Args:
+            product (str): The product identifier.
+            days (list): The days to check, 'YYYY-MM-DD'.
+            record (bool, optional): Count the missing days as misses, False to only look.
+
+        Returns:
+            list: The days from days that are not cached or whose open segment expired.
+        """
+        now = time.time()
+        with self._lock:
+            valid = set(day for day, fetched_at, closed in self._conn.execute(
+                "SELECT day, fetched_at, closed FROM segments WHERE product = ?", (product,))
+                        if closed or now - fetched_at <= self.open_ttl)
+            missing = [day for day in days if day not in valid]
+            if record:
+                self.misses += len(missing)
+        return missing
+
+    def count_rows(self, product, days):
+        """
+        Returns the number of cached rows of a product on some days without reading the rows.
+
+        Args:
+            product (str): The product identifier.
+            days (list): Cached days, 'YYYY-MM-DD'.
+
+        Returns:
+            int: The number of rows, or None when the SQLite library has no JSON functions to count them.
+        """
+        count = 0
+        with self._lock:
+            try:
+                for day in days:
+                    found = self._conn.execute("SELECT json_array_length(rows) FROM segments WHERE product = ? "
+                                               "AND day = ?", (product, day)).fetchone()
+                    count += found[0] if found else 0
+            except sqlite3.OperationalError:
+                return None
+        return count
+
+    def stats(self):
+        """
+        Returns the cache statistics of this session and the current size of the cache.
+
+        Returns:
+            dict: hits, misses, bytes_saved, segments and size_bytes.
+        """
+        with self._lock:
+            segments, size_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) "
+                                                      "FROM segments").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_saved': self.bytes_saved, 'segments': segments,
+                'size_bytes': size_bytes}
+
+    def clear(self):
+        """
+        Removes every cached segment.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM segments")
+            self._conn.commit()
+
+    def _evict(self):
+        """
+        Removes the least recently used segments until the cache is under max_bytes. Must be called with the lock.
+        """
+        size = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM segments").fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        for product, day, length in self._conn.execute("SELECT product, day, bytes FROM segments "
+                                                       "ORDER BY last_used").fetchall():
+            self._conn.execute("DELETE FROM segments WHERE product = ? AND day = ?", (product, day))
+            size -= length
+            if size <= self.max_bytes:
+                break
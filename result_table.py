@@ -0,0 +1,441 @@
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# START_DATE_TIME values are stored as microseconds since this instant, in the time zone of the server
+EPOCH = datetime(1970, 1, 1)
+
+# Microseconds from EPOCH to the start of every 'YYYY-MM-DD' day parsed so far, a query spans few distinct days
+_day_starts = {}
+
+# One microsecond, the unit of the timestamps
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def parse_timestamp(value):
+    """
+    Converts a START_DATE_TIME value to microseconds since EPOCH.
+
+    Args:
+        value: A datetime or a 'YYYY-MM-DD HH:MM:SS[.fffffff]' string as returned by the SQL Server driver.
+
+    Returns:
+        int: Microseconds since EPOCH, digits below a microsecond are dropped.
+    """
+    if isinstance(value, datetime):
+        delta = value.replace(microsecond=0) - EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + value.microsecond
+    day_start = _day_starts.get(value[0:10])
+    if day_start is None:
+        day_start = _day_starts[value[0:10]] = \
+            (datetime(int(value[0:4]), int(value[5:7]), int(value[8:10])) - EPOCH).days * 86400 * 1000000
+    fraction = value[20:26]
+    micros = int(fraction.ljust(6, '0')) if fraction else 0
+    return day_start + ((int(value[11:13]) * 60 + int(value[14:16])) * 60 + int(value[17:19])) * 1000000 + micros
+
+
+def parse_timestamps(values):
+    """
+    Converts many START_DATE_TIME values like parse_timestamp at once, for a batch of query output rows.
+
+    Args:
+        values (sequence): Datetimes, or 'YYYY-MM-DD HH:MM:SS[.fffffff]' strings which NumPy parses in one call.
+
+    Returns:
+        list: Microseconds since EPOCH for every value.
+    """
+    if not len(values):
+        return []
+    try:
+        if isinstance(values[0], datetime):
+            return [(value - EPOCH) // _MICROSECOND for value in values]
+        return np.array(values, dtype='datetime64[us]').astype(np.int64).tolist()
+    except (TypeError, ValueError):
+        # Values NumPy does not read, or datetimes mixed with strings
+        return [parse_timestamp(value) for value in values]
+
+
+def timestamp_to_datetime(timestamp):
+    """
+    Converts microseconds since EPOCH back to a datetime.
+    """
+    return EPOCH + timedelta(microseconds=timestamp)
+
+
+def format_timestamp(timestamp):
+    """
+    Formats microseconds since EPOCH as 'YYYY-MM-DD HH:MM:SS.ffffff', the way the dates are shown and queried.
+    """
+    moment = timestamp_to_datetime(timestamp)
+    return f"{moment.year:04d}-{moment.month:02d}-{moment.day:02d} " \
+           f"{moment.hour:02d}:{moment.minute:02d}:{moment.second:02d}.{moment.microsecond:06d}"
+
+
+# The characters of the digits, indexed by digit
+_DIGITS = np.array(list('0123456789'))
+
+
+def _timestamp_chars(timestamps):
+    """
+    Returns 'YYYY-MM-DDTHH:MM:SS.ffffff' for every timestamp as a matrix with one character per cell, so a format is
+    built by moving whole columns of characters instead of formatting one timestamp at a time.
+    """
+    moments = np.array(timestamps, dtype=np.int64).astype('datetime64[us]')
+    text = np.datetime_as_string(moments, unit='us').astype('U26')
+    return text.view('U1').reshape(len(text), 26)
+
+
+def _join_chars(chars):
+    """
+    Returns the rows of a character matrix as a list of strings.
+    """
+    return np.ascontiguousarray(chars).view(f'U{chars.shape[1]}').ravel().tolist()
+
+
+def format_timestamps(timestamps):
+    """
+    Formats many timestamps like format_timestamp at once, for the tables of the windows.
+
+    Args:
+        timestamps: Microseconds since EPOCH, e.g. a column of a ResultTable or a list.
+
+    Returns:
+        list: 'YYYY-MM-DD HH:MM:SS.ffffff' for every timestamp.
+    """
+    if not len(timestamps):
+        return []
+    chars = _timestamp_chars(timestamps)
+    chars[:, 10] = ' '
+    return _join_chars(chars)
+
+
+def format_csv_timestamps(timestamps):
+    """
+    Formats many timestamps as 'YYYY-MM-DD HH:MM:SS' at once, the dates of the CSV export.
+    """
+    if not len(timestamps):
+        return []
+    chars = _timestamp_chars(timestamps)
+    chars[:, 10] = ' '
+    return _join_chars(chars[:, :19])
+
+
+def format_log_names(timestamps):
+    """
+    Formats many timestamps as '[%I %M %S %p][%m %d %Y]' at once, the date in the names of the TestStand log files.
+
+    Args:
+        timestamps: Microseconds since EPOCH.
+
+    Returns:
+        list: E.g. '[02 05 09 PM][11 03 2023]' for every timestamp.
+    """
+    if not len(timestamps):
+        return []
+    chars = _timestamp_chars(timestamps)
+    hours = np.array(timestamps, dtype=np.int64) // 3600000000 % 24
+    clock_hours = (hours + 11) % 12 + 1
+    names = np.full((len(chars), 25), ' ', dtype='U1')
+    names[:, 0] = '['
+    names[:, 1] = _DIGITS[clock_hours // 10]
+    names[:, 2] = _DIGITS[clock_hours % 10]
+    names[:, 4:6] = chars[:, 14:16]
+    names[:, 7:9] = chars[:, 17:19]
+    names[:, 10] = np.where(hours < 12, 'A', 'P')
+    names[:, 11] = 'M'
+    names[:, 12] = ']'
+    names[:, 13] = '['
+    names[:, 14:16] = chars[:, 5:7]
+    names[:, 17:19] = chars[:, 8:10]
+    names[:, 20:24] = chars[:, 0:4]
+    names[:, 24] = ']'
+    return _join_chars(names)
+
+
+def format_log_name(timestamp):
+    """
+    Formats one timestamp as '[%I %M %S %p][%m %d %Y]', see format_log_names.
+    """
+    return format_log_names([timestamp])[0]
+
+
+class RowView:
+    """
+    A read only view of one test run of a ResultTable, nothing is copied until a value is read.
+
+    Attributes:
+        table (ResultTable): The table the run is stored in.
+        position (int): The position of the run in the table.
+    """
+    __slots__ = ('table', 'position')
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    @property
+    def id(self):
+        return self.table.ids[self.position]
+
+    @property
+    def serial_code(self):
+        return self.table.serial_codes[self.position]
+
+    @property
+    def serial_number(self):
+        return self.table.serials[self.table.serial_codes[self.position]]
+
+    @property
+    def timestamp(self):
+        return self.table.timestamps[self.position]
+
+    @property
+    def date_tested(self):
+        return format_timestamp(self.table.timestamps[self.position])
+
+    @property
+    def passed(self):
+        return self.table.passed(self.position)
+
+    @property
+    def status(self):
+        return 'Pass' if self.table.passed(self.position) else 'Fail'
+
+    @property
+    def error_type(self):
+        return self.table.error_types[self.table.error_codes[self.position]]
+
+
+class Selection:
+    """
+    An ordered selection of the test runs of a ResultTable, stored as positions instead of copies of the runs.
+
+    Attributes:
+        table (ResultTable): The table the runs are stored in.
+        positions (array): The positions of the selected runs, in display order.
+    """
+
+    def __init__(self, table, positions):
+        self.table = table
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        table = self.table
+        for position in self.positions:
+            yield RowView(table, position)
+
+    def row(self, index):
+        """
+        Returns the view of the run at index in the selection.
+        """
+        return RowView(self.table, self.positions[index])
+
+    def timestamps(self):
+        """
+        Returns the START_DATE_TIME of the selected runs as microseconds since EPOCH, for the formatters.
+
+        Returns:
+            ndarray: A 64 bit integer array in selection order.
+        """
+        timestamps = self.table.timestamps
+        return np.fromiter((timestamps[position] for position in self.positions), dtype=np.int64,
+                           count=len(self.positions))
+
+
+class ResultTable:
+    """
+    A compact columnar table of test runs, one typed array per column instead of an object per run.
+
+    IDs and START_DATE_TIME (as microseconds since EPOCH) are 64 bit integer arrays, the pass/fail status is one bit
+    per run, and serial numbers and error types are stored once each and referenced by a small integer code.
+    Runs keep the order they were added in. The query stream is deduplicated by ID before it reaches the table, see
+    create_query.cleanBatch, rows that may repeat stored runs are filtered with unstored first.
+
+    Attributes:
+        ids (array): UUT_RESULT ID of each run.
+        timestamps (array): START_DATE_TIME of each run as microseconds since EPOCH.
+        status_bits (bytearray): Bit i is set when run i passed.
+        serial_codes (array): Code of the serial number of each run, an index into serials.
+        serials (list): The distinct serial numbers, in the order they were first seen.
+        error_codes (array): Code of the error type of each run, an index into error_types.
+        error_types (list): The distinct error types, '' first.
+        latest (array): Position of the most recent run of each serial number, indexed by serial code.
+
+    Methods:
+        append: Adds one query output row.
+        extend: Adds query output rows and reports the serial numbers whose most recent run changed.
+        unstored: Returns the rows whose ID is not stored yet.
+        passed: Returns True when a run passed.
+        row: Returns the view of one run.
+        most_recent: Returns a selection of the most recent run of each serial number.
+        serial_code: Returns the code of a serial number.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.timestamps = array('q')
+        self.status_bits = bytearray()
+        self.serial_codes = array('l')
+        self.serials = []
+        self.error_codes = array('l')
+        self.error_types = ['']
+        self.latest = array('l')
+        self._serial_lookup = {}
+        self._error_lookup = {'': 0}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a table from query output rows: ID, UUT_SERIAL_NUMBER, START_DATE_TIME, UUT_STATUS, STEP_NAME.
+        """
+        table = cls()
+        table.extend(rows)
+        return table
+
+    @classmethod
+    def from_columns(cls, ids, timestamps, passed, serial_codes, serials, error_codes, error_types, latest):
+        """
+        Builds a table from whole columns, e.g. the tables of several processes merged with NumPy.
+
+        Args:
+            ids (numpy.ndarray): UUT_RESULT ID of each run.
+            timestamps (numpy.ndarray): START_DATE_TIME of each run as microseconds since EPOCH.
+            passed (numpy.ndarray): True for each run that passed.
+            serial_codes (numpy.ndarray): Code of the serial number of each run.
+            serials (list): The distinct serial numbers, indexed by code.
+            error_codes (numpy.ndarray): Code of the error type of each run.
+            error_types (list): The distinct error types, indexed by code, '' first.
+            latest (numpy.ndarray): Position of the most recent run of each serial code.
+        """
+        table = cls()
+        table.ids.frombytes(np.asarray(ids, dtype=np.int64).tobytes())
+        table.timestamps.frombytes(np.asarray(timestamps, dtype=np.int64).tobytes())
+        table.status_bits = bytearray(np.packbits(np.asarray(passed, dtype=bool), bitorder='little').tobytes())
+        table.serial_codes.frombytes(np.asarray(serial_codes, dtype=np.dtype(table.serial_codes.typecode)).tobytes())
+        table.serials = list(serials)
+        table.error_codes.frombytes(np.asarray(error_codes, dtype=np.dtype(table.error_codes.typecode)).tobytes())
+        table.error_types = list(error_types)
+        table.latest.frombytes(np.asarray(latest, dtype=np.dtype(table.latest.typecode)).tobytes())
+        table._serial_lookup = {serial_number: code for code, serial_number in enumerate(table.serials)}
+        table._error_lookup = {error_type: code for code, error_type in enumerate(table.error_types)}
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, row):
+        """
+        Adds one query output row.
+
+        Args:
+            row: ID, UUT_SERIAL_NUMBER, START_DATE_TIME, UUT_STATUS and STEP_NAME, further columns are ignored. Its
+                ID must not be stored yet.
+
+        Returns:
+            int: The position of the new run.
+        """
+        self.extend((row,))
+        return len(self.ids) - 1
+
+    def extend(self, rows):
+        """
+        Adds query output rows and reports the serial numbers whose most recent run changed.
+
+        The batch is split into its columns once, the IDs and timestamps are added a column at a time and the other
+        columns in one loop.
+
+        Args:
+            rows: Query output rows with IDs that are not stored yet.
+
+        Returns:
+            dict: The position of the previous most recent run of every changed serial code, None for new serials.
+        """
+        changed = {}
+        columns = list(zip(*rows))
+        if not columns:
+            return changed
+        ids, serial_numbers, dates, statuses, error_types = columns[:5]
+        new_timestamps = parse_timestamps(dates)
+        position = len(self.ids)
+        self.ids.extend(ids)
+        self.timestamps.extend(new_timestamps)
+
+        timestamps = self.timestamps
+        status_bits = self.status_bits
+        serial_codes = self.serial_codes
+        error_codes = self.error_codes
+        latest = self.latest
+        serial_lookup = self._serial_lookup
+        error_lookup = self._error_lookup
+        for serial_number, status, error_type, timestamp in zip(serial_numbers, statuses, error_types,
+                                                                  new_timestamps):
+            if position & 7 == 0:
+                status_bits.append(0)
+            if status.lower() == 'passed':
+                status_bits[position >> 3] |= 1 << (position & 7)
+
+            error_code = error_lookup.get(error_type)
+            if error_code is None:
+                error_code = error_lookup[error_type] = len(self.error_types)
+                self.error_types.append(error_type)
+            error_codes.append(error_code)
+
+            serial_code = serial_lookup.get(serial_number)
+            if serial_code is None:
+                serial_code = serial_lookup[serial_number] = len(self.serials)
+                self.serials.append(serial_number)
+                latest.append(position)
+                changed[serial_code] = None
+            elif timestamp > timestamps[latest[serial_code]]:
+                if serial_code not in changed:
+                    changed[serial_code] = latest[serial_code]
+                latest[serial_code] = position
+            serial_codes.append(serial_code)
+            position += 1
+        return changed
+
+    def unstored(self, rows):
+        """
+        Returns the rows whose ID is not stored yet, for rows that may repeat runs of the table, e.g. a refresh.
+
+        The IDs are looked up in the ID column at once instead of keeping a set of every ID next to it.
+
+        Args:
+            rows (list): Query output rows, without repeated IDs among them.
+
+        Returns:
+            list: The rows with new IDs, in their order.
+        """
+        if not rows or not len(self.ids):
+            return list(rows)
+        stored = np.isin(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+                         np.frombuffer(self.ids, dtype=np.int64, count=len(self.ids)))
+        return [row for row, known in zip(rows, stored.tolist()) if not known]
+
+    def passed(self, position):
+        """
+        Returns True when the run at position passed.
+        """
+        return bool(self.status_bits[position >> 3] >> (position & 7) & 1)
+
+    def row(self, position):
+        """
+        Returns the view of the run at position.
+        """
+        return RowView(self, position)
+
+    def most_recent(self):
+        """
+        Returns a selection of the most recent run of each serial number, in the order the serials were first seen.
+        """
+        return Selection(self, self.latest)
+
+    def serial_code(self, serial_number):
+        """
+        Returns the code of a serial number, or None when no run of it is stored.
+        """
+        return self._serial_lookup.get(serial_number)
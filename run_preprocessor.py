@@ -0,0 +1,68 @@
+from error_aggregator import ErrorAggregator
+from result_table import ResultTable
+from serial_index import SerialIndex
+
+
+class RunPreprocessor:
+    """
+    Reads query output rows once and builds everything the windows derive from them in that same pass.
+
+    Every row is appended to the columns of a ResultTable, which tracks the most recent run of every serial number
+    in the same loop. After each batch the error counts and pass/fail totals are adjusted for the serial numbers
+    whose most recent run changed. The run lists of the serial numbers are sorted out of the columns by the
+    SerialIndex when they are first looked up, so no per row work is left for them. No row is kept once it was
+    read, and nothing is counted again when a window opens.
+
+    Attributes:
+        table (ResultTable): The deduplicated test runs, with the most recent run of every serial number.
+        index (SerialIndex): The runs of every serial number in date order.
+        errors (ErrorAggregator): Error types and pass/fail totals of the most recent run of every serial number.
+
+    Methods:
+        from_table: Returns the stage of a table that was already built.
+        feed: Reads a batch of query output rows.
+    """
+
+    def __init__(self, rows=()):
+        """
+        Initializes the empty stage and reads rows.
+
+        Args:
+            rows (optional): Query output rows to read right away.
+        """
+        self.table = ResultTable()
+        self.index = SerialIndex(self.table)
+        self.errors = ErrorAggregator()
+        self.feed(rows)
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        Returns the stage of a table that was already built, e.g. by several processes, with the error counts of its
+        most recent runs. They are counted in the order a single feed of the rows would have counted them.
+
+        Args:
+            table (ResultTable): The test runs.
+        """
+        stage = cls()
+        stage.table = table
+        stage.index = SerialIndex(table)
+        stage.errors.replace_latest(table, dict.fromkeys(range(len(table.serials))))
+        return stage
+
+    def feed(self, rows):
+        """
+        Reads a batch of query output rows, each row is read once.
+
+        Args:
+            rows: Rows of ID, UUT_SERIAL_NUMBER, START_DATE_TIME, UUT_STATUS and STEP_NAME, deduplicated by ID like
+                the query stream, see ResultTable.unstored for rows that may repeat runs already read.
+
+        Returns:
+            dict: The position of the previous most recent run of every serial code whose most recent run changed,
+            None for new serials, like ResultTable.extend.
+        """
+        changed = self.table.extend(rows)
+        # Only the serial numbers whose most recent run changed are counted again
+        self.errors.replace_latest(self.table, changed)
+        return changed
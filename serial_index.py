@@ -0,0 +1,100 @@
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+
+class SerialIndex:
+    """
+    An index of the serial numbers of a ResultTable, built from the columns of the table on the first lookup and
+    built again on the first lookup after the table grew.
+
+    The runs are sorted by serial code and START_DATE_TIME with NumPy once, so the runs of a serial number are one
+    slice of that order, found through the serial code lookup of the table, already in date order. A sorted list of
+    the serial numbers, sorted on the first prefix search after new serial numbers were added, answers prefix
+    searches with a binary search. Both lookups take O(log n + k) for k results, and nothing is done per row while
+    the rows are read.
+
+    Attributes:
+        table (ResultTable): The table the index is built on.
+        order (numpy.ndarray): Positions of the runs sorted by serial code and START_DATE_TIME, runs of the same time
+            in the order they were added.
+        starts (numpy.ndarray): Index into order of the first run of every serial code, followed by the number of
+            runs.
+        sorted_serials (list): The distinct serial numbers in sorted order.
+        indexed (int): The number of runs of the table indexed so far.
+
+    Methods:
+        positions: Returns the positions of the runs of a serial number in date order.
+        prefix: Returns the serial numbers starting with a prefix in sorted order.
+        sync: Builds the index of the runs added since it was built.
+    """
+
+    def __init__(self, table):
+        """
+        Initializes the index of a table, it is built on the first lookup.
+
+        Args:
+            table (ResultTable): The table to index.
+        """
+        self.table = table
+        self.order = np.zeros(0, np.int64)
+        self.starts = np.zeros(1, np.int64)
+        self.sorted_serials = []
+        self.indexed = 0
+
+    def positions(self, serial_number):
+        """
+        Returns the positions of the runs of a serial number, the exact serial number and nothing containing it.
+
+        Args:
+            serial_number (str): The serial number as stored, without the zeros the Final Table pads it with.
+
+        Returns:
+            array: The positions in START_DATE_TIME order, empty when the serial number has no runs.
+        """
+        self.sync()
+        serial_code = self.table.serial_code(serial_number)
+        if serial_code is None:
+            return array('l')
+        return array('l', self.order[self.starts[serial_code]:self.starts[serial_code + 1]].tolist())
+
+    def prefix(self, prefix, limit=None):
+        """
+        Returns the serial numbers starting with a prefix, for type-ahead in the serial number entry.
+
+        Args:
+            prefix (str): The start of the serial numbers.
+            limit (int, optional): The most serial numbers to return.
+
+        Returns:
+            list: The matching serial numbers in sorted order.
+        """
+        self.sync()
+        if len(self.sorted_serials) < len(self.table.serials):
+            # The serial numbers sorted before are still sorted, the sort merges the new ones into them
+            self.sorted_serials.extend(self.table.serials[len(self.sorted_serials):])
+            self.sorted_serials.sort()
+        matches = []
+        for i in range(bisect_left(self.sorted_serials, prefix), len(self.sorted_serials)):
+            serial_number = self.sorted_serials[i]
+            if not serial_number.startswith(prefix) or (limit is not None and len(matches) >= limit):
+                break
+            matches.append(serial_number)
+        return matches
+
+    def sync(self):
+        """
+        Builds the index again when runs were added to the table since it was built, e.g. on a worker thread ahead
+        of the first lookup.
+        """
+        table = self.table
+        size = len(table)
+        if self.indexed == size:
+            return
+        codes = np.frombuffer(table.serial_codes, dtype=np.dtype(table.serial_codes.typecode), count=size)
+        timestamps = np.frombuffer(table.timestamps, dtype=np.int64, count=size)
+        # lexsort is stable, runs of the same serial code and time keep the order they were added in
+        self.order = np.lexsort((timestamps, codes))
+        self.starts = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(table.serials)))))
+        self.indexed = size
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import time
+from functools import partial
+
+import query_builder
+import standin_db
+from database_connector import CancelToken, ConnectionPool, DatabaseConnector, QueryCancelled, QueryTimeout
+
+# This script stops slow queries on the local SQLite stand-in, slowed down to answer like an overloaded server
+# It cancels a running query from another thread and lets another one run into its timeout, prints how long each
+# took to stop, and checks that the connection went back to the pool and answers the next query
+
+
+def run_query(pool, query, params, timeout=0, cancel_token=None):
+    """
+    Streams a query on a pooled connection and returns the rows, or the exception that stopped it, and the time it
+    took.
+    """
+    time_start = time.time()
+    db_connector = DatabaseConnector(pool.conn_str, pool=pool, timeout=timeout, cancel_token=cancel_token)
+    db_connector.connect()
+    try:
+        rows = []
+        for batch in db_connector.stream_query(query, params, 500):
+            rows.extend(batch)
+        result = rows
+    except (QueryCancelled, QueryTimeout) as e:
+        result = e
+    db_connector.close()
+    return result, time.time() - time_start
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), "standin.db")
+    conn = standin_db.connect(path)
+    uut_count = standin_db.populate(conn, units=5000)
+    conn.close()
+    print(f"Stand-in database: {uut_count} UUT results")
+
+    query, params = query_builder.build_uut_query("2023-11-01 00:00:00", "2023-11-30 23:59:59",
+                                                  query_builder.program_patterns('k5'), query_builder.SQLITE)
+
+    fast_pool = ConnectionPool(path, max_size=1, connect_func=standin_db.connect)
+    rows, fast_time = run_query(fast_pool, query, params)
+    print(f"\n  unloaded server: {len(rows)} rows in {fast_time:.2f} s")
+    fast_pool.close_all()
+
+    # One connection, so the queries after a stopped one can only succeed if it went back to the pool usable
+    pool = ConnectionPool(path, max_size=1, acquire_timeout=5, connect_func=partial(standin_db.connect, delay=0.02))
+
+    cancel_token = CancelToken()
+    threading.Timer(1.0, cancel_token.cancel).start()
+    result, cancel_time = run_query(pool, query, params, cancel_token=cancel_token)
+    assert isinstance(result, QueryCancelled), "The query was not cancelled"
+    assert cancel_time < 2.0, "The cancelled query kept running"
+    print(f"  cancelled after 1 s: stopped in {cancel_time:.2f} s")
+
+    try:
+        DatabaseConnector(path, pool=pool, cancel_token=cancel_token).connect()
+        raise AssertionError("A query of a cancelled token was sent")
+    except QueryCancelled:
+        pass
+
+    result, timeout_time = run_query(pool, query, params, timeout=1)
+    assert isinstance(result, QueryTimeout), "The query did not time out"
+    assert timeout_time < 2.0, "The query ran past its timeout"
+    print(f"  timeout of 1 s: stopped in {timeout_time:.2f} s")
+
+    count_query, count_params = query_builder.build_count_query("2023-11-01 00:00:00", "2023-11-30 23:59:59",
+                                                                query_builder.program_patterns('k5'))
+    result, _ = run_query(pool, count_query, count_params, timeout=30)
+    assert result[0][0] == len(rows), "The connection did not answer after the stopped queries"
+    print(f"  the pooled connection answers the next query: {result[0][0]} test runs counted")
+    pool.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+# This file builds a local SQLite stand-in for the TestStand tables the app queries, so queries can be compared and
+# timed without a connection to NKSQL1. The tables live in a database attached as "dbo" so the same
+# dbo.TABLE names work against both databases.
+#
+# Text columns the server compares case insensitively are declared COLLATE NOCASE to behave like SQL Server.
+#
+# Connections support the query timeout and cursor.cancel() of pyodbc, and can be slowed down to simulate an
+# overloaded server, so stopping long queries can be tried without one.
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS dbo.UUT_RESULT (ID INTEGER PRIMARY KEY, UUT_SERIAL_NUMBER TEXT, "
+    "START_DATE_TIME TEXT, UUT_STATUS TEXT COLLATE NOCASE, SEQUENCE_FILE_PATH TEXT)",
+    "CREATE INDEX IF NOT EXISTS dbo.UUT_RESULT_START ON UUT_RESULT (START_DATE_TIME)",
+    "CREATE TABLE IF NOT EXISTS dbo.STEP_RESULT (ID INTEGER PRIMARY KEY, UUT_RESULT INTEGER, STEP_PARENT INTEGER, "
+    "ORDER_NUMBER INTEGER, STEP_NAME TEXT, STEP_TYPE TEXT, STATUS TEXT COLLATE NOCASE, CAUSED_SEQFAIL INTEGER)",
+    "CREATE INDEX IF NOT EXISTS dbo.STEP_RESULT_UUT ON STEP_RESULT (UUT_RESULT)",
+    "CREATE TABLE IF NOT EXISTS dbo.STEP_SEQCALL (ID INTEGER PRIMARY KEY, STEP_RESULT INTEGER, SEQUENCE_NAME TEXT)",
+    "CREATE INDEX IF NOT EXISTS dbo.STEP_SEQCALL_STEP ON STEP_SEQCALL (STEP_RESULT)",
+    "CREATE VIEW IF NOT EXISTS dbo.[View_Failed Top Level UUTs and Results] AS "
+    "SELECT UUT_RESULT.ID AS UUT_RESULT, UUT_RESULT.UUT_SERIAL_NUMBER, STEP_RESULT.STEP_NAME "
+    "FROM UUT_RESULT JOIN STEP_RESULT ON STEP_RESULT.UUT_RESULT = UUT_RESULT.ID "
+    "WHERE UUT_RESULT.UUT_STATUS = 'Failed' AND STEP_RESULT.CAUSED_SEQFAIL = 1 AND STEP_RESULT.STEP_PARENT IS NULL",
+]
+
+# Sequence files and step names used for the generated data
+SEQUENCE_FILES = [
+    "C:\\TestStand\\Sequences\\K5\\k5_final.seq",
+    "C:\\TestStand\\Sequences\\K123\\k123_final.seq",
+    "C:\\TestStand\\Sequences\\K3550\\k3550_final.seq",
+    "C:\\TestStand\\Sequences\\ShotTimer\\kst_final.seq",
+    "C:\\TestStand\\Sequences\\HUD\\hud_final.seq",
+    "C:\\TestStand\\Sequences\\Drop\\drop_final.seq",
+    "C:\\TestStand\\Sequences\\SpeedCoach\\457042_final.seq",
+    "C:\\TestStand\\Sequences\\Coxbox\\coxbox_final.seq",
+]
+STEP_NAMES = ["Power On", "Sleep Current", "Bluetooth", "Display", "Buttons", "Battery Voltage", "Flash Firmware"]
+
+# Number of SQLite virtual machine instructions between two checks of the timeout and two simulated delays
+PROGRESS_STEPS = 1000
+
+
+class StandinCursor:
+    """
+    A cursor of a StandinConnection, with the pyodbc cancel() that stops the running statement from another thread.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._cursor = connection.conn.cursor()
+
+    def execute(self, query, params=()):
+        self.connection.run(lambda: self._cursor.execute(query, params), start=True)
+        return self
+
+    def fetchone(self):
+        return self.connection.run(self._cursor.fetchone)
+
+    def fetchmany(self, size):
+        return self.connection.run(lambda: self._cursor.fetchmany(size))
+
+    def fetchall(self):
+        return self.connection.run(self._cursor.fetchall)
+
+    def cancel(self):
+        # SQLite aborts the running statement with an "interrupted" error, like the server does on a cancel
+        self.connection.conn.interrupt()
+
+    def close(self):
+        # The timeout of the statement ends with its cursor
+        self.connection._deadline = None
+        self._cursor.close()
+
+
+class StandinConnection:
+    """
+    A connection to the stand-in database with the parts of the pyodbc API used to stop long queries.
+
+    Statements run through its cursors fail with the HYT00 error of pyodbc once they ran longer than timeout
+    seconds. With a delay every statement sleeps delay seconds every PROGRESS_STEPS SQLite instructions, so even a
+    small database answers like an overloaded server. Anything else is passed on to the SQLite connection.
+
+    Attributes:
+        conn (sqlite3.Connection): The SQLite connection.
+        timeout (float): Seconds a statement may run, 0 for no limit, like pyodbc's Connection.timeout.
+        delay (float): Seconds slept every PROGRESS_STEPS instructions.
+    """
+
+    def __init__(self, conn, delay=0.0):
+        self.conn = conn
+        self.timeout = 0
+        self.delay = delay
+        self._deadline = None
+        self._timed_out = False
+        conn.set_progress_handler(self._progress, PROGRESS_STEPS)
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def cursor(self):
+        return StandinCursor(self)
+
+    def run(self, function, start=False):
+        """
+        Runs a statement or a fetch of a cursor and returns its result, the timeout counts from the statement start.
+        """
+        if start:
+            self._deadline = time.time() + self.timeout if self.timeout else None
+        self._timed_out = False
+        try:
+            return function()
+        except sqlite3.OperationalError as e:
+            if self._timed_out:
+                raise sqlite3.OperationalError("[HYT00] Query timeout expired") from e
+            raise
+
+    def _progress(self):
+        """
+        Called by SQLite while a statement runs, a non zero result aborts the statement.
+        """
+        if self.delay:
+            time.sleep(self.delay)
+        if self._deadline is not None and time.time() > self._deadline:
+            self._timed_out = True
+            return 1
+        return 0
+
+
+def connect(path=":memory:", timeout=5.0, delay=0.0):
+    """
+    Opens a connection to the stand-in database with its tables attached as "dbo".
+
+    The function takes the same single argument as pyodbc.connect, so it can be given to a ConnectionPool.
+    Rows come back as lists which, like pyodbc Rows, can be changed in place.
+
+    Args:
+        path (str, optional): The SQLite file holding the tables, ":memory:" for a private in memory database.
+        timeout (float, optional): Seconds to wait for a lock held by another connection.
+        delay (float, optional): Seconds every statement sleeps every PROGRESS_STEPS instructions, to simulate an
+            overloaded server.
+
+    Returns:
+        StandinConnection: The open connection.
+    """
+    conn = sqlite3.connect(":memory:", timeout=timeout, check_same_thread=False)
+    # Rows are lists so they can be changed in place like pyodbc Rows
+    conn.row_factory = lambda cursor, row: list(row)
+    conn.execute("ATTACH DATABASE ? AS dbo", (path,))
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    return StandinConnection(conn, delay)
+
+
+def populate(conn, units=500, days=30, steps=12, start=datetime(2023, 11, 1), seed=1):
+    """
+    Fills the stand-in tables with generated test runs.
+
+    Every unit is tested one or more times, a failed run is often retested, and every run records a full list of
+    steps with one sequence call per step, like TestStand does.
+
+    Args:
+        conn: A connection returned by connect.
+        units (int, optional): The number of serial numbers to generate.
+        days (int, optional): The number of days the runs are spread over.
+        steps (int, optional): The number of top level steps per run.
+        start (datetime, optional): The first day of generated runs.
+        seed (int, optional): Seed for the random generator so the data is repeatable.
+
+    Returns:
+        int: The number of UUT results written.
+    """
+    rng = random.Random(seed)
+    uut_rows = []
+    step_rows = []
+    seqcall_rows = []
+    uut_id = 0
+    step_id = 0
+    for unit in range(units):
+        serial = str(rng.randint(1, 999999))
+        sequence_file = rng.choice(SEQUENCE_FILES)
+        when = start + timedelta(seconds=rng.randint(0, days * 86400 - 1))
+        while True:
+            uut_id += 1
+            failed = rng.random() < 0.2
+            failing_step = rng.randrange(steps) if failed else None
+            status = 'Failed' if failed else rng.choice(['Passed'] * 19 + ['Terminated'])
+            uut_rows.append((uut_id, serial, when.strftime("%Y-%m-%d %H:%M:%S.") + f"{when.microsecond:06d}0",
+                             status, sequence_file))
+            for order in range(steps):
+                step_id += 1
+                caused = 1 if order == failing_step else 0
+                step_rows.append((step_id, uut_id, None, order, STEP_NAMES[order % len(STEP_NAMES)], "SequenceCall",
+                                  'Failed' if caused else 'Passed', caused))
+                seqcall_rows.append((step_id, step_id, "MainSequence"))
+                if caused:
+                    # The nested step that failed inside the sequence call also records the sequence failure
+                    step_id += 1
+                    step_rows.append((step_id, uut_id, step_id - 1, 0, "Measurement", "NumericLimitTest",
+                                      'Failed', 1))
+            if not failed or rng.random() < 0.4:
+                break
+            when += timedelta(minutes=rng.randint(5, 600))
+
+    conn.executemany("INSERT INTO dbo.UUT_RESULT VALUES (?, ?, ?, ?, ?)", uut_rows)
+    conn.executemany("INSERT INTO dbo.STEP_RESULT VALUES (?, ?, ?, ?, ?, ?, ?, ?)", step_rows)
+    conn.executemany("INSERT INTO dbo.STEP_SEQCALL VALUES (?, ?, ?)", seqcall_rows)
+    conn.commit()
+    return len(uut_rows)
@@ -1,39 +1,83 @@
 import csv
 import glob
 import os
+import queue
 import subprocess
+import threading
+import time
 import tkinter as tk
 import webbrowser
 from datetime import datetime
 from tkinter import ttk, filedialog
+import create_query
 from DataAnalysis import DataAnalysis
+from error_aggregator import ErrorAggregator
+from keyset_pager import KeysetPager
+from parallel_analysis import preprocess
+from run_preprocessor import RunPreprocessor
+from result_table import Selection, format_csv_timestamps, format_log_name, format_timestamp, format_timestamps, \
+    parse_timestamp, timestamp_to_datetime
+from virtual_treeview import VirtualTreeview
+from column_sort import ColumnSorter, display_key
 from tkinter import messagebox
 
+# The number of Final Table rows the preparation thread sends at a time
+PREPARE_BATCH = 2000
+
+# Seconds the window spends on prepared results per poll before it repaints
+PREPARE_SLICE = 0.05
+
 """
     TabsWindow Class
 
     A Tkinter-based window for displaying detailed query results with multiple tabs.
 
     Attributes:
-        - input_arr (list): The original data obtained from the database query.
-        - data_arr (list): Cleaned and filtered data without repeated IDs.
-        - dict_data (dict): Cleaned data represented as a dictionary.
-        - ids_data (list): Cleaned data specifically for expansion with individual IDs but repeated Serial Numbers.
-        - start (str): Start date of the query.
-        - end (str): End date of the query.
+        - stage (RunPreprocessor): Reads the query output rows once into the table, its serial index and the error
+          counts, refreshed rows go through it too.
+        - table (ResultTable): The test runs obtained from the database query, each ID stored once.
+        - most_recent (Selection): The most recent test run of each serial number, kept up to date by the table.
+        - start (str): Start of the queried range, 'YYYY-MM-DD HH:MM:SS'.
+        - end (str): End of the queried range, 'YYYY-MM-DD HH:MM:SS'.
+        - program_file (str): Program identifier the data was queried for, used to refresh the data.
+        - watermark (int): START_DATE_TIME (as a table timestamp) of the newest test run loaded, refresh queries the
+          runs started REFRESH_LOOKBACK seconds before it or later.
+        - serial_items (dict): The Final Table row of each serial code of the table.
+        - summary (list): (passed, error type, units) counts of the server side summary, or None when the window was
+          opened with the test runs.
+        - details_loaded (bool): True once the test runs are prepared, they are prepared in a separate thread while
+          the window opens, and a summary window loads them on demand.
+        - details_loading (bool): True while the test runs are loaded or prepared.
+        - pager (KeysetPager): Pages of the Final Table of a summary window, fetched while the user scrolls.
+        - page_items (dict): The Final Table rows of every page shown, by page index.
         - dAsys (DataAnalysis): An instance of the DataAnalysis class for statistical analysis.
-        - error_count (list): List of error counts for different error types.
-        - expanded (set): Set to keep track of expanded serial numbers.
+        - errors (ErrorAggregator): Error types and pass/fail totals of the most recent run of every serial number.
+        - final_table (VirtualTreeview): The Final Table, only the rows in view are Treeview items.
         - current_sort_order (dict): Dictionary to keep track of the current sort order for each column.
+        - final_sorter (ColumnSorter): Sorts the Final Table rows by their ID, timestamp and status instead of text.
+        - final_sort (list): The (column, descending) pairs the Final Table is sorted by, the last clicked first.
 
     Methods:
         - create_widgets(): Set up and layout GUI components for different tabs.
-        - remove_repeated_ids(): Remove repeated IDs from the original data.
-        - createMostRecentSN(): Clean and filter data to keep only the most recent entry for each serial number.
-        - repeatedSNForExpansion(): Clean data specifically for expansion with additional details.
+        - refresh(): Query the test runs recorded since the watermark without blocking the window.
+        - merge_rows(): Merge newly queried test runs into the loaded data and the tables.
+        - fill_error_table(): Fill the Error Percentage table and the table of Tab 4 from the error counts.
+        - fill_yield_table(): Fill the Yield table from the yield figures of the test runs.
+        - update_statistics(): Update the statistics labels.
+        - load_details(): Query the test runs of a summary window without blocking the window.
+        - prepare_details(): Prepare the test runs and the tables in a separate thread.
+        - poll_details(): Show the prepared results as they arrive, a time slice at a time.
+        - add_final_rows(): Add a batch of prepared rows to the Final Table.
+        - show_details(): Switch the window to the prepared test runs once they are complete.
+        - open_pages(): Show the first page of the Final Table of a summary window.
+        - on_final_table_scroll(): Load the next or previous page when the Final Table is scrolled near its end.
+        - load_page(): Fetch a page of the Final Table without blocking the window.
+        - insert_page(): Insert a page into the Final Table, dropping the page farthest from it.
+        - final_row(): Build the Final Table row of the most recent run of a serial number.
         - get_serial_info(): Get information for a specific serial number.
+        - suggest_serials(): List the serial numbers starting with the typed text in the entry dropdown.
         - open_html_file(): Open the associated HTML file for a clicked ID.
-        - show_instances(): Show instances of the selected serial number.
+        - show_instances(): Build the rows of the instances of a serial number being expanded.
         - download_csv(): Download the unexpanded rows to a .csv file.
         - getFilePath(): Get the file path for the HTML file associated with a serial number.
         - sort_treeview(): Sort the treeview based on the selected column.
@@ -44,24 +88,49 @@ from tkinter import messagebox
 
 
 class TabsWindow(tk.Toplevel):
-    def __init__(self, parent, data, start, end):
+    def __init__(self, parent, data, start, end, program_file=None, summary=None):
         super().__init__(parent)
         # These are all documented in the header
         self.title("CTS Statistics Analyzer")
         self.geometry("1000x600")
-        self.input_arr = data
-        self.data_arr = self.remove_repeated_ids()
-        self.dict_data = self.createMostRecentSN(data)
-        self.ids_data = self.repeatedSNForExpansion()
+        # Query output rows are stored in a ResultTable, which also drops repeated IDs
+        # The window opens with empty tabs and the test runs are prepared in a separate thread, a window opened with
+        # only a summary loads them when they are needed
+        self.stage = RunPreprocessor()
+        self.table = self.stage.table
+        self.summary = summary
+        self.details_loaded = False
+        self.details_loading = False
+        self.details_callbacks = []
+        self.pager = None
+        self.page_items = {}
+        self.page_loading = False
+        self.most_recent = self.table.most_recent()
         self.start = start
         self.end = end
-        self.dAsys = DataAnalysis(self.data_arr)
-        self.error_count = self.dAsys.get_error_count(self.dict_data)
-        self.expanded = set()
+        self.program_file = program_file
+        self.watermark = parse_timestamp(start)
+        self.serial_items = {}
+        self.dAsys = DataAnalysis(self.table)
+        # The counts of a summary are shown until the test runs are counted
+        self.errors = ErrorAggregator()
+        for passed, error_type, units in summary or []:
+            self.errors.add_counts(passed, error_type, units)
         self.current_sort_order = {"Fail/Pass Current Status": 'asc', "Step ID": 'asc', "Date first tested": 'asc',
                                    "Error Type": 'asc'}
+        self.final_sorter = ColumnSorter({
+            "Fail/Pass Current Status": lambda row: row['passed'],
+            "Step ID": lambda row: row['id'],
+            "Date first tested": lambda row: row['timestamp'],
+            "Error Type": lambda row: row['error_type'],
+        })
+        self.final_sort = []
         self.create_widgets()
 
+        # The rows may already have been read into a RunPreprocessor while they were streamed in
+        if summary is None:
+            self.prepare_details(lambda: data)
+
     def create_widgets(self):
         tab_control = ttk.Notebook(self)
 
@@ -69,15 +138,27 @@ class TabsWindow(tk.Toplevel):
         tab2 = ttk.Frame(tab_control)
         tab3 = ttk.Frame(tab_control)
         tab4 = ttk.Frame(tab_control)
+        tab5 = ttk.Frame(tab_control)
 
         # Add tabs to the notebook
         tab_control.add(tab1, text='Serial Information')
         tab_control.add(tab2, text='Error Percentage')
         tab_control.add(tab3, text='Final Table')
         tab_control.add(tab4, text='User Information')
+        tab_control.add(tab5, text='Yield')
 
         tab_control.pack(expand=1, fill='both')  # Pack the notebook to expand and fill the available space
 
+        # A summary window shows the first page of the Final Table the first time it is opened and loads its test
+        # runs when the Yield tab needs them
+        def on_tab_changed(event):
+            if tab_control.select() == str(tab3):
+                self.open_pages()
+            elif tab_control.select() == str(tab5):
+                self.load_details()
+
+        tab_control.bind("<<NotebookTabChanged>>", on_tab_changed)
+
         # TAB 1
 
         # Make the frame
@@ -88,9 +169,10 @@ class TabsWindow(tk.Toplevel):
         serial_label = ttk.Label(frame_tab1, text="Enter Serial Number:")
         serial_label.grid(row=0, column=0, padx=5)
 
-        # Entry Box
-        self.serial_number_entry = ttk.Entry(frame_tab1, width=20)
+        # Entry Box, its dropdown lists the serial numbers starting with what was typed
+        self.serial_number_entry = ttk.Combobox(frame_tab1, width=20)
         self.serial_number_entry.grid(row=0, column=1, padx=5)
+        self.serial_number_entry.bind("<KeyRelease>", self.suggest_serials)
 
         # Get Information Button
         self.get_info_button = ttk.Button(frame_tab1, text="Get Information", command=self.get_serial_info)
@@ -118,44 +200,34 @@ class TabsWindow(tk.Toplevel):
             self.tab2_tree_view.heading(col, text=col, anchor=tk.CENTER)
             self.tab2_tree_view.column(col, anchor=tk.CENTER)
 
-        # Delete old entries and insert new entries from the error count list
-        self.tab2_tree_view.delete(*self.tab2_tree_view.get_children())
-        for row in self.error_count:
-            self.tab2_tree_view.insert('', 'end', values=row)
+        # The entries from the error count list are inserted once the table of Tab 4 exists, see fill_error_table
 
         # Create the statistics label
         self.statistics_label_tab2 = ttk.Label(frame2, text="Statistics: ")
         self.statistics_label_tab2.config(font=('Segoe UI', 12))  # Set the font using the config method
         self.statistics_label_tab2.grid(row=2, column=4, columnspan=5, padx=5, pady=10, sticky="n")
 
-        # Calculate the statistics for display
-        total_count = sum([float(item[1]) for item in self.error_count])
-        largest_fail_name = max(self.error_count, key=lambda x: float(x[1]))[0]
-
-        # Populate the statistics label
-        self.statistics_label_tab2.config(
-            text=f"Highest Error: {largest_fail_name} | Failed Units: {total_count}")  # Update the statistics label
-
         # Fill the entire window with components
         self.tab2_tree_view.pack(fill="both", expand=True)
 
         # TAB 3
         # Create the frame
         frame_tab3 = ttk.Frame(tab3)
-        self.tab3_tree_view = ttk.Treeview(tab3)
-
-        # Create a vertical scrollbar for tab3_tree_view
-        scrollbar = tk.Scrollbar(frame_tab3, orient="vertical", command=self.tab3_tree_view.yview)
-        scrollbar.pack(side="right", fill="y")
-        self.tab3_tree_view.configure(yscrollcommand=scrollbar.set)
 
         # Download .csv button
         download_button = tk.Button(frame_tab3, text="Download .csv", command=self.download_csv)
         download_button.pack(side=tk.TOP, anchor='w', padx=5, pady=5)  # Pack the button to the top
 
-        # Create a tree view
-        self.tab3_tree_view = ttk.Treeview(frame_tab3, yscrollcommand=scrollbar.set)
-        self.tab3_tree_view["columns"] = ("Fail/Pass Current Status", "Step ID", "Date first tested", "Error Type")
+        # Refresh button, only available when the window knows which program the data was queried for
+        self.refresh_button = tk.Button(frame_tab3, text="Refresh", command=self.refresh,
+                                        state='normal' if self.program_file and self.details_loaded else 'disabled')
+        self.refresh_button.pack(side=tk.TOP, anchor='w', padx=5, pady=5)
+
+        # Create a virtual tree view with its own scrollbar, expanding a row asks show_instances for its runs
+        self.final_table = VirtualTreeview(frame_tab3, ("Fail/Pass Current Status", "Step ID", "Date first tested",
+                                                        "Error Type"),
+                                           load_children=self.show_instances, on_scroll=self.on_final_table_scroll)
+        self.tab3_tree_view = self.final_table.tree
 
         # Create the table
         for col in self.tab3_tree_view["columns"]:
@@ -163,24 +235,13 @@ class TabsWindow(tk.Toplevel):
                                         command=lambda c=col: self.sort_treeview(self.tab3_tree_view, c))
             self.tab3_tree_view.column(col, anchor=tk.CENTER)
 
-        # Fill the tabel and scroll bar to fit the screen
-        self.tab3_tree_view.pack(fill="both", expand=True)
-
-        # Populate the table
-        for item in self.dict_data:
-            item_id = self.tab3_tree_view.insert("", "end", text=item['serial_number'],
-                                                 values=(item['status'], '', item['date_tested']))
-            self.tab3_tree_view.insert(item_id, 'end', text='Details: ', values=("", "", ""), open=False)
-
-        # Fill components to fit the screen again
-        self.tab3_tree_view.pack(fill="both", expand=True)
+        # Fill the tabel and scroll bar to fit the screen, the rows are added as they are prepared
+        self.final_table.pack(fill="both", expand=True)
 
         # Add a tag to identify the ID rows
         self.tab3_tree_view.tag_configure('id_tag', background='light blue')
 
         # Bind events
-        self.tab3_tree_view.bind("<ButtonRelease-1>",
-                                 self.show_instances)  # Bind single click event to show instances
         self.tab3_tree_view.bind("<Double-ButtonRelease-1>",
                                  self.open_html_file)  # Bind double click event to open HTML file
 
@@ -188,18 +249,9 @@ class TabsWindow(tk.Toplevel):
         self.statistics_label_tab3 = ttk.Label(tab3, text="Statistics: ")
         self.statistics_label_tab3.config(font=('Segoe UI', 12))  # Set the font using the config method
         self.statistics_label_tab3.pack(side=tk.TOP, anchor='w', padx=5, pady=5)
-        final_table = []
-        for item in self.dict_data:
-            final_table.append(item['status'])
 
-        # Calculate and fill the statistics label
-        total_units = len(final_table)
-        passed_units = sum(1 for row in final_table if row == 'Pass')
-        failed_units = sum(1 for row in final_table if row == 'Fail')
-        percent_passed = (passed_units / total_units) * 100
-        percent_failed = (failed_units / total_units) * 100
-        self.statistics_label_tab3.config(
-            text=f"Statistics: Percent Passed: {percent_passed:.2f}% | Percent Failed: {percent_failed:.2f}% | Total Units: {total_units}")
+        # Calculate and fill the statistics labels
+        self.update_statistics()
 
         # Pack frame_tab3 after creating and configuring the tree view
         frame_tab3.pack(expand=True, fill='both')
@@ -219,90 +271,431 @@ class TabsWindow(tk.Toplevel):
                                         command=lambda c=col: self.sort_treeview(self.tab4_tree_view, c))
             self.tab3_tree_view.column(col, anchor=tk.CENTER)
 
-        # Delete old entries and insert new entries from the error count list
-        self.tab4_tree_view.delete(*self.tab4_tree_view.get_children())
-        for row in self.error_count:
-            self.tab4_tree_view.insert('', 'end', values=row)
+        # Insert the entries from the error count list into the tables of Tab 2 and Tab 4
+        self.fill_error_table()
 
    # Fill the entire window with components
         self.tab4_tree_view.pack(fill="both", expand=True)
 
+        # TAB 5
+        # Create the table
+        self.tab5_tree_view = ttk.Treeview(tab5, show="headings")
+        self.tab5_tree_view["columns"] = ("Metric", "Value")
+        for col in self.tab5_tree_view["columns"]:
+            self.tab5_tree_view.heading(col, text=col, anchor=tk.CENTER)
+            self.tab5_tree_view.column(col, anchor=tk.CENTER)
+
+        # Insert the yield figures
+        self.fill_yield_table()
 
-    def remove_repeated_ids(self):
+        # Fill the entire window with components
+        self.tab5_tree_view.pack(fill="both", expand=True)
+
+    def final_row(self, serial_number, run_id, passed, timestamp, error_type='', date_tested=None):
         """
-        Removes rows with repeated IDs from the input array.
+        Builds the Final Table row of the most recent run of a serial number.
+
+        Args:
+            serial_number (str): The serial number as stored, it is shown padded with zeros to three digits.
+            run_id (int): The ID of the run.
+            passed (bool): True when the run passed.
+            timestamp (int): The START_DATE_TIME of the run as a table timestamp.
+            error_type (str, optional): The step that failed the run, '' when it did not fail on a step.
+            date_tested (str, optional): The timestamp already formatted with format_timestamps, for many rows at once.
 
         Returns:
-            list: A list containing unique rows based on the first element (ID) of each row.
+            dict: The row, see VirtualTreeview, with the typed values the Final Table is sorted by.
         """
-        data = self.input_arr
-        seen_ids = set()
-        result = []
+        if date_tested is None:
+            date_tested = format_timestamp(timestamp)
+        return {'text': serial_number.zfill(3), 'values': ('Pass' if passed else 'Fail', '', date_tested),
+                'serial_number': serial_number, 'id': run_id, 'passed': passed, 'timestamp': timestamp,
+                'error_type': error_type}
 
-        for row in data:
-            current_id = row[0]
-            if current_id not in seen_ids:
-                result.append(row)
-                seen_ids.add(current_id)
+    def open_pages(self):
+        """
+        Shows the first page of the Final Table of a summary window, the next pages are loaded while scrolling.
+        """
+        if self.summary is None or self.details_loaded or self.details_loading or self.pager is not None:
+            return
+        self.pager = KeysetPager(lambda bookmark, page_size: create_query.fetchLatestPage(
+            self.start, self.end, self.program_file, bookmark, page_size))
+        self.load_page(0)
 
-        return result
+    def on_final_table_scroll(self, offset, visible, total):
+        """
+        Loads the next or previous page of a paged Final Table when the rows in view come within a screen of
+        either end of the pages shown.
 
-    def createMostRecentSN(self, data):
+        Args:
+            offset (int): Index of the first row in view.
+            visible (int): The number of rows in view.
+            total (int): The number of rows shown.
+        """
+        if self.pager is None or self.details_loaded or self.page_loading or not self.page_items:
+            return
+        pages = sorted(self.page_items)
+        if offset + 2 * visible >= total and self.pager.has_page(pages[-1] + 1):
+            self.load_page(pages[-1] + 1)
+        elif offset < visible and pages[0] > 0:
+            self.load_page(pages[0] - 1)
+
+    def load_page(self, index):
         """
-        Cleans data by keeping only the most recent entry for each serial number.
+        Fetches a page of the Final Table in a separate thread and inserts it once it arrives.
 
         Args:
-            data (list): Input data to be cleaned.
+            index (int): The page to fetch.
+        """
+        self.page_loading = True
+        pager = self.pager
+        result = queue.Queue()
 
-        Returns:
-            list: A list containing the most recent entry for each serial number.
+        def query_thread():
+            try:
+                result.put(pager.page(index))
+            except Exception as e:
+                result.put(e)
+
+        threading.Thread(target=query_thread, daemon=True).start()
+        self.after(100, self.poll_page, pager, index, result)
+
+    def poll_page(self, pager, index, result):
         """
-        input_data = data
-        output_data = {}
+        Waits for a page of the Final Table without blocking the window and inserts it once it arrives.
 
-        # Iterate through the input data and keep only the most recent entry for each serial number
-        for item in input_data:
-            serial_number = item[1]
-            status = 'Pass' if item[3].lower() == 'passed' else 'Fail'
-            date_tested = item[2]
-            error = item[4]
+        Args:
+            pager (KeysetPager): The pager the page was fetched from, the page is ignored when it was replaced.
+            index (int): The page.
+            result (queue.Queue): Receives the rows of the page or the exception the query raised.
+        """
+        try:
+            rows = result.get_nowait()
+        except queue.Empty:
+            self.after(100, self.poll_page, pager, index, result)
+            return
+        self.page_loading = False
+        if pager is not self.pager:
+            return
+        if isinstance(rows, Exception):
+            messagebox.showerror("Error", f"Error: The Final Table could not be loaded: {rows}")
+            return
+        self.insert_page(index, rows)
+
+    def insert_page(self, index, rows):
+        """
+        Inserts a page at the top or the bottom of the Final Table. Only pager.max_pages pages are kept in the
+        table, the page farthest from the new one is dropped and fetched again when the user scrolls back to it.
+
+        Args:
+            index (int): The page.
+            rows (list): Its rows, the most recent run of every serial number of the page in serial number order.
+        """
+        at_top = bool(self.page_items) and index < min(self.page_items)
+        offset = self.final_table.offset
+        # The dates are parsed once and formatted for the whole page at once
+        timestamps = [parse_timestamp(row[2]) for row in rows]
+        dates = format_timestamps(timestamps)
+        self.page_items[index] = [self.final_row(row[1], row[0], row[3].lower() == 'passed', timestamp,
+                                                 date_tested=date_tested)
+                                  for row, timestamp, date_tested in zip(rows, timestamps, dates)]
+        if at_top:
+            offset += len(self.page_items[index])
+
+        while len(self.page_items) > self.pager.max_pages:
+            farthest = max(self.page_items, key=lambda page: abs(page - index))
+            dropped = self.page_items.pop(farthest)
+            # Keep the rows the user was looking at in view when the rows above them are dropped
+            if farthest < index:
+                offset -= len(dropped)
+
+        self.final_table.set_rows([row for page in sorted(self.page_items) for row in self.page_items[page]],
+                                  max(0, offset))
+
+    def load_details(self, callback=None):
+        """
+        Queries the test runs of a window opened with a summary in a separate thread.
 
-            # Check if the serial number is already in the output_data dictionary
-            if serial_number not in output_data or date_tested > output_data[serial_number]['date_tested']:
-                # If it's not in the dictionary or the current entry has a more recent date, update the dictionary
-                output_data[serial_number] = {'serial_number': f'{serial_number.zfill(3)}', 'status': status,
-                                              'date_tested': date_tested, 'error_type': error}
+        Args:
+            callback (optional): Called without arguments once the test runs are loaded, right away when they
+                already are.
 
-        # Convert the dictionary values to a list to match the original output format
-        cleaned_data = list(output_data.values())
+        Behavior:
+            - Does nothing but call callback when the test runs are loaded, and only queries them once.
+            - Only adds callback while the test runs are being prepared, e.g. right after the window opened.
+            - The rows are prepared by prepare_details like the test runs a window is opened with.
+        """
+        if self.details_loaded:
+            if callback is not None:
+                callback()
+            return
+        if callback is not None:
+            self.details_callbacks.append(callback)
+        if self.details_loading:
+            return
+        # Summary windows of the same program and range share one query, each window reads the rows on its own
+        future = create_query.scheduler.submit(
+            ('details', self.program_file, self.start, self.end),
+            lambda: create_query.createQuery(self.start, self.end, self.program_file),
+            owner=self, user=create_query.USER, interactive=True)
+        self.prepare_details(future.result)
+
+    def prepare_details(self, load_table):
+        """
+        Loads the test runs and prepares everything the tabs show from them in a separate thread.
 
-        return cleaned_data
+        Args:
+            load_table: Function returning a RunPreprocessor that read the test runs, or query output rows which
+                are read by one here, called in the thread. Very large outputs are read on every core, see
+                parallel_analysis.preprocess.
 
-    def repeatedSNForExpansion(self):
+        Behavior:
+            - Sends the error counts first, so the Error Percentage tab can be read while the Final Table fills.
+            - Sends the Final Table rows in batches of PREPARE_BATCH, then the table, its index and yield figures.
+            - Polls for the results with after() so the window keeps responding and Tk is only used from its thread.
+        """
+        self.details_loading = True
+        self.statistics_label_tab3.config(text="Statistics: Loading the test runs...")
+        result = queue.Queue()
+
+        def prepare_thread():
+            try:
+                data = load_table()
+                stage = data if isinstance(data, RunPreprocessor) else preprocess(data or [])
+                table = stage.table
+                analysis = DataAnalysis(table, stage.index)
+                # The serial index is sorted here rather than on the first click of Get Information
+                stage.index.sync()
+                # The counts were kept while the rows were read
+                result.put(('errors', stage.errors))
+
+                most_recent = table.most_recent()
+                dates = format_timestamps(most_recent.timestamps())
+                for first in range(0, len(most_recent), PREPARE_BATCH):
+                    batch = []
+                    for position, date_tested in zip(most_recent.positions[first:first + PREPARE_BATCH],
+                                                      dates[first:first + PREPARE_BATCH]):
+                        run = table.row(position)
+                        row = self.final_row(run.serial_number, run.id, run.passed, run.timestamp, run.error_type,
+                                             date_tested)
+                        row['serial_code'] = run.serial_code
+                        batch.append(row)
+                    result.put(('rows', batch))
+
+                watermark = max(table.timestamps, default=None)
+                result.put(('done', (stage, analysis, analysis.get_yield_report(), watermark)))
+            except Exception as e:
+                result.put(('error', e))
+
+        threading.Thread(target=prepare_thread, daemon=True).start()
+        self.after(50, self.poll_details, result)
+
+    def poll_details(self, result):
         """
-                Prepares data for expansion which is when the + button is hit, creating a list of dictionaries with all SN instances.
+        Shows the prepared results as they arrive without blocking the window. At most PREPARE_SLICE seconds are
+        spent per call, so the window keeps repainting while a large Final Table fills.
 
-                Returns:
-                    list: A list containing dictionaries with information for test run.
+        Args:
+            result (queue.Queue): Receives (kind, value) messages from the preparation thread: 'errors', 'rows',
+                'done' or 'error' with the exception it raised.
+        """
+        started = time.perf_counter()
+        while time.perf_counter() - started < PREPARE_SLICE:
+            try:
+                kind, value = result.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'errors':
+                # The pages of a paged Final Table are replaced by every serial number
+                self.pager = None
+                self.page_items = {}
+                self.serial_items = {}
+                self.final_table.set_rows([])
+                self.errors = value
+                self.fill_error_table()
+                self.update_statistics()
+            elif kind == 'rows':
+                self.add_final_rows(value)
+            elif kind == 'done':
+                self.show_details(*value)
+                return
+            else:
+                self.details_loading = False
+                self.details_callbacks = []
+                self.update_statistics()
+                messagebox.showerror("Error", f"Error: The test runs could not be loaded: {value}")
+                return
+        self.statistics_label_tab3.config(text=f"Statistics: Loading the test runs... {len(self.final_table.rows)} "
+                                               f"serial numbers")
+        self.after(10 if not result.empty() else 50, self.poll_details, result)
+
+    def add_final_rows(self, rows):
         """
-        input_data = self.data_arr
-        ids_data = []
+        Adds a batch of prepared rows at the end of the Final Table, only the rows in view are drawn.
 
-        # Create the dictionary
-        for item in input_data:
-            serial_number = item[1]
-            status = 'Pass' if item[3].lower() == 'passed' else 'Fail'
-            error_type = item[4]
-            date_tested = item[2]
-            id = item[0]
+        Args:
+            rows (list): Final Table rows, see final_row, each with the serial code of its run.
+        """
+        for row in rows:
+            self.serial_items[row['serial_code']] = row
+        self.final_table.extend_rows(rows)
 
-            id_number = f'{id}'
-            html_file = 'none'
+    def show_details(self, stage, analysis, report, watermark):
+        """
+        Switches the window to the prepared test runs once the Final Table holds all of them.
 
-            ids_data.append(
-                {'serial_number': serial_number, 'id': id_number, 'date_tested': date_tested, 'status': status,
-                 'error_type': error_type, 'html_file': html_file})
-        return ids_data
+        Args:
+            stage (RunPreprocessor): The test runs of the date range, their serial index and error counts.
+            analysis (DataAnalysis): The analysis of the table, sharing the serial index of the stage.
+            report (list): The (metric, value) rows of the Yield tab.
+            watermark (int): START_DATE_TIME of the newest run, None when the table is empty.
+
+        Behavior:
+            - The error counts were sent before the rows, they may include runs recorded after the summary was
+              queried.
+            - Moves the watermark past the loaded runs and enables the Refresh button.
+            - Calls the callbacks waiting for the test runs.
+        """
+        self.stage = stage
+        self.table = stage.table
+        self.most_recent = stage.table.most_recent()
+        self.dAsys = analysis
+        self.watermark = self.watermark if watermark is None else watermark
+        self.final_sorter.set_rows(self.final_table.rows)
+        self.final_sort = []
+        self.details_loaded = True
+        self.details_loading = False
+        self.fill_yield_table(report)
+        self.update_statistics()
+        if self.program_file:
+            self.refresh_button.config(state='normal')
+
+        callbacks, self.details_callbacks = self.details_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def refresh(self):
+        """
+        Queries the test runs recorded since the watermark in a separate thread and merges them once they arrive.
+
+        Behavior:
+            - Looks back create_query.REFRESH_LOOKBACK seconds before the watermark, a run is dated by its start
+              but recorded when it ends, so a long run started before the newest loaded one is only committed later.
+              The runs already loaded are dropped when merging.
+            - Disables the Refresh button until the query finished.
+            - Polls for the result with after() so the window keeps responding and Tk is only used from its thread.
+        """
+        self.refresh_button.config(state='disabled')
+        since_date = format_timestamp(self.watermark - create_query.REFRESH_LOOKBACK * 1000000)
+        # Windows of the same program refreshing from the same watermark share one query
+        future = create_query.scheduler.submit(
+            ('refresh', self.program_file, since_date),
+            lambda: create_query.createRefreshQuery(since_date, self.program_file),
+            owner=self, user=create_query.USER, interactive=True)
+        self.after(100, self.poll_refresh, future)
+
+    def poll_refresh(self, future):
+        """
+        Waits for the refresh query without blocking the window and merges its rows once they arrive.
+
+        Args:
+            future (Future): The scheduled refresh query, its result is the rows recorded since the watermark.
+        """
+        if not future.done():
+            self.after(100, self.poll_refresh, future)
+            return
+        self.refresh_button.config(state='normal')
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            messagebox.showerror("Error", f"Error: The data could not be refreshed: {future.exception()}")
+            return
+        self.merge_rows(future.result())
+
+    def merge_rows(self, rows):
+        """
+        Merges newly queried test runs into the loaded data without rebuilding it.
+
+        Args:
+            rows (list): Rows of the query output, rows with an ID that is already loaded are ignored.
+
+        Behavior:
+            - Appends the new runs to the table and moves the watermark past them.
+            - The table replaces the most recent run of every serial number with a newer run and adds new serials.
+            - Adjusts the error counts by the runs that changed only.
+            - Updates the changed rows of the Final Table, the Error Percentage table and the statistics labels.
+        """
+        size = len(self.table)
+        rows = self.table.unstored(rows)
+        # The stage adjusts the error counts and the serial index in the same pass, by the runs that changed only
+        changed = self.stage.feed(rows)
+        self.watermark = max(self.watermark, max(self.table.timestamps[size:], default=self.watermark))
+        if not changed:
+            return
+
+        for run in (self.table.row(self.table.latest[serial_code]) for serial_code in changed):
+            row = self.serial_items.get(run.serial_code)
+            if row is None:
+                row = self.final_row(run.serial_number, run.id, run.passed, run.timestamp, run.error_type)
+                row['serial_code'] = run.serial_code
+                self.serial_items[run.serial_code] = row
+                self.final_sorter.add(row)
+                self.final_table.add_row(row)
+            else:
+                row.update(id=run.id, passed=run.passed, timestamp=run.timestamp, error_type=run.error_type)
+                self.final_sorter.invalidate()
+                # The runs are listed again the next time the serial number is expanded
+                self.final_table.update_row(row, values=(run.status, '', run.date_tested), collapse=True)
+
+        self.fill_error_table()
+        self.fill_yield_table()
+        self.update_statistics()
+
+    def fill_yield_table(self, report=None):
+        """
+        Deletes the old entries of the Yield table and inserts the yield figures of the loaded test runs.
+
+        Args:
+            report (list, optional): The (metric, value) rows, computed from the test runs when not given.
+        """
+        self.tab5_tree_view.delete(*self.tab5_tree_view.get_children())
+        if not self.details_loaded:
+            self.tab5_tree_view.insert('', 'end', values=("Loading the test runs...", ""))
+            return
+        for row in report if report is not None else self.dAsys.get_yield_report():
+            self.tab5_tree_view.insert('', 'end', values=row)
+
+    def fill_error_table(self):
+        """
+        Deletes the old entries of the Error Percentage table and the table of Tab 4 and inserts the current error
+        counts, they are filled again whenever the error counts change.
+        """
+        rows = self.errors.ranking()
+        for tree_view in (self.tab2_tree_view, self.tab4_tree_view):
+            tree_view.delete(*tree_view.get_children())
+            for row in rows:
+                tree_view.insert('', 'end', values=row)
+
+    def update_statistics(self):
+        """
+        Calculates the statistics of the Error Percentage and Final Table tabs and updates their labels.
+        """
+        # The counts are kept up to date by the aggregator, nothing is counted again here
+        total_count = self.errors.failed
+        largest_fail_name = self.errors.highest()
+
+        # Populate the statistics label
+        self.statistics_label_tab2.config(
+            text=f"Highest Error: {largest_fail_name} | Failed Units: {total_count}")  # Update the statistics label
+
+        # Calculate and fill the statistics label
+        total_units = self.errors.units
+        passed_units = self.errors.passed
+        failed_units = self.errors.failed
+        percent_passed = (passed_units / total_units) * 100 if total_units else 0
+        percent_failed = (failed_units / total_units) * 100 if total_units else 0
+        self.statistics_label_tab3.config(
+            text=f"Statistics: Percent Passed: {percent_passed:.2f}% | Percent Failed: {percent_failed:.2f}% | Total Units: {total_units}")
 
     def get_serial_info(self):
         """
@@ -311,6 +704,11 @@ class TabsWindow(tk.Toplevel):
         Updates:
             Modifies the tab1_tree_view widget with the retrieved serial information.
         """
+        # A summary window has to load its test runs first
+        if not self.details_loaded:
+            self.load_details(self.get_serial_info)
+            return
+
         # Getting the information on a SN
         serial_number = self.serial_number_entry.get()
         SN_Arr = self.dAsys.get_serial_info(serial_number)
@@ -323,6 +721,16 @@ class TabsWindow(tk.Toplevel):
             for row in SN_Arr:
                 self.tab1_tree_view.insert('', 'end', values=row)
 
+    def suggest_serials(self, event):
+        """
+        Lists the serial numbers starting with the text of the serial number entry in its dropdown.
+
+        Args:
+            event: The key release in the entry.
+        """
+        prefix = self.serial_number_entry.get()
+        self.serial_number_entry['values'] = self.dAsys.find_serials(prefix) if prefix.strip() else []
+
     def open_html_file(self, event):
         """
         Opens the HTML file associated with the clicked ID in the default web browser.
@@ -334,7 +742,7 @@ class TabsWindow(tk.Toplevel):
             None
 
         Behavior:
-            - Retrieves the selected item ID and text from the tab3_tree_view widget.
+            - Retrieves the selected item ID from the tab3_tree_view widget and the Final Table row it shows.
             - Checks if the double-clicked item is a leaf node (an ID row) based on the 'id_tag' tag.
             - If the item is an ID row:
                 - Displays an information message indicating that the file system search may take some time.
@@ -342,72 +750,56 @@ class TabsWindow(tk.Toplevel):
                 - Opens the HTML file in the default web browser.
         """
         item_id = self.tab3_tree_view.focus()
-        item_text = self.tab3_tree_view.item(item_id)['text']
+        row = self.final_table.row(item_id)
 
         # Check if the double-clicked item is a leaf node (an ID row)
         if self.tab3_tree_view.tag_has('id_tag', item_id):
             messagebox.showinfo("Loading HTML File", "Searching the file system may take up to a minute. Press OK to start")
 
-            # Find the clicked ID's HTML file path
-            for id_info in self.ids_data:
-                if id_info['serial_number'] == item_text.split()[0]:
-                    html_file_path, length = self.getFilePath(item_text)
-
-                    # Open the HTML file in the default web browser
-                    def open_network_folder(folder_path):
-                        try:
-                            subprocess.run(["explorer", f'{html_file_path[0]}'], check=True)
-                        except subprocess.CalledProcessError as e:
-                            print(f"Error: {e}")
-
-                    # Replace '\\network\\folder' with the actual network folder path you want to open
-                    open_network_folder('\\\\network\\folder')
-                    break
-    def show_instances(self, event):
+            # Find the clicked ID's HTML file path, the row knows the run it shows
+            if row is not None and row.get('position') is not None:
+                run = self.table.row(row['position'])
+                html_file_path, length = self.getFilePath(run.serial_number, run.timestamp)
+
+                # Open the HTML file in the default web browser
+                def open_network_folder(folder_path):
+                    try:
+                        subprocess.run(["explorer", f'{html_file_path[0]}'], check=True)
+                    except subprocess.CalledProcessError as e:
+                        print(f"Error: {e}")
+
+                # Replace '\\network\\folder' with the actual network folder path you want to open
+                open_network_folder('\\\\network\\folder')
+    def show_instances(self, row):
         """
         In short this function handles the expansion when hitting a + button on a row.
 
-        Displays instances related to the selected serial number in the tab3_tree_view widget.
+        Builds the rows of the instances of the serial number of an expanded Final Table row. The runs are looked up
+        in the serial index of dAsys by the serial number as stored, the row text is padded with zeros.
 
         Args:
-            event: The event that triggered the method which in this case is a single click on the plus button
+            row (dict): The Final Table row being expanded.
 
-        Behavior:
-            - Retrieves the selected item ID from the tab3_tree_view widget.
-            - Checks if an item is selected.
-            - If an item is selected and not already expanded:
-                - Removes existing child items under the selected item.
-                - Inserts instances as child items based on the serial number from self.ids_data.
-                - Updates the expanded set to track expanded items.
+        Returns:
+            list: A row per test run of the serial number, tagged 'id_tag', or None while the test runs of a
+            summary window are still being loaded.
 
         Note:
-            The method is used as an event handler for a user action.
+            The method is called by the Final Table when a row is expanded for the first time.
         """
-        item_id = self.tab3_tree_view.focus()
-
-        # Check if an item is selected
-        if item_id:
-            item_text = self.tab3_tree_view.item(item_id)['text']
-
-            # If the item is not already expanded
-            if item_text not in self.expanded:
-                # Remove existing child items
-                for child in self.tab3_tree_view.get_children(item_id):
-                    self.tab3_tree_view.delete(child)
-                # Insert instances as child items
-                for id_info in self.ids_data:
-                    if id_info['serial_number'] == item_text:
-                        id_item = id_info['id']
-                        status = id_info['status']
-                        SN = id_info['serial_number']
-                        date_tested = id_info['date_tested']
-                        error_type = id_info['error_type']
-
-                        self.tab3_tree_view.insert(item_id, 'end', text=SN + " " + date_tested,
-                                                   values=(status, id_item, date_tested, error_type), tags=('id_tag',))
-
-                # Update the expanded set
-                self.expanded.add(item_text)
+        # The runs of a paged Final Table are only known once the test runs are loaded, which rebuilds the table
+        if not self.details_loaded:
+            self.load_details()
+            return None
+
+        instances = []
+        runs = Selection(self.table, self.dAsys.serial_index.positions(row['serial_number']))
+        for position, date_tested in zip(runs.positions, format_timestamps(runs.timestamps())):
+            run = self.table.row(position)
+            instances.append({'text': run.serial_number + " " + date_tested,
+                              'values': (run.status, f'{run.id}', date_tested, run.error_type),
+                              'tags': ('id_tag',), 'position': position})
+        return instances
 
     def download_csv(self):
         """
@@ -421,42 +813,44 @@ class TabsWindow(tk.Toplevel):
             - If a valid file path is provided:
                 - Opens the file in write mode and creates a CSV writer.
                 - Writes the header row with column names: ["Serial Number", "Status", "Date Tested"].
-                - Iterates through unexpanded rows in self.dict_data:
+                - Iterates through the most recent run of every serial number:
                     - Extracts relevant information: serial_number, status, and date_tested.
                     - Writes a row to the CSV file.
         """
+        # A summary window has to load its test runs first
+        if not self.details_loaded:
+            self.load_details(self.download_csv)
+            return
+
         file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")],
                                                  initialfile=f"CTS_Statistics_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}")
         if file_path:
             with open(file_path, 'w', newline='') as csvfile:
                 csv_writer = csv.writer(csvfile)
                 csv_writer.writerow(["Serial Number", "Status", "Date Tested"])
-                for item in self.dict_data:
-                    time_data = item['date_tested'].split('.')[0]
-                    csv_writer.writerow(
-                        [item['serial_number'], item['status'], datetime.strptime(time_data, "%Y-%m-%d %H:%M:%S")])
+                # The dates of every row are formatted at once instead of converting them row by row
+                dates = format_csv_timestamps(self.most_recent.timestamps())
+                for row, date_tested in zip(self.most_recent, dates):
+                    csv_writer.writerow([row.serial_number.zfill(3), row.status, date_tested])
 
-    def getFilePath(self, serial_number):
+    def getFilePath(self, serial_number, timestamp):
         """
                 Retrieves file paths associated with a given serial number and its corresponding date.
 
                 Args:
-                    serial_number (str): The serial number in the format 'SerialNumber Date Time'.
+                    serial_number (str): The serial number of the run.
+                    timestamp (int): The START_DATE_TIME of the run as a table timestamp.
 
                 Returns:
                     tuple: A tuple containing a list of matching file paths and the number of matching files.
 
                 Example:
-                    getFilePath('123456 2022-01-01 12:30:45')  # Returns (['path/to/file1.txt', 'path/to/file2.txt'], 2)
+                    getFilePath('123456', run.timestamp)  # Returns (['path/to/file1.txt', 'path/to/file2.txt'], 2)
         """
 
-        text = serial_number.split()
-        serial_number = text[0]
-        date_part = text[1] + " " + text[2].split('.')[0]
-
-        # Convert the date string from the serial number to a datetime object
-        serial_date = datetime.strptime(date_part, '%Y-%m-%d %H:%M:%S')
-        serial_date_final = serial_date.strftime('[%I %M %S %p][%m %d %Y]')
+        # The log file names carry the date as '[%I %M %S %p][%m %d %Y]', built from the timestamp without parsing
+        serial_date = timestamp_to_datetime(timestamp).replace(microsecond=0)
+        serial_date_final = format_log_name(timestamp)
         print(serial_date)
         print(serial_date_final)
         month = serial_date.strftime('%m')
@@ -492,16 +886,28 @@ class TabsWindow(tk.Toplevel):
             tree_view: The tkinter treeview widget to be sorted.
             column: The column index by which to sort the treeview.
         """
+        # A paged Final Table only holds some of the serial numbers, they are all loaded to sort them
+        if tree_view is self.tab3_tree_view and not self.details_loaded:
+            self.load_details(lambda: self.sort_treeview(tree_view, column))
+            return
+
         # Get the current sort order for the column
         sort_order = self.current_sort_order[column]
 
         # Change the sort order for the next click
         self.current_sort_order[column] = 'desc' if sort_order == 'asc' else 'asc'
 
+        # The Final Table is sorted on the typed values of its rows, the column clicked before breaks the ties
+        if tree_view is self.tab3_tree_view:
+            self.final_sort = [(column, sort_order == 'desc')] + [pair for pair in self.final_sort
+                                                                  if pair[0] != column][:1]
+            self.final_table.set_rows(self.final_sorter.sorted(self.final_sort), self.final_table.offset)
+            return
+
         # Get all items and their values for the specified column
         current_items = [(tree_view.set(item, column), item) for item in tree_view.get_children("")]
-        # Sort the items based on the values and sort order
-        current_items.sort(reverse=(sort_order == 'desc'))
+        # Sort the items based on the values and sort order, numbers by their value
+        current_items.sort(key=lambda pair: display_key(pair[0]), reverse=(sort_order == 'desc'))
 
         # Rearrange the items in the treeview
         for index, (value, item) in enumerate(current_items):
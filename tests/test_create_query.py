@@ -0,0 +1,85 @@
+import pytest
+
+# create_query imports pyodbc, which fails to import where the ODBC driver manager is not installed
+pytest.importorskip("pyodbc", exc_type=ImportError)
+
+import create_query
+import query_builder
+import standin_db
+from database_connector import ConnectionPool, QueryTimeout
+from result_cache import ResultCache
+
+START, END = "2023-11-01 00:00:00", "2023-11-30 23:59:59"
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    """
+    Points create_query at a stand-in database file and returns every UUT result of K5 over the month.
+    """
+    path = str(tmp_path / "standin.db")
+    conn = standin_db.connect(path)
+    standin_db.populate(conn, units=300)
+    query, params = query_builder.build_uut_query(START, END, ['k5'], query_builder.SQLITE)
+    rows = [list(row) for row in conn.execute(query, params).fetchall()]
+    conn.close()
+
+    pool = ConnectionPool(path, max_size=4, connect_func=standin_db.connect)
+    monkeypatch.setattr(create_query, 'pool', pool)
+    monkeypatch.setattr(create_query, 'DIALECT', query_builder.SQLITE)
+    monkeypatch.setattr(create_query, 'cache', None)
+    monkeypatch.setattr(create_query, 'BACKOFF_SECONDS', 0)
+    monkeypatch.setattr(create_query.registry, 'paths', lambda product: None)
+    monkeypatch.setattr(create_query.registry, 'needs_refresh', lambda: False)
+    yield rows
+    pool.close_all()
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_ranges_are_split_without_gaps():
+    assert create_query.bisectRange("2023-11-01 00:00:00", "2023-11-02 00:00:01") == \
+        [("2023-11-01 00:00:00", "2023-11-01 12:00:00", False), ("2023-11-01 12:00:00", "2023-11-02 00:00:01", True)]
+    partitions = create_query.partitionRange(START, END, 7)
+    assert [partition[2] for partition in partitions] == [False] * 4 + [True]
+    assert all(partitions[i][1] == partitions[i + 1][0] for i in range(len(partitions) - 1))
+    assert (partitions[0][0], partitions[-1][1]) == (START, END)
+
+
+def test_timed_out_ranges_are_bisected_until_they_succeed(standin, monkeypatch):
+    stream_range = create_query.streamRange
+
+    # The server only answers ranges of up to two days
+    def slow_server(start_date, end_date, *args):
+        if create_query.rangeDays(start_date, end_date) > 2:
+            raise QueryTimeout("Query timeout expired")
+        yield from stream_range(start_date, end_date, *args)
+
+    monkeypatch.setattr(create_query, 'streamRange', slow_server)
+    outcomes = []
+    seen_ids = set()
+    rows = []
+    for batch in create_query.streamAdaptive(START, END, create_query.programFilter('k5'), 50, outcomes=outcomes):
+        rows += create_query.cleanBatch(batch, seen_ids)
+    assert ids(rows) == ids(standin)
+    assert all(days > 2 for days, worked in outcomes if not worked)
+    assert all(days <= 2 for days, worked in outcomes if worked)
+
+
+def test_partitions_yield_the_rows_of_one_query_in_order(standin):
+    rows = create_query.createQuery(START, END, 'k5', batch_size=50, partition_days=3, max_workers=3,
+                                    use_cache=False)
+    assert rows == standin
+
+
+def test_cached_days_are_read_instead_of_queried(standin, tmp_path, monkeypatch):
+    monkeypatch.setattr(create_query, 'cache', ResultCache(path=str(tmp_path / "results.sqlite"), close_grace=0))
+    part = create_query.createQuery("2023-11-10 06:00:00", "2023-11-12 18:00:00", 'k5')
+    assert ids(part) == [row[0] for row in standin if "2023-11-10 06:00:00" <= row[2] <= "2023-11-12 18:00:00"]
+
+    rows = create_query.createQuery(START, END, 'k5')
+    assert ids(rows) == ids(standin)
+    assert create_query.cache.missing_days('k5', create_query.rangeDayList(START, END), record=False) == []
+    assert create_query.cache.stats()['hits'] == 3
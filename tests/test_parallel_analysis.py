@@ -0,0 +1,42 @@
+import random
+from datetime import datetime, timedelta
+
+import parallel_analysis
+from run_preprocessor import RunPreprocessor
+
+TABLE_COLUMNS = ('ids', 'timestamps', 'status_bits', 'serial_codes', 'serials', 'error_codes', 'error_types',
+                 'latest')
+
+
+def make_rows(count, serials):
+    """
+    Returns query output rows of random runs, some serial numbers tested several times and out of date order.
+    """
+    rng = random.Random(7)
+    rows = []
+    for i in range(count):
+        started = datetime(2023, 11, 1) + timedelta(seconds=rng.randrange(30 * 86400))
+        rows.append((1000 + i, f"SN{rng.randrange(serials)}", started.strftime("%Y-%m-%d %H:%M:%S"),
+                     rng.choice(['Passed', 'Failed', 'Error']), rng.choice(['', 'Sleep Current', 'Voltage'])))
+    return rows
+
+
+def test_process_pool_reads_the_rows_like_one_process(monkeypatch):
+    monkeypatch.setattr(parallel_analysis, 'PARALLEL_MIN_ROWS', 100)
+    rows = make_rows(3000, 700)
+
+    single = RunPreprocessor(rows)
+    parallel = parallel_analysis.preprocess(rows, processes=3)
+
+    for column in TABLE_COLUMNS:
+        assert getattr(parallel.table, column) == getattr(single.table, column), column
+    assert parallel.errors.ranking() == single.errors.ranking()
+    assert (parallel.errors.units, parallel.errors.passed) == (single.errors.units, single.errors.passed)
+    for serial_number in ('SN1', 'SN42', 'SN699'):
+        assert list(parallel.index.positions(serial_number)) == list(single.index.positions(serial_number))
+
+
+def test_small_outputs_are_read_in_the_calling_process():
+    rows = make_rows(50, 20)
+    stage = parallel_analysis.preprocess(rows, processes=4)
+    assert len(stage.table) == 50
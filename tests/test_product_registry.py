@@ -0,0 +1,8 @@
+from product_registry import ProductRegistry
+
+
+def test_refresh_returns_true_and_resolves_the_paths(tmp_path):
+    registry = ProductRegistry(path=str(tmp_path / "products.json"))
+    assert registry.refresh(lambda patterns, since: [r"C:\Sequences\K5 Final.seq ", None]) is True
+    assert registry.paths('K5') == [r"C:\Sequences\K5 Final.seq"]
+    assert ProductRegistry(path=str(tmp_path / "products.json")).paths('K5') == [r"C:\Sequences\K5 Final.seq"]
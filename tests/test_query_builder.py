@@ -0,0 +1,97 @@
+from collections import Counter
+
+import pytest
+
+import query_builder
+import standin_db
+from query_builder import SQLITE, ProgramFilter
+
+START, END = "2023-11-01 00:00:00", "2023-11-30 23:59:59"
+PATTERNS = ['k123', 'k3550', 'k2700']
+
+
+@pytest.fixture(scope="module")
+def conn():
+    conn = standin_db.connect()
+    standin_db.populate(conn, units=300)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def expected(conn):
+    """
+    The rows build_uut_query should return for PATTERNS over the whole month, worked out in Python.
+    """
+    failing_steps = {}
+    for uut, step in conn.execute("SELECT UUT_RESULT, STEP_NAME FROM dbo.STEP_RESULT WHERE CAUSED_SEQFAIL = 1 AND "
+                                  "STEP_PARENT IS NULL ORDER BY ORDER_NUMBER DESC").fetchall():
+        failing_steps[uut] = step
+    rows = []
+    for uut, serial, date, status, path in conn.execute("SELECT ID, UUT_SERIAL_NUMBER, START_DATE_TIME, UUT_STATUS, "
+                                                        "SEQUENCE_FILE_PATH FROM dbo.UUT_RESULT").fetchall():
+        if START <= date <= END and any(pattern in path.lower() for pattern in PATTERNS):
+            step = failing_steps.get(uut, '') if status.lower() == 'failed' else ''
+            rows.append((uut, serial, date, status, step, path))
+    return sorted(rows, key=lambda row: (row[2], row[0]))
+
+
+def fetch(conn, query_and_params):
+    return [tuple(row) for row in conn.execute(*query_and_params).fetchall()]
+
+
+def latest_runs(rows):
+    """
+    The most recent run of every serial number: the latest START_DATE_TIME, the lowest ID among equal times.
+    """
+    latest = {}
+    for row in rows:
+        if row[1] not in latest or row[2] > latest[row[1]][2]:
+            latest[row[1]] = row
+    return latest
+
+
+def test_uut_query_returns_one_row_per_uut_result(conn, expected):
+    rows = fetch(conn, query_builder.build_uut_query(START, END, PATTERNS, SQLITE, with_path=True))
+    assert rows == expected
+    assert fetch(conn, query_builder.build_uut_query(START, END, PATTERNS, SQLITE)) == [row[:5] for row in expected]
+
+
+def test_partitions_return_the_rows_of_the_whole_range(conn, expected):
+    middle = "2023-11-15 00:00:00"
+    rows = fetch(conn, query_builder.build_uut_query(START, middle, PATTERNS, SQLITE, end_inclusive=False)) + \
+        fetch(conn, query_builder.build_uut_query(middle, END, PATTERNS, SQLITE))
+    assert rows == [row[:5] for row in expected]
+
+
+def test_count_and_resolved_paths_match_the_rows(conn, expected):
+    assert fetch(conn, query_builder.build_count_query(START, END, PATTERNS)) == [(len(expected),)]
+
+    paths = sorted(path for (path,) in fetch(conn, query_builder.build_path_query(PATTERNS)))
+    assert paths == sorted(set(row[5] for row in expected))
+    program_filter = ProgramFilter(PATTERNS, paths)
+    assert fetch(conn, query_builder.build_uut_query(START, END, program_filter, SQLITE)) == \
+        [row[:5] for row in expected]
+
+
+def test_summary_and_pages_count_the_most_recent_runs(conn, expected):
+    latest = latest_runs(expected)
+    summary = fetch(conn, query_builder.build_summary_query(START, END, PATTERNS, SQLITE))
+    assert Counter({(passed, step): units for passed, step, units in summary}) == \
+        Counter((int(row[3].lower() == 'passed'), row[4]) for row in latest.values())
+
+    pages = []
+    after_serial = None
+    while True:
+        page = fetch(conn, query_builder.build_latest_page_query(START, END, PATTERNS, after_serial, 40, SQLITE))
+        if not page:
+            break
+        pages += page
+        after_serial = page[-1][1]
+    assert pages == [latest[serial][:5] for serial in sorted(latest)]
+
+
+def test_since_query_returns_the_runs_started_at_or_after_the_date(conn, expected):
+    since = expected[-10][2]
+    rows = fetch(conn, query_builder.build_since_query(since, PATTERNS, SQLITE))
+    assert rows == [row[:5] for row in expected[-10:]]
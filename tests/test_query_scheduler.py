@@ -0,0 +1,92 @@
+import threading
+import time
+
+from query_scheduler import QueryScheduler
+
+
+def wait_idle(scheduler, workers):
+    """
+    Waits until workers worker threads of the scheduler wait for queries.
+    """
+    deadline = time.time() + 2
+    while scheduler._idle < workers and time.time() < deadline:
+        time.sleep(0.01)
+    assert scheduler._idle == workers
+
+
+def test_burst_runs_on_every_worker_with_an_idle_worker():
+    scheduler = QueryScheduler(max_workers=3, per_user=3)
+    scheduler.submit('warm up', lambda: None).result(timeout=2)
+    wait_idle(scheduler, 1)
+
+    # Every query waits for the other two, so they only finish when all three run at the same time
+    barrier = threading.Barrier(3, timeout=2)
+    futures = [scheduler.submit(key, barrier.wait) for key in range(3)]
+    for future in futures:
+        future.result(timeout=5)
+    assert scheduler._workers == 3
+
+
+def test_identical_requests_share_one_execution():
+    scheduler = QueryScheduler(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def query():
+        calls.append(1)
+        release.wait(2)
+        return 'rows'
+
+    first = scheduler.submit('K5', query, owner='window 1')
+    second = scheduler.submit('K5', query, owner='window 2')
+    release.set()
+    assert first is second
+    assert first.result(timeout=2) == 'rows'
+    assert calls == [1]
+    assert scheduler.metrics()['coalesced'] == 1
+
+
+def test_newer_request_supersedes_the_queued_one_of_the_owner():
+    scheduler = QueryScheduler(max_workers=1)
+    release = threading.Event()
+    running = scheduler.submit('busy', lambda: release.wait(2))
+
+    older = scheduler.submit('week', lambda: 'week', owner='window')
+    shared = scheduler.submit('month', lambda: 'month', owner='window')
+    scheduler.submit('month', lambda: 'month', owner='other window')
+    newest = scheduler.submit('year', lambda: 'year', owner='window')
+    release.set()
+
+    assert older.cancelled()
+    # Another owner still waits for the month, so it runs anyway
+    assert shared.result(timeout=2) == 'month'
+    assert newest.result(timeout=2) == 'year'
+    assert running.result(timeout=2) is True
+    assert scheduler.metrics()['superseded'] == 1
+
+
+def test_per_user_limit_lets_other_users_and_interactive_queries_run():
+    scheduler = QueryScheduler(max_workers=3, per_user=1)
+    release = threading.Event()
+    started = []
+
+    def query(name):
+        started.append(name)
+        release.wait(2)
+        return name
+
+    scan = scheduler.submit('scan', lambda: query('scan'), user='alice')
+    second_scan = scheduler.submit('second scan', lambda: query('second scan'), user='alice')
+    other_user = scheduler.submit('other user', lambda: query('other user'), user='bob')
+    refresh = scheduler.submit('refresh', lambda: query('refresh'), user='alice', interactive=True)
+
+    deadline = time.time() + 2
+    while len(started) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(started) == ['other user', 'refresh', 'scan']
+    assert not second_scan.done()
+
+    release.set()
+    for future in (scan, second_scan, other_user, refresh):
+        future.result(timeout=2)
+    assert started[-1] == 'second scan'
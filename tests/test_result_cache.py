@@ -0,0 +1,37 @@
+import time
+
+from result_cache import ResultCache
+
+
+def test_closed_days_are_returned_and_counted(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite"))
+    rows = [[1, '001', '2023-11-01 08:00:00', 'Passed', ''], [2, '002', '2023-11-01 09:00:00', 'Failed', 'Bluetooth']]
+    cache.put_day('K5', '2023-11-01', rows)
+    cache.put_day('K5', '2023-11-02', [])
+
+    assert cache.get_day('K5', '2023-11-01') == rows
+    assert cache.get_day('K5', '2023-11-02') == []
+    assert cache.get_day('HUD', '2023-11-01') is None
+    assert cache.missing_days('K5', ['2023-11-01', '2023-11-02', '2023-11-03'], record=False) == ['2023-11-03']
+    assert cache.count_rows('K5', ['2023-11-01', '2023-11-02']) in (2, None)
+    assert cache.stats()['hits'] == 2 and cache.stats()['segments'] == 2
+
+
+def test_open_day_expires(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite"), open_ttl=0.05)
+    today = time.strftime("%Y-%m-%d")
+    cache.put_day('K5', today, [[1, '001', today + ' 08:00:00', 'Passed', '']])
+    assert cache.get_day('K5', today) is not None
+    time.sleep(0.1)
+    assert cache.get_day('K5', today) is None
+    assert cache.missing_days('K5', [today]) == [today]
+
+
+def test_least_recently_used_days_are_evicted(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "results.sqlite"), max_bytes=1000)
+    row = [1, '001', '2023-11-01 08:00:00', 'Passed', 'x' * 300]
+    for day in ('2023-11-01', '2023-11-02'):
+        cache.put_day('K5', day, [row])
+    cache.get_day('K5', '2023-11-01')
+    cache.put_day('K5', '2023-11-03', [row])
+    assert cache.missing_days('K5', ['2023-11-01', '2023-11-02', '2023-11-03'], record=False) == ['2023-11-02']
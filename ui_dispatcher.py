@@ -0,0 +1,109 @@
+import queue
+
+
+class UIDispatcher:
+    """
+    Carries events from worker threads to the Tk thread, the only thread that may touch the widgets.
+
+    Workers post (kind, arguments) events to a queue from any thread. The Tk loop drains the queue every interval
+    milliseconds with after() and calls the handler registered for each kind. Events of a coalesced kind, such as
+    progress, only keep their latest occurrence per drain, so a fast fetch posting an event per batch does not
+    flood the event loop with updates nobody sees.
+
+    Attributes:
+        widget: The Tk widget whose after() drives the dispatcher.
+        interval (int): Milliseconds between two drains.
+        coalesce (set): The kinds of which only the latest event of a drain is handled.
+        handlers (dict): The handler of every kind, called with the arguments of the event.
+
+    Methods:
+        on: Registers the handler of a kind.
+        post: Posts an event, from any thread.
+        call: Runs a function on the Tk thread, from any thread.
+        start: Starts draining the queue.
+        stop: Stops draining the queue.
+    """
+
+    def __init__(self, widget, interval=50, coalesce=('progress',)):
+        """
+        Initializes the dispatcher, it drains nothing until start is called.
+
+        Args:
+            widget: The Tk widget whose after() drives the dispatcher.
+            interval (int, optional): Milliseconds between two drains.
+            coalesce (tuple, optional): The kinds of which only the latest event of a drain is handled.
+        """
+        self.widget = widget
+        self.interval = interval
+        self.coalesce = set(coalesce)
+        self.handlers = {'call': lambda function, *args: function(*args)}
+        self._events = queue.Queue()
+        self._after_id = None
+
+    def on(self, kind, handler):
+        """
+        Registers the handler of a kind, replacing the handler it had.
+        """
+        self.handlers[kind] = handler
+
+    def post(self, kind, *args):
+        """
+        Posts an event, safe to call from any thread.
+
+        Args:
+            kind (str): The kind of the event, e.g. 'phase', 'progress', 'done' or 'error'.
+            *args: The arguments the handler of the kind is called with.
+        """
+        self._events.put((kind, args))
+
+    def call(self, function, *args):
+        """
+        Runs function(*args) on the Tk thread, safe to call from any thread.
+        """
+        self.post('call', function, *args)
+
+    def start(self):
+        """
+        Starts draining the queue every interval milliseconds.
+        """
+        if self._after_id is None:
+            self._after_id = self.widget.after(self.interval, self._drain)
+
+    def stop(self):
+        """
+        Stops draining the queue, events posted later wait until start is called again.
+        """
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        """
+        Handles every event posted since the last drain, in the order they were posted.
+        """
+        # The next drain is scheduled first, a handler may open a window and run a nested event loop
+        self._after_id = self.widget.after(self.interval, self._drain)
+
+        events = []
+        latest = {}
+        while True:
+            try:
+                kind, args = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind in self.coalesce:
+                # Only the latest event of the kind is handled, where it was posted
+                if kind in latest:
+                    events[latest[kind]] = None
+                latest[kind] = len(events)
+            events.append((kind, args))
+
+        for event in events:
+            if event is None:
+                continue
+            kind, args = event
+            handler = self.handlers.get(kind)
+            if handler is None:
+                print(f"No handler for the {kind} event")
+                continue
+            handler(*args)
@@ -0,0 +1,277 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    A Treeview that only creates Tk items for the rows in view, so opening and scrolling cost the same for any
+    number of rows.
+
+    The rows are kept as plain dictionaries. Only the visible rows plus a margin are inserted into the Treeview,
+    and the scrollbar is mapped to an offset into the rows instead of scrolling the Treeview itself. A row whose
+    children are not known yet shows a placeholder child so it can be expanded. Its children are asked for when it
+    is opened.
+
+    A row is a dictionary with the keys:
+        text (str): The text of the tree column.
+        values (tuple): The values of the other columns.
+        tags (tuple, optional): The tags of the item, e.g. 'id_tag'.
+        open (bool, optional): True while the row is expanded.
+        children (list, optional): The child rows, None until the row was expanded once.
+    Any other key is kept for the owner of the widget.
+
+    Attributes:
+        tree (ttk.Treeview): The Treeview holding the items in view, for headings, columns and tags.
+        scrollbar (tk.Scrollbar): The scrollbar of the rows.
+        rows (list): The top level rows in display order.
+        offset (int): Index of the first row in view among the rows and their open children.
+        margin (int): The number of rows inserted below the visible ones.
+        load_children: Function taking a row and returning its child rows, or None when they are not available
+            yet, in which case the row stays closed.
+        on_scroll: Function called with the offset, the number of visible rows and the total after each redraw.
+
+    Methods:
+        set_rows: Replaces every row.
+        add_row: Adds a row at the end.
+        extend_rows: Adds a batch of rows at the end.
+        update_row: Changes a row and optionally forgets its children.
+        sort: Sorts the top level rows.
+        row: Returns the row of a Treeview item.
+        yview: Scrollbar command, moves the rows in view.
+    """
+
+    def __init__(self, master, columns, load_children=None, on_scroll=None, margin=10):
+        """
+        Creates the Treeview and its scrollbar.
+
+        Args:
+            master: The parent widget.
+            columns (tuple): The column names besides the tree column.
+            load_children (optional): Function returning the child rows of a row being opened.
+            on_scroll (optional): Function called with the offset, visible rows and total after each redraw.
+            margin (int, optional): The number of rows inserted below the visible ones.
+        """
+        super().__init__(master)
+        self.load_children = load_children
+        self.on_scroll = on_scroll
+        self.margin = margin
+        self.rows = []
+        self.offset = 0
+
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(self, columns=columns)
+        self.tree.pack(fill="both", expand=True)
+
+        # Every row in display order as (row, parent row), None for top level rows
+        self._flat = []
+        self._items = {}
+        self._focus_row = None
+        self._render_pending = False
+
+        self.tree.bind("<<TreeviewOpen>>", self._on_open)
+        self.tree.bind("<<TreeviewClose>>", self._on_close)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Configure>", lambda event: self._schedule_render())
+        self.tree.bind("<MouseWheel>", lambda event: self._scroll(-1 if event.delta > 0 else 1, 3))
+        self.tree.bind("<Button-4>", lambda event: self._scroll(-1, 3))
+        self.tree.bind("<Button-5>", lambda event: self._scroll(1, 3))
+
+    def set_rows(self, rows, offset=0):
+        """
+        Replaces every row.
+
+        Args:
+            rows (list): The new top level rows.
+            offset (int, optional): Index of the first row in view.
+        """
+        self.rows = rows
+        self.offset = offset
+        self._rebuild()
+
+    def add_row(self, row):
+        """
+        Adds a top level row at the end.
+        """
+        self.rows.append(row)
+        self._rebuild()
+
+    def extend_rows(self, rows):
+        """
+        Adds a batch of closed top level rows at the end, in time proportional to the batch.
+        """
+        self.rows.extend(rows)
+        self._flat.extend((row, None) for row in rows)
+        self._schedule_render()
+
+    def update_row(self, row, text=None, values=None, collapse=False):
+        """
+        Changes the text or values of a row.
+
+        Args:
+            row (dict): The row to change.
+            text (str, optional): The new text.
+            values (tuple, optional): The new values.
+            collapse (bool, optional): Close the row and forget its children, so they are loaded again.
+        """
+        if text is not None:
+            row['text'] = text
+        if values is not None:
+            row['values'] = values
+        if collapse:
+            row['open'] = False
+            row['children'] = None
+        self._rebuild()
+
+    def sort(self, key, reverse=False):
+        """
+        Sorts the top level rows, the children stay with their row.
+
+        Args:
+            key: Function returning the sort key of a row.
+            reverse (bool, optional): Sort in descending order.
+        """
+        self.rows.sort(key=key, reverse=reverse)
+        self._rebuild()
+
+    def row(self, item_id):
+        """
+        Returns the row shown by a Treeview item, or None.
+        """
+        entry = self._items.get(item_id)
+        return entry[0] if entry is not None else None
+
+    def yview(self, *args):
+        """
+        Moves the rows in view, called by the scrollbar with ('moveto', fraction) or ('scroll', count, what).
+        """
+        if args[0] == 'moveto':
+            self._move_to(int(float(args[1]) * len(self._flat)))
+        elif args[0] == 'scroll':
+            self._scroll(int(args[1]), self._visible_rows() if args[2] == 'pages' else 1)
+
+    def _scroll(self, direction, rows):
+        """
+        Moves the rows in view by a number of rows, returns "break" so the Treeview does not scroll itself.
+        """
+        self._move_to(self.offset + direction * rows)
+        return "break"
+
+    def _move_to(self, offset):
+        """
+        Moves the first row in view to offset and redraws when it changed.
+        """
+        offset = max(0, min(offset, len(self._flat) - self._visible_rows()))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _visible_rows(self):
+        """
+        Returns the number of rows the Treeview has room for, without the heading.
+        """
+        rowheight = ttk.Style().lookup("Treeview", "rowheight") or 20
+        return max(1, self.tree.winfo_height() // int(rowheight) - 1)
+
+    def _rebuild(self):
+        """
+        Lists the rows and the children of the open rows in display order and schedules a redraw.
+        """
+        flat = []
+        for row in self.rows:
+            flat.append((row, None))
+            if row.get('open') and row.get('children'):
+                flat += [(child, row) for child in row['children']]
+        self._flat = flat
+        self._schedule_render()
+
+    def _schedule_render(self):
+        """
+        Redraws once the current event is handled, so a burst of changes only redraws once.
+        """
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render)
+
+    def _render(self):
+        """
+        Inserts the rows in view plus the margin as Treeview items, replacing the items shown before.
+        """
+        self._render_pending = False
+        visible = self._visible_rows()
+        self.offset = max(0, min(self.offset, len(self._flat) - visible))
+        self.tree.delete(*self.tree.get_children())
+        self._items = {}
+        window = self._flat[self.offset:self.offset + visible + self.margin]
+
+        parents = {}
+        focus_item = None
+        skipped = 0
+        for row, parent in window:
+            if parent is not None and id(parent) not in parents:
+                # The parent of the first child in view is inserted above the view, so the child can be nested
+                parents[id(parent)] = self._insert("", parent, None)
+                skipped = 1
+            item_id = self._insert(parents[id(parent)] if parent is not None else "", row, parent)
+            if parent is None:
+                parents[id(row)] = item_id
+            if row is self._focus_row:
+                focus_item = item_id
+        if skipped:
+            self.tree.yview_scroll(skipped, 'units')
+        if focus_item is not None:
+            self.tree.focus(focus_item)
+            self.tree.selection_set(focus_item)
+
+        total = len(self._flat)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        if self.on_scroll is not None:
+            self.on_scroll(self.offset, visible, total)
+
+    def _insert(self, parent_item, row, parent):
+        """
+        Inserts the item of one row, a closed top level row gets a placeholder child so it can be expanded.
+        """
+        item_id = self.tree.insert(parent_item, 'end', text=row['text'], values=row['values'],
+                                   tags=row.get('tags', ()), open=bool(row.get('open')))
+        if parent is None and not row.get('open'):
+            self.tree.insert(item_id, 'end', text='Details: ', values=("", "", ""))
+        self._items[item_id] = (row, parent)
+        return item_id
+
+    def _on_open(self, event):
+        """
+        Loads the children of the row being opened and shows them.
+        """
+        item_id = self.tree.focus()
+        row = self.row(item_id)
+        if row is None or self._items[item_id][1] is not None:
+            return
+        if row.get('children') is None and self.load_children is not None:
+            row['children'] = self.load_children(row)
+        if row.get('children') is None:
+            # The children are not available yet, e.g. while they are being loaded
+            self.after_idle(lambda: self.tree.exists(item_id) and self.tree.item(item_id, open=False))
+            return
+        row['open'] = True
+        self._rebuild()
+
+    def _on_close(self, event):
+        """
+        Hides the children of the row being closed.
+        """
+        row = self.row(self.tree.focus())
+        if row is not None and row.get('open'):
+            row['open'] = False
+            self._rebuild()
+
+    def _on_select(self, event):
+        """
+        Remembers the focused row so it stays selected when the items are redrawn.
+        """
+        row = self.row(self.tree.focus())
+        if row is not None:
+            self._focus_row = row
@@ -0,0 +1,139 @@
+import numpy as np
+
+from result_table import timestamp_to_datetime
+
+# Microseconds per day and hour of the table timestamps
+DAY_MICROS = 86400 * 1000000
+HOUR_MICROS = 3600 * 1000000
+
+
+class YieldAnalytics:
+    """
+    Yield and retest figures of the test runs of a ResultTable, computed with NumPy on the columns of the table.
+
+    The runs are grouped by serial number once, sorted by START_DATE_TIME within every serial number, and every
+    figure is read from that grouping with vectorized operations instead of a loop over the runs.
+
+    Attributes:
+        table (ResultTable): The table the figures are computed for.
+        order (numpy.ndarray): Positions of the runs sorted by serial code, START_DATE_TIME and ID.
+        starts (numpy.ndarray): Index into order of the first run of every serial number.
+        counts (numpy.ndarray): The number of runs of every serial number.
+
+    Methods:
+        first_pass_yield: Returns the share of serial numbers that passed their first run.
+        final_yield: Returns the share of serial numbers whose most recent run passed.
+        retest_distribution: Returns how many serial numbers were retested how often.
+        time_to_pass: Returns the time from the first, failed, run to the first passing run.
+        daily_yield: Returns the runs, passed runs and yield of every day.
+        report: Returns every figure as (metric, value) rows for display.
+    """
+
+    def __init__(self, table):
+        """
+        Groups the runs of the table by serial number.
+
+        Args:
+            table (ResultTable): The test runs.
+        """
+        self.table = table
+        size = len(table)
+        self._ids = np.frombuffer(table.ids, dtype=np.int64, count=size) if size else np.zeros(0, np.int64)
+        self._timestamps = np.frombuffer(table.timestamps, dtype=np.int64, count=size) if size \
+            else np.zeros(0, np.int64)
+        codes = np.frombuffer(table.serial_codes, dtype=np.dtype(table.serial_codes.typecode), count=size) if size \
+            else np.zeros(0, np.int64)
+        self._passed = np.unpackbits(np.frombuffer(bytes(table.status_bits), dtype=np.uint8),
+                                     bitorder='little')[:size].astype(bool)
+
+        # Runs of the same serial number next to each other, oldest first
+        self.order = np.lexsort((self._ids, self._timestamps, codes))
+        sorted_codes = codes[self.order]
+        boundaries = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+        self.starts = np.concatenate(([0], boundaries)) if size else np.zeros(0, np.int64)
+        self.counts = np.diff(np.concatenate((self.starts, [size])))
+
+    def first_pass_yield(self):
+        """
+        Returns the share of serial numbers that passed their first run, 0.0 without runs.
+        """
+        if not len(self.starts):
+            return 0.0
+        return float(self._passed[self.order[self.starts]].mean())
+
+    def final_yield(self):
+        """
+        Returns the share of serial numbers whose most recent run passed, the run the Final Table shows.
+        """
+        if not len(self.starts):
+            return 0.0
+        latest = np.array(self.table.latest, dtype=np.int64)
+        return float(self._passed[latest].mean())
+
+    def retest_distribution(self):
+        """
+        Returns how many serial numbers were retested how often.
+
+        Returns:
+            list: (retests, serial numbers) tuples for every number of retests that occurs, 0 retests first.
+        """
+        distribution = np.bincount(self.counts - 1) if len(self.counts) else np.zeros(0, np.int64)
+        return [(int(retests), int(serials)) for retests, serials in enumerate(distribution) if serials]
+
+    def time_to_pass(self):
+        """
+        Returns the time from the first run of serial numbers that failed it to their first passing run.
+
+        Returns:
+            dict: units (serial numbers that failed first and passed later), and median_hours, mean_hours and
+            p90_hours of the time to pass, None without such serial numbers.
+        """
+        empty = {'units': 0, 'median_hours': None, 'mean_hours': None, 'p90_hours': None}
+        if not len(self.starts):
+            return empty
+        passed = self._passed[self.order]
+
+        # The index of the first passing run of every serial number, past the end when it never passed
+        size = len(self.order)
+        first_pass = np.minimum.reduceat(np.where(passed, np.arange(size), size), self.starts)
+        retested = ~passed[self.starts] & (first_pass < size)
+        if not retested.any():
+            return empty
+
+        timestamps = self._timestamps[self.order]
+        hours = (timestamps[first_pass[retested]] - timestamps[self.starts[retested]]) / HOUR_MICROS
+        return {'units': int(retested.sum()), 'median_hours': float(np.median(hours)),
+                'mean_hours': float(hours.mean()), 'p90_hours': float(np.percentile(hours, 90))}
+
+    def daily_yield(self):
+        """
+        Returns the runs, passed runs and yield of every day with runs, by the day each run started.
+
+        Returns:
+            list: ('YYYY-MM-DD', runs, passed runs, yield) tuples in date order.
+        """
+        if not len(self._timestamps):
+            return []
+        days, index = np.unique(self._timestamps // DAY_MICROS, return_inverse=True)
+        runs = np.bincount(index)
+        passed = np.bincount(index, weights=self._passed)
+        return [(timestamp_to_datetime(int(day) * DAY_MICROS).strftime("%Y-%m-%d"), int(count), int(good),
+                 float(good / count)) for day, count, good in zip(days, runs, passed)]
+
+    def report(self):
+        """
+        Returns every figure as (metric, value) rows, formatted for display.
+        """
+        time_to_pass = self.time_to_pass()
+        rows = [("Serial Numbers", len(self.starts)), ("Test Runs", len(self.order)),
+                ("First Pass Yield", f"{self.first_pass_yield() * 100:.2f}%"),
+                ("Final Yield", f"{self.final_yield() * 100:.2f}%"),
+                ("Passed After Failing First", time_to_pass['units'])]
+        if time_to_pass['units']:
+            rows += [("Median Hours To Pass", f"{time_to_pass['median_hours']:.2f}"),
+                     ("Mean Hours To Pass", f"{time_to_pass['mean_hours']:.2f}"),
+                     ("90th Percentile Hours To Pass", f"{time_to_pass['p90_hours']:.2f}")]
+        rows += [(f"Retested {retests} Times", serials) for retests, serials in self.retest_distribution()]
+        rows += [(f"Yield {day}", f"{yield_ * 100:.2f}% of {runs} runs")
+                 for day, runs, _, yield_ in self.daily_yield()]
+        return rows